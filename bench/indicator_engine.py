@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+# Паритет IndicatorEngine.evaluate с core.core.compute_signal: случайные ряды цен (со сменой тренда,
+# чтобы были кроссы) проходят через sync / close_bar / update_live / правку закрытого бара / снапшот,
+# на каждом шаге сигнал и meta должны совпасть с compute_signal(окно + live) бит-в-бит.
+# Наборы параметров включают EMA_SLOW >= 86 (окно > SMALL_N). Выход с ошибкой при первом расхождении.
+#   python -m bench.indicator_engine --bars 3000 --seeds 3
+import argparse, json, time
+from collections import Counter
+
+import numpy as np
+
+from core.core import compute_signal
+from core.indicator_engine import IndicatorEngine
+
+PARAMS = [
+    dict(ema_fast=9, ema_slow=20, entry_min_gap_pct=0.0005, cross_grace_bars=3),
+    dict(ema_fast=5, ema_slow=13, entry_min_gap_pct=0.0, cross_grace_bars=1),
+    dict(ema_fast=12, ema_slow=26, entry_min_gap_pct=0.001, cross_grace_bars=5),
+    dict(ema_fast=30, ema_slow=90, entry_min_gap_pct=0.0002, cross_grace_bars=3),
+]
+IV = 60_000
+
+
+def make_closes(n: int, seed: int):
+    rng = np.random.default_rng(seed)
+    drift = np.repeat(rng.normal(0, 0.0015, n // 40 + 1), 40)[:n]   # тренд меняется каждые 40 баров
+    return (60000.0 * np.exp(np.cumsum(drift + rng.normal(0, 0.001, n)))).tolist()
+
+
+def _check(eng, closed, live, price, params, where):
+    got = eng.evaluate(price)
+    want = compute_signal(closed + [live], price, **params)
+    if got != want:
+        raise AssertionError(f"{where} params={params}: engine={got} compute_signal={want}")
+    return got[0]
+
+
+def run(params: dict, bars: int, seed: int) -> Counter:
+    rng = np.random.default_rng(seed + 1000)
+    cl = make_closes(bars, seed)
+    need = max(params["ema_fast"], params["ema_slow"]) * 3
+    eng = IndicatorEngine(**params)
+    seen = Counter()
+
+    # старт: sync() на окне истории (последняя строка — live)
+    start = need + 5
+    rows = [(i * IV, c) for i, c in enumerate(cl[:start])]
+    eng.sync(rows)
+    closed = cl[:start - 1]
+    seen[_check(eng, closed, cl[start - 1], cl[start - 1], params, f"sync seed={seed}")] += 1
+
+    for i in range(start - 1, bars - 1):
+        # несколько движений live-цены внутри бара
+        for _ in range(3):
+            live = cl[i] * (1 + rng.normal(0, 0.0008))
+            eng.update_live(i * IV, live)
+            seen[_check(eng, closed, live, live, params, f"live seed={seed} bar={i}")] += 1
+        # бар закрывается по своей цене, открывается следующий
+        eng.close_bar(i * IV, cl[i])
+        closed.append(cl[i])
+        eng.update_live((i + 1) * IV, cl[i + 1])
+        seen[_check(eng, closed, cl[i + 1], cl[i + 1], params, f"close seed={seed} bar={i}")] += 1
+        # изредка биржа правит уже закрытый бар
+        if rng.random() < 0.02:
+            j = int(rng.integers(1, 4))
+            fixed = closed[-j] * (1 + rng.normal(0, 0.0005))
+            eng.close_bar((i + 1 - j) * IV, fixed)
+            closed[-j] = fixed
+            seen[_check(eng, closed, cl[i + 1], cl[i + 1], params, f"revise seed={seed} bar={i}")] += 1
+        # изредка — рестарт процесса из снапшота
+        if rng.random() < 0.01:
+            eng = IndicatorEngine.from_snapshot(eng.snapshot(), **params)
+            eng.update_live((i + 1) * IV, cl[i + 1])
+            seen[_check(eng, closed, cl[i + 1], cl[i + 1], params, f"snapshot seed={seed} bar={i}")] += 1
+    return seen
+
+
+def check_parity(bars: int = 3000, seeds: int = 3) -> dict:
+    out = {}
+    for p in PARAMS:
+        seen = Counter()
+        t0 = time.perf_counter()
+        for seed in range(seeds):
+            seen += run(p, max(bars, max(p["ema_fast"], p["ema_slow"]) * 3 + 200), seed)
+        out[f"{p['ema_fast']}/{p['ema_slow']}"] = dict(seen, sec=round(time.perf_counter() - t0, 2))
+    return out
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--bars", type=int, default=3000)
+    ap.add_argument("--seeds", type=int, default=3)
+    a = ap.parse_args()
+    print(json.dumps({"engine_parity": check_parity(a.bars, a.seeds)}, indent=2))
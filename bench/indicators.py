@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+# Паритет и скорость core/indicators против прежних Python-циклов (эталоны ниже — их копии).
+# Паритет: EMA/MID с точностью до округления (rtol), кроссы и пары — точное совпадение индексов.
+#   python -m bench.indicators --bars 100000 --repeat 3
+import argparse, json, time
+
+import numpy as np
+
+from core import indicators as ind
+
+
+# ---------------- эталоны (прежние реализации из core/core.py и core/charts_core.py)
+def ref_ema(arr, period):
+    if not arr:
+        return []
+    if period <= 1:
+        return list(arr)
+    a = 2.0 / (period + 1.0)
+    out = [arr[0]]
+    for x in arr[1:]:
+        out.append(a * x + (1.0 - a) * out[-1])
+    return out
+
+def ref_mid(hi, lo, cl, smooth):
+    raw = [(h + l + c) / 3.0 for h, l, c in zip(hi, lo, cl)]
+    return ref_ema(raw, smooth) if smooth and smooth > 1 else raw
+
+def ref_find_cross_points(ema_f, ema_s, entry_min_gap_pct, cross_grace_bars):
+    n = min(len(ema_f), len(ema_s))
+    buy_idx, sell_idx = [], []
+    up_flag = 0
+    dn_flag = 0
+    for i in range(1, n):
+        f0, s0 = ema_f[i-1], ema_s[i-1]
+        f1, s1 = ema_f[i],   ema_s[i]
+        if f0 < s0 and f1 >= s1:
+            up_flag = max(1, int(cross_grace_bars))
+        if f0 > s0 and f1 <= s1:
+            dn_flag = max(1, int(cross_grace_bars))
+        if up_flag > 0 and f1 >= s1 * (1.0 + entry_min_gap_pct):
+            buy_idx.append(i); up_flag = 0
+        elif up_flag > 0:
+            up_flag -= 1
+        if dn_flag > 0 and f1 <= s1 * (1.0 - entry_min_gap_pct):
+            sell_idx.append(i); dn_flag = 0
+        elif dn_flag > 0:
+            dn_flag -= 1
+    return buy_idx, sell_idx
+
+def ref_pair_crosses(buy_idx, sell_idx):
+    pairs = []; si = 0
+    for b in buy_idx:
+        while si < len(sell_idx) and sell_idx[si] <= b:
+            si += 1
+        if si < len(sell_idx):
+            pairs.append((b, sell_idx[si]))
+            si += 1
+    return pairs
+
+
+# ---------------- данные
+def make_bars(n, seed=1):
+    rng = np.random.default_rng(seed)
+    cl = 60000.0 * np.exp(np.cumsum(rng.normal(0, 0.0015, n)))
+    hi = cl * (1 + np.abs(rng.normal(0, 0.0007, n)))
+    lo = cl * (1 - np.abs(rng.normal(0, 0.0007, n)))
+    return hi, lo, cl
+
+
+def _best(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter(); fn(); dt = time.perf_counter() - t0
+        best = dt if best is None else min(best, dt)
+    return best
+
+
+def check_parity(bars=100_000, periods=(2, 9, 20, 50, 200), gaps=(0.0, 0.0005, 0.005), graces=(1, 3, 5)):
+    hi, lo, cl = make_bars(bars)
+    cl_l = cl.tolist()
+    errs = {}
+    for p in periods:
+        r = np.array(ref_ema(cl_l, p))
+        errs[f"ema{p}"] = float(np.max(np.abs(ind.ema(cl, p) - r) / np.abs(r)))
+    errs["mid9"] = float(np.max(np.abs(ind.mid(hi, lo, cl, 9) - np.array(ref_mid(hi.tolist(), lo.tolist(), cl_l, 9))) / cl))
+    # короткие окна ema() и окна торгового сигнала любой длины (ema_exact в compute_signal /
+    # IndicatorEngine, в т.ч. EMA_SLOW >= 86 -> окно > SMALL_N) — бит-в-бит
+    short = cl_l[:60]
+    assert ind.ema(short, 9).tolist() == ref_ema(short, 9), "short EMA must be bit-exact"
+    from core.core import _ema_seq
+    for p in (9, 20, 86, 100, 200):
+        w = cl_l[:max(9, p) * 3]
+        assert _ema_seq(w, p) == ref_ema(w, p), f"signal EMA({p}) on {len(w)} bars must be bit-exact"
+    for v in errs.values():
+        assert v < 1e-9, errs
+
+    # кроссы/пары считаем по одним и тем же EMA, чтобы сравнивать только логику
+    f = ref_ema(cl_l, 9); s = ref_ema(cl_l, 20)
+    fa, sa = np.array(f), np.array(s)
+    n_cases = 0
+    for gap in gaps:
+        for g in graces:
+            rb, rs = ref_find_cross_points(f, s, gap, g)
+            vb, vs = ind.find_cross_points(fa, sa, gap, g)
+            assert rb == vb.tolist() and rs == vs.tolist(), (gap, g)
+            assert ref_pair_crosses(rb, rs) == ind.pair_crosses(vb, vs), (gap, g)
+            n_cases += 1
+    return {"bars": bars, "max_rel_err": errs, "cross_cases": n_cases}
+
+
+def bench(bars=100_000, repeat=3):
+    hi, lo, cl = make_bars(bars)
+    cl_l, hi_l, lo_l = cl.tolist(), hi.tolist(), lo.tolist()
+    f = ref_ema(cl_l, 9); s = ref_ema(cl_l, 20)
+    fa, sa = np.array(f), np.array(s)
+    rb, rs = ref_find_cross_points(f, s, 0.0005, 3)
+    vb, vs = ind.find_cross_points(fa, sa, 0.0005, 3)
+    cases = {
+        "ema20":  (lambda: ref_ema(cl_l, 20), lambda: ind.ema(cl, 20)),
+        "mid9":   (lambda: ref_mid(hi_l, lo_l, cl_l, 9), lambda: ind.mid(hi, lo, cl, 9)),
+        "crosses": (lambda: ref_find_cross_points(f, s, 0.0005, 3), lambda: ind.find_cross_points(fa, sa, 0.0005, 3)),
+        "pairs":  (lambda: ref_pair_crosses(rb, rs), lambda: ind.pair_crosses(vb, vs)),
+    }
+    out = {}
+    for name, (ref, vec) in cases.items():
+        t_ref, t_vec = _best(ref, repeat), _best(vec, repeat)
+        out[name] = {"loop_ms": round(t_ref * 1000, 2), "numpy_ms": round(t_vec * 1000, 2),
+                     "speedup": round(t_ref / t_vec, 1) if t_vec else None}
+    return out
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--bars", type=int, default=100_000)
+    ap.add_argument("--repeat", type=int, default=3)
+    a = ap.parse_args()
+    print(json.dumps({"parity": check_parity(a.bars), "bench": bench(a.bars, a.repeat)}, indent=2))
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+# Бенчмарк конкурентной записи в SQLite: профиль по умолчанию vs DB_PROFILE (WAL, synchronous=NORMAL, busy_timeout...).
+# Несколько процессов-писателей делают короткие транзакции (как price_agg_ws/ebot), один читатель
+# сканирует таблицу (как отчёты). Печатает коммиты/сек и число ошибок "database is locked".
+#   python -m bench.sqlite_writers --writers 4 --seconds 5
+import argparse, json, os, tempfile, time
+from multiprocessing import Process, Queue
+
+def _worker(kind, dsn, profile, seconds, q):
+    from sqlalchemy import text
+    from sqlalchemy.exc import OperationalError
+    from db.base import make_engine
+    eng = make_engine(dsn, role="service" if kind == "writer" else "report", profile=profile)
+    ok = err = 0
+    t_end = time.time() + seconds
+    while time.time() < t_end:
+        try:
+            with eng.begin() as c:
+                if kind == "writer":
+                    c.execute(text("INSERT INTO signals (ts_ms, pair, exchange, interval, signal) "
+                                   "VALUES (:t, 'BTCUSDC', 'MEXC', '1m', 'HOLD')"), {"t": int(time.time()*1000)})
+                else:
+                    c.execute(text("SELECT COUNT(*), MAX(ts_ms) FROM signals")).fetchone()
+            ok += 1
+        except OperationalError:
+            err += 1
+    eng.dispose()
+    q.put((kind, ok, err))
+
+def run(profile_name, profile, writers, seconds):
+    from db.base import make_engine
+    from db.models import Base
+    fd, path = tempfile.mkstemp(suffix=".db"); os.close(fd)
+    dsn = f"sqlite:///{path}"
+    eng = make_engine(dsn, profile=profile)
+    Base.metadata.create_all(bind=eng)
+    eng.dispose()
+    q = Queue()
+    procs = [Process(target=_worker, args=("writer", dsn, profile, seconds, q)) for _ in range(writers)]
+    procs.append(Process(target=_worker, args=("reader", dsn, profile, seconds, q)))
+    for p in procs: p.start()
+    res = [q.get() for _ in procs]
+    for p in procs: p.join()
+    for ext in ("", "-wal", "-shm"):
+        try: os.remove(path + ext)
+        except OSError: pass
+    w_ok = sum(r[1] for r in res if r[0] == "writer"); w_err = sum(r[2] for r in res if r[0] == "writer")
+    r_ok = sum(r[1] for r in res if r[0] == "reader")
+    return {"profile": profile_name, "writers": writers, "seconds": seconds,
+            "write_commits_per_sec": round(w_ok / seconds, 1), "write_locked_errors": w_err,
+            "reads_per_sec": round(r_ok / seconds, 1)}
+
+def main():
+    from config_loader import cfg
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--writers", type=int, default=4)
+    ap.add_argument("--seconds", type=float, default=5.0)
+    a = ap.parse_args()
+    before = run("default", {"ENABLED": False}, a.writers, a.seconds)
+    after = run("tuned", dict(getattr(cfg, "DB_PROFILE", {}), ENABLED=True), a.writers, a.seconds)
+    for r in (before, after):
+        print(json.dumps(r))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+# -*- coding: utf-8 -*-
+# Микробенчмарки горячих функций бота на синтетических SQLite-базах (без сети; только DRY_RUN=True).
+# Базы строятся один раз и кэшируются в --data-dir: свечи 10k / 1M / 10M (1m, до 10 пар), 100k сигналов.
+# Каждая функция меряется отдельно (разогрев + repeat прогонов, best и median), результат — JSON;
+# --baseline сравнивает с сохранённым прогоном и завершается с кодом 1 при регрессии > --threshold.
+#   python -m bench.suite --sizes 10k,1m --out bench_now.json
+#   python -m bench.suite --save-baseline bench_base.json          — снять эталон
+#   python -m bench.suite --baseline bench_base.json --threshold 0.2
+#   python -m bench.suite --only compute_signal,save_klines --sizes 10k
+import argparse, json, os, platform, sqlite3, statistics, sys, tempfile, time
+
+import numpy as np
+
+SIZES = {"10k": 10_000, "1m": 1_000_000, "10m": 10_000_000}
+N_SIGNALS = 100_000
+SYMBOL, EXCHANGE, INTERVAL = "BTCUSDC", "MEXC", "1m"
+IV = 60_000
+T0 = 1_600_000_000_000 // IV * IV      # начало синтетической истории
+
+
+# ---------------- синтетические базы
+def _use_db(path: str) -> None:
+    """Переключить db.base на файл path (как configure(), но на другой DSN) и сбросить кэши процесса."""
+    from db import base, candles_io
+    from core import indicator_engine
+    old = base.ENGINE
+    base.ENGINE = base.make_engine(f"sqlite:///{path}", role="service")
+    base.SessionLocal.configure(bind=base.ENGINE)
+    old.dispose()
+    candles_io._RINGS.clear()
+    indicator_engine._ENGINES.clear()
+
+
+def _pairs_for(n: int):
+    k = max(1, min(10, n // 100_000))
+    return [SYMBOL] + [f"SYN{i}USDC" for i in range(1, k)]
+
+
+def _fill_candles(con, n: int, seed: int = 1) -> None:
+    pairs = _pairs_for(n)
+    per = n // len(pairs)
+    rng = np.random.default_rng(seed)
+    chunk = 500_000
+    for pair in pairs:
+        price = 60000.0
+        for a in range(0, per, chunk):
+            m = min(chunk, per - a)
+            cl = price * np.exp(np.cumsum(rng.normal(0, 0.0015, m)))
+            op = np.r_[price, cl[:-1]]
+            hi = np.maximum(op, cl) * (1 + np.abs(rng.normal(0, 0.0005, m)))
+            lo = np.minimum(op, cl) * (1 - np.abs(rng.normal(0, 0.0005, m)))
+            vol = np.abs(rng.normal(5, 2, m))
+            ts = T0 + (a + np.arange(m, dtype=np.int64)) * IV
+            con.executemany(
+                "INSERT INTO candles (pair, exchange, interval, ts_ms, open, high, low, close, volume) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                zip([pair] * m, [EXCHANGE] * m, [INTERVAL] * m, ts.tolist(),
+                    op.tolist(), hi.tolist(), lo.tolist(), cl.tolist(), vol.tolist()))
+            con.commit()
+            price = float(cl[-1])
+
+
+def _fill_signals(con, n: int, seed: int = 2) -> None:
+    rng = np.random.default_rng(seed)
+    ts = np.sort(T0 + rng.integers(0, 30 * 86_400_000, n))
+    sig = rng.choice(["BUY", "SELL", "HOLD", "HOLD"], n)
+    reason = rng.choice(["cross_up+gap", "no_entry", "hold"], n)
+    con.executemany(
+        "INSERT INTO signals (ts_ms, pair, exchange, interval, signal, ema_fast, ema_slow, gap_bps, exec_status, reason, meta_json) "
+        "VALUES (?, ?, ?, ?, ?, 1.0, 1.0, 0.0, 'ok', ?, '{}')",
+        zip(ts.tolist(), [SYMBOL] * n, [EXCHANGE] * n, [INTERVAL] * n, sig.tolist(), reason.tolist()))
+    con.commit()
+
+
+def build_db(data_dir: str, name: str, candles: int = 0, signals: int = 0) -> str:
+    """Файл базы data_dir/<name>.db со схемой проекта; строится один раз (признак готовности — <name>.ok)."""
+    os.makedirs(data_dir, exist_ok=True)
+    path = os.path.join(data_dir, f"{name}.db")
+    done = path + ".ok"
+    if os.path.exists(done):
+        return path
+    for ext in ("", "-wal", "-shm"):
+        if os.path.exists(path + ext):
+            os.remove(path + ext)
+    from db.base import create_all
+    _use_db(path)
+    create_all()
+    t0 = time.time()
+    con = sqlite3.connect(path)
+    con.execute("PRAGMA journal_mode=WAL")
+    con.execute("PRAGMA synchronous=OFF")
+    if candles:
+        _fill_candles(con, candles)
+    if signals:
+        _fill_signals(con, signals)
+    con.close()
+    open(done, "w").write(json.dumps({"candles": candles, "signals": signals, "build_sec": round(time.time() - t0, 1)}))
+    print(f"bench: built {name} in {time.time() - t0:.1f}s", file=sys.stderr)
+    return path
+
+
+# ---------------- замер
+def measure(fn, repeat: int = 5, warmup: int = 1) -> dict:
+    for _ in range(warmup):
+        fn()
+    ts = []
+    for _ in range(repeat):
+        t0 = time.perf_counter(); fn(); ts.append(time.perf_counter() - t0)
+    return {"best_ms": round(min(ts) * 1000, 4), "median_ms": round(statistics.median(ts) * 1000, 4), "repeat": repeat}
+
+
+def _closes(n: int, seed: int = 3):
+    rng = np.random.default_rng(seed)
+    return (60000.0 * np.exp(np.cumsum(rng.normal(0, 0.0015, n)))).tolist()
+
+
+# ---------------- кейсы без БД
+def cases_pure():
+    from core.core import compute_signal
+    from core import indicators as ind
+    cl500 = _closes(500)
+    cl100k = np.asarray(_closes(100_000))
+    f, s = ind.ema(cl100k, 9), ind.ema(cl100k, 20)
+    return {
+        "compute_signal[500]": lambda: compute_signal(cl500, cl500[-1]),
+        "ema[100k]": lambda: ind.ema(cl100k, 20),
+        "find_cross_points[100k]": lambda: ind.find_cross_points(f, s, 0.0005, 3),
+    }
+
+
+# ---------------- кейсы на базе свечей
+def cases_candles(tmp_dir: str):
+    from db.candles_io import load_tail, candles_tail
+    from db.wallet import ensure_start_balance
+    from core.engine import process_signal
+    from core.charts_core import make_candles_png
+    from services.candles_fetch import save_klines
+
+    last = load_tail(SYMBOL, EXCHANGE, INTERVAL, 1)[-1]
+    last_ts, px = int(last[0]), float(last[4])
+    klines = [[last_ts + (i - 999) * IV, px, px * 1.001, px * 0.999, px, 1.0] for i in range(1000)]
+    ensure_start_balance()
+    png = os.path.join(tmp_dir, "bench.png")
+
+    def _round_trip():
+        process_signal(SYMBOL, EXCHANGE, INTERVAL, "BUY", px)
+        process_signal(SYMBOL, EXCHANGE, INTERVAL, "SELL", px * 1.001)
+
+    candles_tail(SYMBOL, EXCHANGE, INTERVAL, 500)
+    return {
+        "load_tail[500]": lambda: load_tail(SYMBOL, EXCHANGE, INTERVAL, 500),
+        "candles_tail[500]": lambda: candles_tail(SYMBOL, EXCHANGE, INTERVAL, 500),
+        "save_klines[1000]": lambda: save_klines(klines, SYMBOL, INTERVAL, EXCHANGE),
+        "process_signal[buy+sell]": _round_trip,
+        "make_candles_png[60]": lambda: make_candles_png(SYMBOL, EXCHANGE, INTERVAL, png, n=60, use_cache=False),
+    }
+
+
+# ---------------- кейсы на базе сигналов
+def cases_signals():
+    from db import stats
+    from db.signals_io import SignalSink
+
+    def _refresh_full():
+        stats.rebuild()
+
+    sink = SignalSink(batch=10 ** 9, flush_sec=3600, log_file=os.path.join(tempfile.gettempdir(), "bench_signals.log"))
+
+    def _sink_1000():
+        for i in range(1000):
+            sink.record(SYMBOL, EXCHANGE, INTERVAL, "HOLD", {"reason": "hold", "gap": 0.0}, {"status": "skip"}, 1.0)
+        sink.flush()
+
+    now = T0 + 30 * 86_400_000
+    return {
+        "stats_rebuild[100k]": _refresh_full,
+        "stats_window_24h": lambda: stats.window(stats.WINDOWS_MS["24h"], now),
+        "signal_sink[1000]": _sink_1000,
+    }
+
+
+def run(sizes, data_dir: str, repeat: int, only=None) -> dict:
+    from config_loader import cfg
+    # process_signal в LIVE поставил бы настоящие ордера через exch/mexc
+    if not getattr(cfg, "DRY_RUN", True):
+        raise SystemExit("bench: только DRY_RUN=True (process_signal в LIVE торгует на бирже)")
+    want = (lambda name: any(name.startswith(o) for o in only)) if only else (lambda name: True)
+    out = {}
+    tmp = tempfile.mkdtemp(prefix="ebot_bench_")
+
+    def _run(cases, suffix=""):
+        for name, fn in cases.items():
+            if want(name):
+                out[name + suffix] = measure(fn, repeat)
+
+    _run(cases_pure())
+    for size in sizes:
+        _use_db(build_db(data_dir, f"candles_{size}", candles=SIZES[size]))
+        _run(cases_candles(tmp), f"@{size}")
+    if any(want(n) for n in ("stats_", "signal_sink")):
+        _use_db(build_db(data_dir, "signals_100k", signals=N_SIGNALS))
+        _run(cases_signals())
+    return out
+
+
+# ---------------- сравнение с эталоном
+def compare(cur: dict, base: dict, threshold: float, min_ms: float) -> list:
+    """Регрессии: best_ms вырос больше чем на threshold (доля) и больше чем на min_ms (шум)."""
+    rows = []
+    for name, r in sorted(cur.items()):
+        b = base.get(name)
+        if not b:
+            continue
+        c_ms, b_ms = r["best_ms"], b["best_ms"]
+        ratio = c_ms / b_ms if b_ms else float("inf")
+        rows.append({"name": name, "base_ms": b_ms, "cur_ms": c_ms, "ratio": round(ratio, 3),
+                     "regression": ratio > 1.0 + threshold and c_ms - b_ms > min_ms})
+    return rows
+
+
+def _meta() -> dict:
+    return {"ts": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()), "python": platform.python_version(),
+            "numpy": np.__version__, "sqlite": sqlite3.sqlite_version, "machine": platform.machine(),
+            "cpu_count": os.cpu_count()}
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", default="10k,1m,10m", help="размеры баз свечей: " + ",".join(SIZES))
+    ap.add_argument("--data-dir", default=os.path.join(tempfile.gettempdir(), "ebot_bench"))
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--only", default=None, help="префиксы имён кейсов через запятую")
+    ap.add_argument("--out", default=None, help="записать результат в JSON")
+    ap.add_argument("--save-baseline", default=None, help="записать результат как эталон")
+    ap.add_argument("--baseline", default=None, help="сравнить с эталоном")
+    ap.add_argument("--threshold", type=float, default=0.2, help="допустимый рост времени (0.2 = +20%%)")
+    ap.add_argument("--min-ms", type=float, default=0.05, help="разница меньше — шум, не регрессия")
+    a = ap.parse_args()
+
+    sizes = [x.strip().lower() for x in a.sizes.split(",") if x.strip()]
+    unknown = [x for x in sizes if x not in SIZES]
+    if unknown:
+        ap.error(f"unknown sizes: {unknown}")
+    only = [x.strip() for x in a.only.split(",")] if a.only else None
+
+    res = {"meta": _meta(), "results": run(sizes, a.data_dir, a.repeat, only)}
+    for path in (a.out, a.save_baseline):
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(res, f, indent=2)
+    print(json.dumps(res, indent=2))
+
+    if a.baseline:
+        with open(a.baseline, encoding="utf-8") as f:
+            base = json.load(f)["results"]
+        rows = compare(res["results"], base, a.threshold, a.min_ms)
+        for r in rows:
+            flag = "REGRESSION" if r["regression"] else "ok"
+            print(f"{r['name']:<36} {r['base_ms']:>10.3f} -> {r['cur_ms']:>10.3f} ms  x{r['ratio']:<6} {flag}")
+        if any(r["regression"] for r in rows):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
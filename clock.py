@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+# Часы бота. По умолчанию — реальное время; replay (services/replay.py) ставит виртуальное,
+# чтобы ts_open_ms/ts_close_ms сделок, ts сигналов и кошелька шли по истории, а не по wall-clock.
+# Торговый путь берёт время только отсюда: clock.now_ms().
+import time
+from typing import Optional
+
+_VIRTUAL_MS: Optional[int] = None
+
+
+def now_ms() -> int:
+    v = _VIRTUAL_MS
+    return int(time.time() * 1000) if v is None else v
+
+
+def now() -> float:
+    return now_ms() / 1000.0
+
+
+def set_ms(ts_ms: Optional[int]) -> None:
+    """Виртуальное время (ms); None — вернуться к реальному."""
+    global _VIRTUAL_MS
+    _VIRTUAL_MS = None if ts_ms is None else int(ts_ms)
+
+
+def is_virtual() -> bool:
+    return _VIRTUAL_MS is not None
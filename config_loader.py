@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""
+Единый загрузчик config.py: парсится один раз, кэшируется, перечитывается при смене mtime.
+
+    from config_loader import cfg
+    cfg.STRATEGY.get("EMA_FAST", 9)        # как раньше с `import config as cfg`
+    strategy().ema_fast                     # типизированный доступ
+
+mtime проверяется не чаще CONFIG_RELOAD_SEC (из самого config.py, по умолчанию 2с),
+так что на горячем пути это одно сравнение времени. Если новый config.py не
+исполняется (синтаксис и т.п.) — остаётся прежняя версия, ошибка печатается.
+Значения, прочитанные модулями при импорте (константы модуля), обновятся только после рестарта.
+"""
+from __future__ import annotations
+
+import os
+import time
+import threading
+import importlib
+import importlib.util
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+
+def _config_path() -> str:
+    p = os.environ.get("EBOT_CONFIG")
+    if p:
+        return os.path.abspath(p)
+    spec = importlib.util.find_spec("config")
+    if spec is None or not spec.origin:
+        raise ImportError("config.py not found (set EBOT_CONFIG or add it to sys.path)")
+    return spec.origin
+
+
+class _Loader:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._path: Optional[str] = None
+        self._mod = None
+        self._mtime = 0.0
+        self._checked = 0.0
+        self.version = 0
+
+    def _exec(self, path: str):
+        if self._mod is None and os.environ.get("EBOT_CONFIG") is None:
+            mod = importlib.import_module("config")   # первый раз — обычный импорт
+        else:
+            spec = importlib.util.spec_from_file_location("config", path)
+            mod = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(mod)
+        return mod
+
+    def current(self):
+        now = time.monotonic()
+        mod = self._mod
+        if mod is not None and now - self._checked < float(getattr(mod, "CONFIG_RELOAD_SEC", 2.0)):
+            return mod
+        with self._lock:
+            if self._mod is not None and now - self._checked < float(getattr(self._mod, "CONFIG_RELOAD_SEC", 2.0)):
+                return self._mod
+            self._checked = now
+            if self._path is None:
+                self._path = _config_path()
+            try:
+                mtime = os.stat(self._path).st_mtime
+            except OSError:
+                mtime = self._mtime
+            if self._mod is None or mtime != self._mtime:
+                try:
+                    self._mod = self._exec(self._path)
+                    self._mtime = mtime
+                    self.version += 1
+                except Exception as e:
+                    if self._mod is None:
+                        raise
+                    print(f"[config] reload failed, keeping previous: {e!r}")
+                    self._mtime = mtime
+            return self._mod
+
+
+_LOADER = _Loader()
+
+
+class _ConfigProxy:
+    """Ведёт себя как модуль config: атрибуты читаются из актуальной версии."""
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(_LOADER.current(), name)
+
+    def __dir__(self):
+        return dir(_LOADER.current())
+
+
+cfg = _ConfigProxy()
+
+
+def current():
+    """Актуальный модуль config."""
+    return _LOADER.current()
+
+
+def version() -> int:
+    """Номер версии конфига; растёт при каждой перезагрузке."""
+    _LOADER.current()
+    return _LOADER.version
+
+
+# ---------------- типизированные секции
+@dataclass(frozen=True)
+class StrategyCfg:
+    pairs: List[Dict[str, str]] = field(default_factory=list)
+    ema_fast: int = 9
+    ema_slow: int = 20
+    gap_threshold_bps: float = 50.0
+    cross_grace_bars: int = 3
+
+    @property
+    def gap_pct(self) -> float:
+        return self.gap_threshold_bps / 10000.0
+
+
+@dataclass(frozen=True)
+class TradeCfg:
+    base_quote: str = "USDC"
+    alloc_mode: str = "PCT"
+    alloc_pct: float = 5.0
+    min_notional_usd: float = 0.0
+    order_type: str = "MARKET"
+    slippage_bps: float = 0.0
+
+
+@dataclass(frozen=True)
+class RiskCfg:
+    stop_loss_pct: float = 0.005
+
+
+@dataclass(frozen=True)
+class TelegramCfg:
+    enabled: bool = True
+    bot_token: str = ""
+    chat_id: Any = ""
+    api_base: str = "https://api.telegram.org"
+
+    @property
+    def active(self) -> bool:
+        return bool(self.enabled) and bool(self.bot_token) and bool(self.chat_id)
+
+
+_TYPED: Dict[str, Any] = {}
+_TYPED_VERSION = -1
+
+
+def _typed(name: str, build):
+    global _TYPED_VERSION
+    v = version()
+    if v != _TYPED_VERSION:
+        _TYPED.clear()
+        _TYPED_VERSION = v
+    obj = _TYPED.get(name)
+    if obj is None:
+        obj = _TYPED[name] = build(current())
+    return obj
+
+
+def strategy() -> StrategyCfg:
+    def b(m):
+        st = getattr(m, "STRATEGY", {})
+        return StrategyCfg(
+            pairs=list(st.get("PAIRS", [])),
+            ema_fast=int(st.get("EMA_FAST", 9)),
+            ema_slow=int(st.get("EMA_SLOW", 20)),
+            gap_threshold_bps=float(st.get("GAP_THRESHOLD_BPS", 50)),
+            cross_grace_bars=int(st.get("CROSS_GRACE_BARS", 3)),
+        )
+    return _typed("STRATEGY", b)
+
+
+def trade() -> TradeCfg:
+    def b(m):
+        t = getattr(m, "TRADE", {})
+        return TradeCfg(
+            base_quote=str(t.get("BASE_QUOTE", "USDC")),
+            alloc_mode=str(t.get("ALLOC_MODE", "PCT")),
+            alloc_pct=float(t.get("ALLOC_PCT", 5.0)),
+            min_notional_usd=float(t.get("MIN_NOTIONAL_USD", 0.0)),
+            order_type=str(t.get("ORDER_TYPE", "MARKET")),
+            slippage_bps=float(t.get("SLIPPAGE_BPS", 0.0)),
+        )
+    return _typed("TRADE", b)
+
+
+def risk() -> RiskCfg:
+    def b(m):
+        return RiskCfg(stop_loss_pct=float(getattr(m, "RISK", {}).get("STOP_LOSS_PCT", 0.005)))
+    return _typed("RISK", b)
+
+
+def telegram() -> TelegramCfg:
+    def b(m):
+        t = getattr(m, "TELEGRAM", {})
+        return TelegramCfg(
+            enabled=bool(t.get("ENABLED", True)),
+            bot_token=t.get("BOT_TOKEN", "") or "",
+            chat_id=t.get("CHAT_ID", "") or "",
+            api_base=str(t.get("API_BASE", "https://api.telegram.org")).rstrip("/"),
+        )
+    return _typed("TELEGRAM", b)
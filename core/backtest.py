@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+# Векторный бэктест стратегии EMA-кросса по истории candles.
+# Сигнал на баре i — как compute_signal(closes[:i+1], price_now=closes[i]):
+# окно последних n = max(fast, slow)*3 закрытий, EMA засеивается первым значением окна.
+# Оконная EMA — это свёртка окна с фиксированным ядром, поэтому весь ряд считается
+# через np.correlate без Python-цикла по барам (совпадает с compute_signal до ошибки округления).
+# Сделки — правила core/engine.process_signal: BUY на ALLOC_PCT свободного USDC,
+# выход по SELL или стоп-лоссу STOP_LOSS_PCT от цены входа.
+from __future__ import annotations
+from itertools import product
+from typing import Dict, List, Optional
+import os
+
+import numpy as np
+
+HOLD, BUY, SELL = 0, 1, -1
+
+
+def _window_ema_kernel(length: int, period: int) -> np.ndarray:
+    a = 2.0 / (period + 1.0)
+    p = (1.0 - a) ** np.arange(length - 1, -1, -1, dtype=np.float64)
+    w = a * p
+    w[0] = p[0]   # вес затравки — первого значения окна
+    return w
+
+
+def _window_ema_at(closes: np.ndarray, n: int, period: int, d: int) -> np.ndarray:
+    """EMA(period) на позиции n-1-d окна длины n, для каждого live-бара i >= n-1."""
+    L = n - d
+    w = _window_ema_kernel(L, period)
+    return np.correlate(closes, w, mode="valid")[: len(closes) - n + 1]
+
+
+def signal_parts(closes, ema_fast: int = 9, ema_slow: int = 20, cross_grace_bars: int = 3):
+    """Части сигнала, не зависящие от порога gap: (n, sell, window_ok, gap) для баров i >= n-1."""
+    x = np.asarray(closes, dtype=np.float64)
+    n = max(int(ema_fast), int(ema_slow)) * 3
+    if len(x) < n or n < 3:
+        return n, None, None, None
+    G = int(cross_grace_bars)
+    f = [_window_ema_at(x, n, ema_fast, d) for d in range(G + 2)]
+    s = [_window_ema_at(x, n, ema_slow, d) for d in range(G + 2)]
+
+    # кросс вверх между позициями k-off-1 -> k-off, off = 1..G (иначе окно grace не пройдено)
+    window_ok = np.zeros(len(x) - n + 1, dtype=bool)
+    for off in range(1, G + 1):
+        window_ok |= (f[off + 1] < s[off + 1]) & (f[off] >= s[off])
+
+    price = x[n - 1:]
+    price = np.where(price != 0, price, 1.0)
+    gap = (f[0] - s[0]) / price
+    sell = f[0] <= s[0]
+    return n, sell, window_ok, gap
+
+
+def signals_from_parts(N: int, parts, entry_min_gap_pct: float) -> np.ndarray:
+    n, sell, window_ok, gap = parts
+    out = np.zeros(N, dtype=np.int8)
+    if sell is None:
+        return out
+    buy = (~sell) & window_ok & (gap >= float(entry_min_gap_pct))
+    out[n - 1:] = np.where(sell, SELL, np.where(buy, BUY, HOLD))
+    return out
+
+
+def signals(closes, ema_fast: int = 9, ema_slow: int = 20,
+            entry_min_gap_pct: float = 0.0005, cross_grace_bars: int = 3) -> np.ndarray:
+    """Массив сигналов по барам: BUY=1, SELL=-1, HOLD=0."""
+    parts = signal_parts(closes, ema_fast, ema_slow, cross_grace_bars)
+    return signals_from_parts(len(closes), parts, entry_min_gap_pct)
+
+
+def _first_true_from(mask_fn, start: int, N: int, chunk: int = 4096) -> int:
+    i = start
+    while i < N:
+        j = min(N, i + chunk)
+        hit = np.flatnonzero(mask_fn(i, j))
+        if len(hit):
+            return i + int(hit[0])
+        i = j
+    return N
+
+
+def simulate(closes, sig: np.ndarray, ts=None, start_quote: float = 1000.0,
+             alloc_pct: float = 5.0, stop_loss_pct: float = 0.005) -> Dict:
+    """Прогон правил process_signal по барам; переходы ищутся векторно, цикл — только по сделкам."""
+    x = np.asarray(closes, dtype=np.float64)
+    N = len(x)
+    alloc = float(alloc_pct) / 100.0
+    free = float(start_quote)
+    buy_idx = np.flatnonzero(sig == BUY)
+    is_sell = sig == SELL
+
+    trades: List[Dict] = []
+    # equity = free + qty*close; собираем кусочно: free и qty постоянны между сделками
+    free_arr = np.empty(N, dtype=np.float64)
+    qty_arr = np.zeros(N, dtype=np.float64)
+
+    i = 0
+    while i < N:
+        k = np.searchsorted(buy_idx, i)
+        b = N
+        while k < len(buy_idx):
+            cand = int(buy_idx[k])
+            if x[cand] > 0:
+                b = cand
+                break
+            k += 1
+        free_arr[i:b] = free
+        if b >= N:
+            break
+        spend = max(0.0, free * alloc)
+        if spend <= 0:
+            free_arr[b:] = free
+            break
+        entry = float(x[b]); qty = spend / entry
+        free -= spend
+        sl_px = entry * (1.0 - float(stop_loss_pct))
+        e = _first_true_from(lambda a, z: is_sell[a:z] | (x[a:z] <= sl_px), b + 1, N)
+        free_arr[b:e] = free
+        qty_arr[b:e] = qty
+        if e >= N:
+            trades.append(dict(open_i=b, close_i=None, entry=entry, exit=None, qty=qty, pnl=None, reason=None))
+            break
+        exit_px = float(x[e])
+        free += qty * exit_px
+        trades.append(dict(open_i=b, close_i=e, entry=entry, exit=exit_px, qty=qty,
+                           pnl=qty * (exit_px - entry), reason=("sell" if is_sell[e] else "sl")))
+        free_arr[e] = free
+        i = e + 1   # на баре закрытия новая позиция не открывается
+
+    equity = free_arr + qty_arr * x
+    peak = np.maximum.accumulate(equity) if N else equity
+    dd = (equity - peak) / np.where(peak > 0, peak, 1.0) if N else equity
+    closed = [t for t in trades if t["pnl"] is not None]
+    wins = sum(1 for t in closed if t["pnl"] > 0)
+    if ts is not None:
+        ts = np.asarray(ts)
+        for t in trades:
+            t["open_ms"] = int(ts[t["open_i"]])
+            t["close_ms"] = int(ts[t["close_i"]]) if t["close_i"] is not None else None
+    final = float(equity[-1]) if N else float(start_quote)
+    return {
+        "trades": trades,
+        "n_trades": len(closed),
+        "win_rate": (wins / len(closed)) if closed else None,
+        "pnl": final - float(start_quote),
+        "pnl_pct": (final - float(start_quote)) / float(start_quote) if start_quote else None,
+        "max_drawdown_pct": float(dd.min()) if N else 0.0,
+        "final_equity": final,
+    }
+
+
+def run(closes, ts=None, ema_fast=9, ema_slow=20, gap_bps=50, cross_grace_bars=3,
+        stop_loss_pct=0.005, start_quote=1000.0, alloc_pct=5.0) -> Dict:
+    sig = signals(closes, ema_fast, ema_slow, float(gap_bps) / 10000.0, cross_grace_bars)
+    res = simulate(closes, sig, ts=ts, start_quote=start_quote, alloc_pct=alloc_pct, stop_loss_pct=stop_loss_pct)
+    res["params"] = dict(ema_fast=ema_fast, ema_slow=ema_slow, gap_bps=gap_bps,
+                         cross_grace_bars=cross_grace_bars, stop_loss_pct=stop_loss_pct)
+    return res
+
+
+# ---------------- grid sweep (процессы)
+_CLOSES: Optional[np.ndarray] = None
+_COMMON: Dict = {}
+
+
+def _init_worker(closes, common):
+    global _CLOSES, _COMMON
+    _CLOSES = np.asarray(closes, dtype=np.float64)
+    _COMMON = dict(common)
+
+
+def _sweep_group(args):
+    """Одна группа (fast, slow, grace): сигнальные EMA считаются один раз, gap/SL перебираются внутри."""
+    (fast, slow, grace), gaps, sls = args
+    x = _CLOSES
+    parts = signal_parts(x, fast, slow, grace)
+    out = []
+    for g in gaps:
+        sig = signals_from_parts(len(x), parts, float(g) / 10000.0)
+        for sl in sls:
+            r = simulate(x, sig, start_quote=_COMMON.get("start_quote", 1000.0),
+                         alloc_pct=_COMMON.get("alloc_pct", 5.0), stop_loss_pct=sl)
+            r.pop("trades", None)
+            r["params"] = dict(ema_fast=fast, ema_slow=slow, gap_bps=g, cross_grace_bars=grace, stop_loss_pct=sl)
+            out.append(r)
+    return out
+
+
+def sweep(closes, grid: Dict[str, list], start_quote=1000.0, alloc_pct=5.0, workers: Optional[int] = None,
+          sort_by: str = "pnl") -> List[Dict]:
+    """grid: {EMA_FAST:[...], EMA_SLOW:[...], GAP_THRESHOLD_BPS:[...], CROSS_GRACE_BARS:[...], STOP_LOSS_PCT:[...]}"""
+    from concurrent.futures import ProcessPoolExecutor
+    groups = [(k, list(grid.get("GAP_THRESHOLD_BPS", [50])), list(grid.get("STOP_LOSS_PCT", [0.005])))
+              for k in product(grid.get("EMA_FAST", [9]), grid.get("EMA_SLOW", [20]), grid.get("CROSS_GRACE_BARS", [3]))
+              if k[0] < k[1]]
+    x = np.asarray(closes, dtype=np.float64)
+    common = {"start_quote": start_quote, "alloc_pct": alloc_pct}
+    results: List[Dict] = []
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count(),
+                             initializer=_init_worker, initargs=(x, common)) as pool:
+        for part in pool.map(_sweep_group, groups, chunksize=1):
+            results.extend(part)
+    results.sort(key=lambda r: (r.get(sort_by) is None, -(r.get(sort_by) or 0.0)))
+    return results
+
+
+def load_history(symbol: str, exchange: str, interval: str, since_ms: Optional[int] = None):
+    """(ts, closes) из candles одним запросом, без ORM-объектов."""
+    from sqlalchemy import select
+    from db.base import session_scope
+    from db.models import Candle
+    q = (select(Candle.ts_ms, Candle.close)
+         .where(Candle.pair == symbol, Candle.exchange == exchange, Candle.interval == interval))
+    if since_ms is not None:
+        q = q.where(Candle.ts_ms >= int(since_ms))
+    with session_scope() as s:
+        rows = s.execute(q.order_by(Candle.ts_ms.asc())).all()
+    ts = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+    cl = np.fromiter((r[1] or 0.0 for r in rows), dtype=np.float64, count=len(rows))
+    return ts, cl
@@ -2,8 +2,12 @@
 # Свечи (mplfinance), MSK-время, EMA9/20, MID=(H+L+C)/3 сглаженная EMA.
 # Стрелки: потенциальный вход (зелёная ↑) и ближайший последующий выход (красная ↓) по кроссам EMA.
 # Буквы B/S: фактически исполненные сделки (из БД), без ценников.
+# Кэш: рядом с PNG лежит <png>.key (хэш последней свечи, сделок и параметров); совпал — не рендерим.
 
 from __future__ import annotations
+import os
+import json
+import hashlib
 from typing import List, Tuple, Optional
 from datetime import timezone, timedelta
 
@@ -16,23 +20,17 @@ import matplotlib.pyplot as plt
 from matplotlib.lines import Line2D
 import mplfinance as mpf
 
+from core import indicators as ind
 from db.base import session_scope
-from db.models import Candle, CurrentPrice, TradeDry, TradeLive
-import config as cfg
+from db.candles_io import candles_tail
+from db.models import CurrentPrice, TradeDry, TradeLive
+from config_loader import cfg
 
 MSK = pytz.timezone("Europe/Moscow")
 
 # ---------------- EMA / helpers
 def _ema(arr: List[float], period: int) -> List[float]:
-    if not arr:
-        return []
-    if period <= 1:
-        return list(arr)
-    a = 2.0 / (period + 1.0)
-    out = [arr[0]]
-    for x in arr[1:]:
-        out.append(a * x + (1.0 - a) * out[-1])
-    return out
+    return ind.ema(arr, period).tolist()
 
 def _interval_seconds(interval: str) -> int:
     iv = (interval or "1m").strip().lower()
@@ -43,13 +41,7 @@ def _interval_seconds(interval: str) -> int:
 
 # ---------------- DB loaders (плоские кортежи, без Detached)
 def load_candles_flat(symbol: str, exchange: str, interval: str, limit: int):
-    with session_scope() as s:
-        q = (s.query(Candle.ts_ms, Candle.open, Candle.high, Candle.low, Candle.close, Candle.volume)
-               .filter(Candle.pair==symbol, Candle.exchange==exchange, Candle.interval==interval)
-               .order_by(Candle.ts_ms.desc())
-               .limit(limit))
-        rows = list(reversed(q.all()))
-    return [(int(ts), float(o), float(h), float(l), float(c), float(volume or 0.0)) for ts,o,h,l,c,volume in rows]
+    return candles_tail(symbol, exchange, interval, limit)
 
 def load_executed_trades(symbol: str, exchange: str, interval: str, limit: int = 100):
     # DRY/LIVE выбираем по cfg.DRY_RUN
@@ -71,61 +63,74 @@ def load_executed_trades(symbol: str, exchange: str, interval: str, limit: int =
     out.sort(key=lambda x: x["open_ms"])
     return out
 
-# ---------------- signals: EMA crosses
+# ---------------- signals: EMA crosses (core/indicators)
 def find_cross_points(ema_f: List[float], ema_s: List[float],
                       entry_min_gap_pct: float, cross_grace_bars: int) -> Tuple[List[int], List[int]]:
-    n = min(len(ema_f), len(ema_s))
-    buy_idx, sell_idx = [], []
-    up_flag = 0
-    dn_flag = 0
-    for i in range(1, n):
-        f0, s0 = ema_f[i-1], ema_s[i-1]
-        f1, s1 = ema_f[i],   ema_s[i]
-        # фиксируем факт кросса
-        if f0 < s0 and f1 >= s1:
-            up_flag = max(1, int(cross_grace_bars))
-        if f0 > s0 and f1 <= s1:
-            dn_flag = max(1, int(cross_grace_bars))
-        # зазор
-        if up_flag > 0 and f1 >= s1 * (1.0 + entry_min_gap_pct):
-            buy_idx.append(i); up_flag = 0
-        elif up_flag > 0:
-            up_flag -= 1
-        if dn_flag > 0 and f1 <= s1 * (1.0 - entry_min_gap_pct):
-            sell_idx.append(i); dn_flag = 0
-        elif dn_flag > 0:
-            dn_flag -= 1
-    return buy_idx, sell_idx
+    buy_idx, sell_idx = ind.find_cross_points(ema_f, ema_s, entry_min_gap_pct, cross_grace_bars)
+    return buy_idx.tolist(), sell_idx.tolist()
 
 def pair_crosses(buy_idx: List[int], sell_idx: List[int]) -> List[Tuple[int,int]]:
     """К каждому BUY — ближайший следующий SELL."""
-    pairs=[]; si=0
-    for b in buy_idx:
-        while si < len(sell_idx) and sell_idx[si] <= b:
-            si += 1
-        if si < len(sell_idx):
-            pairs.append((b, sell_idx[si]))
-            si += 1
-    return pairs
+    return ind.pair_crosses(buy_idx, sell_idx)
 
 # ---------------- map ms -> index
+def nearest_index(ts_ms: np.ndarray, ms: int) -> Optional[int]:
+    """Индекс бара с ближайшим ts (ts_ms — int64 по возрастанию); бинарный поиск."""
+    if not ms or len(ts_ms) == 0:
+        return None
+    pos = int(np.searchsorted(ts_ms, int(ms)))
+    if pos == 0:
+        return 0
+    if pos >= len(ts_ms):
+        return len(ts_ms) - 1
+    return pos if (ts_ms[pos] - ms) < (ms - ts_ms[pos - 1]) else pos - 1
+
 def map_ms_to_index(idx: pd.DatetimeIndex, ms: int) -> Optional[int]:
     if not ms or len(idx) == 0:
         return None
-    target = pd.to_datetime(ms, unit="ms", utc=True).tz_convert(MSK)
-    # ищем ближайший индекс по времени
-    deltas = np.abs((idx - target).astype("timedelta64[ms]").astype(np.int64))
-    pos = int(np.argmin(deltas))
-    return pos
+    ts_ms = (idx.asi8 // 1_000_000).astype(np.int64)
+    return nearest_index(ts_ms, ms)
+
+# ---------------- render cache
+def render_key(rows, trades, **params) -> str:
+    """Ключ PNG: последняя свеча (ts и OHLC — live-бар меняется внутри минуты), набор сделок, параметры."""
+    last = rows[-1] if rows else None
+    tr = [(t["open_ms"], t["close_ms"], t["is_open"]) for t in trades]
+    raw = json.dumps({"last": last, "n_rows": len(rows), "trades": tr, "params": params},
+                     sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+def _cached(out_path: str, key: str) -> bool:
+    try:
+        with open(out_path + ".key", "r", encoding="utf-8") as f:
+            return f.read().strip() == key and os.path.exists(out_path)
+    except OSError:
+        return False
+
+def _store_key(out_path: str, key: str) -> None:
+    with open(out_path + ".key", "w", encoding="utf-8") as f:
+        f.write(key)
 
 # ---------------- main
 def make_candles_png(symbol: str, exchange: str, interval: str, out_path: str,
                      n: int = 60, ema_fast: int = 9, ema_slow: int = 20,
-                     mid_smooth: int = 9, legend_loc: str = "upper left") -> Tuple[Optional[str], list]:
-    rows = load_candles_flat(symbol, exchange, interval, limit=max(n, 180))
+                     mid_smooth: int = 9, legend_loc: str = "upper left",
+                     use_cache: bool = True) -> Tuple[Optional[str], list]:
+    """PNG графика; если свечи/сделки/параметры не изменились с прошлого рендера — отдаёт готовый файл."""
+    rows = load_candles_flat(symbol, exchange, interval, limit=n)
     if not rows:
         return None, []
 
+    # Реальные сделки для букв B/S
+    trades = load_executed_trades(symbol, exchange, interval, limit=100)
+
+    gap   = float(cfg.STRATEGY.get("GAP_THRESHOLD_BPS", 50)) / 10000.0
+    grace = int(cfg.STRATEGY.get("CROSS_GRACE_BARS", 3))
+    key = render_key(rows, trades, n=n, ema_fast=ema_fast, ema_slow=ema_slow, mid_smooth=mid_smooth,
+                     legend_loc=legend_loc, gap=gap, grace=grace)
+    if use_cache and _cached(out_path, key):
+        return out_path, []
+
     ts  = [r[0] for r in rows][-n:]
     op  = [r[1] for r in rows][-n:]
     hi  = [r[2] for r in rows][-n:]
@@ -134,32 +139,20 @@ def make_candles_png(symbol: str, exchange: str, interval: str, out_path: str,
     vol = [r[5] for r in rows][-n:]
 
     # DataFrame для mplfinance (MSK)
+    ts_arr = np.asarray(ts, dtype=np.int64)
     idx = pd.to_datetime(ts, unit="ms", utc=True).tz_convert(MSK)
     df = pd.DataFrame({"Open":op, "High":hi, "Low":lo, "Close":cl, "Volume":vol}, index=idx)
 
     # EMA
-    ema_f = _ema(cl, max(2, int(ema_fast)))
-    ema_s = _ema(cl, max(2, int(ema_slow)))
+    ema_f = ind.ema(cl, max(2, int(ema_fast)))
+    ema_s = ind.ema(cl, max(2, int(ema_slow)))
 
     # MID = (H+L+C)/3, сглаженная EMA(mid_smooth)
-    mid_raw = (np.array(hi) + np.array(lo) + np.array(cl)) / 3.0
-    if mid_smooth and mid_smooth > 1:
-        a = 2.0/(mid_smooth+1.0)
-        mid_sm = [float(mid_raw[0])]
-        for x in mid_raw[1:]:
-            mid_sm.append(a*float(x) + (1.0-a)*mid_sm[-1])
-        mid_series = pd.Series(mid_sm, index=idx, name="MID")
-    else:
-        mid_series = pd.Series(mid_raw, index=idx, name="MID")
+    mid_series = pd.Series(ind.mid(hi, lo, cl, mid_smooth), index=idx, name="MID")
 
     # Потенциальные сигналы: кроссы EMA -> пары B->S (стрелки)
-    gap   = float(cfg.STRATEGY.get("GAP_THRESHOLD_BPS", 50)) / 10000.0
-    grace = int(cfg.STRATEGY.get("CROSS_GRACE_BARS", 3))
-    buy_i, sell_i = find_cross_points(ema_f, ema_s, gap, grace)
-    pairs_bs = pair_crosses(buy_i, sell_i)
-
-    # Реальные сделки для букв B/S
-    trades = load_executed_trades(symbol, exchange, interval, limit=100)
+    buy_i, sell_i = ind.find_cross_points(ema_f, ema_s, gap, grace)
+    pairs_bs = ind.pair_crosses(buy_i, sell_i)
 
     # Стиль графика
     style = mpf.make_mpf_style(base_mpf_style="nightclouds", gridstyle="--")
@@ -185,22 +178,29 @@ def make_candles_png(symbol: str, exchange: str, interval: str, out_path: str,
     )
     ax = axes[0]
 
+    # ось X у mplfinance — номера баров (0..n-1), не даты
     # Стрелки (потенциальные вход/выход без ценников)
     for b, s_i in pairs_bs:
         if 0 <= b < len(idx):
-            ax.scatter(idx[b], df["Close"].iloc[b], marker="^", s=70, color="#2ecc71", zorder=5)
+            ax.scatter(b, df["Close"].iloc[b], marker="^", s=70, color="#2ecc71", zorder=5)
         if 0 <= s_i < len(idx):
-            ax.scatter(idx[s_i], df["Close"].iloc[s_i], marker="v", s=70, color="#e74c3c", zorder=5)
+            ax.scatter(s_i, df["Close"].iloc[s_i], marker="v", s=70, color="#e74c3c", zorder=5)
+
+    # Буквы B/S (факт сделок): у low/high свечи; сделки вне окна графика не рисуем
+    iv_ms = _interval_seconds(interval) * 1000
+    t_lo, t_hi = int(ts_arr[0]), int(ts_arr[-1]) + iv_ms
+
+    def _bar(ms):
+        return nearest_index(ts_arr, ms) if ms and t_lo <= ms < t_hi else None
 
-    # Буквы B/S (факт сделок): у low/high свечи
     for tr in trades:
-        io = map_ms_to_index(idx, tr["open_ms"])
-        ic = map_ms_to_index(idx, tr["close_ms"]) if tr.get("close_ms") else None
-        if io is not None and 0 <= io < len(idx):
-            ax.text(idx[io], df["Low"].iloc[io]*0.999, "B",
+        io = _bar(tr["open_ms"])
+        ic = _bar(tr["close_ms"]) if tr.get("close_ms") else None
+        if io is not None:
+            ax.text(io, df["Low"].iloc[io]*0.999, "B",
                     color="#2ecc71", fontsize=9, ha="center", va="top", fontweight="bold")
-        if ic is not None and 0 <= ic < len(idx):
-            ax.text(idx[ic], df["High"].iloc[ic]*1.001, "S",
+        if ic is not None:
+            ax.text(ic, df["High"].iloc[ic]*1.001, "S",
                     color="#e74c3c", fontsize=9, ha="center", va="bottom", fontweight="bold")
 
     # Заголовок (MSK)
@@ -217,6 +217,10 @@ def make_candles_png(symbol: str, exchange: str, interval: str, out_path: str,
     ax.legend(handles=legend_handles, loc='lower center', ncol=3,
               bbox_to_anchor=(0.5, -0.22), frameon=False)
 
-    fig.savefig(out_path, dpi=140, bbox_inches="tight")
+    # пишем во временный файл и переименовываем: параллельный читатель не увидит полу-PNG
+    tmp = f"{out_path}.{os.getpid()}.tmp.png"
+    fig.savefig(tmp, dpi=140, bbox_inches="tight")
     plt.close(fig)
+    os.replace(tmp, out_path)
+    _store_key(out_path, key)
     return out_path, []
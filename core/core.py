@@ -1,13 +1,10 @@
 # -*- coding: utf-8 -*-
+from core.indicators import ema_exact as _ema
+
 def _ema_seq(values, period):
+    # точная рекурсия, а не блочная ema(): сигнал не должен зависеть от длины окна (EMA_SLOW >= 86 -> окно > 256)
     if period <= 0 or len(values) < period: return []
-    k = 2.0 / (period + 1.0)
-    ema = values[0]
-    out = [ema]
-    for v in values[1:]:
-        ema = v * k + ema * (1 - k)
-        out.append(ema)
-    return out
+    return _ema(values, period)
 
 def compute_signal(closes, price_now, ema_fast=9, ema_slow=20, entry_min_gap_pct=0.0005, cross_grace_bars=3):
     """Возвращает (signal, meta).
@@ -1,85 +1,280 @@
 # -*- coding: utf-8 -*-
-from db.trades_io import has_open, open_entry, close_entry, get_open
-from db.wallet import get_free, add_free
-import config as cfg
+# process_signal: позиция, кошелёк, сделка и уведомление — одна транзакция (unit_of_work).
+# LIVE: ордер на бирже — вне транзакции. 1) строка orders_live PENDING с clientOrderId (commit),
+# 2) ордер и ожидание итога, 3) итог + сделка по исполненному количеству — вторая транзакция.
+# Незавершённые строки (сбой между шагами, итог не дождались) сверяются с биржей по clientOrderId:
+# при старте ebot (reconcile_live_orders) и на тиках пары, пока по ней есть незавершённый ордер.
+import uuid
+from sqlalchemy import select
+from db.base import session_scope
+from db.models import OrderLive
+from db.trades_io import unit_of_work
+from db import position_book
+from exch.mexc import FINAL_STATUSES
+from config_loader import cfg, trade, risk
 import notify
+import clock
 from math import isfinite
 
+_PENDING = set()    # (symbol, exchange, interval) с незавершённым LIVE-ордером — мимо быстрого пути HOLD
+
+
+def _pnl_pct(entry, price):
+    try:
+        entry = float(entry) if entry else None
+        return (float(price) - entry) / entry if (entry and entry > 0) else None
+    except Exception:
+        return None
+
+
+def _live():
+    return not getattr(cfg, "DRY_RUN", True)
+
+
+def _notify(uow, action, qty, price, pnl_pct):
+    notify.outbox_add(uow.s, "trade", {
+        "action": action, "symbol": uow.symbol, "exchange": uow.exchange,
+        "qty": qty, "price": float(price), "pnl_pct": pnl_pct,
+        "ts_ms": clock.now_ms(), "bal_free": uow.free,
+        "mode": "DRY" if getattr(cfg, "DRY_RUN", True) else "LIVE",
+    })
+
+
+# ---------------- LIVE: ордер вне транзакции сделки
+def _unsent() -> dict:
+    """Итог ордера, который не дошёл до биржи (или отклонён ею): исполнения нет."""
+    return {"order_id": None, "status": "REJECTED", "final": True, "qty": 0.0, "quote": 0.0,
+            "avg_price": None, "ts_ms": clock.now_ms()}
+
+
+def _pending_order(uow):
+    """clientOrderId незавершённого LIVE-ордера пары (PENDING/NEW/PARTIALLY_FILLED) или None."""
+    return uow.s.execute(
+        select(OrderLive.client_order_id).where(
+            OrderLive.symbol == uow.symbol,
+            OrderLive.exchange == uow.exchange,
+            OrderLive.interval == uow.interval,
+            OrderLive.client_order_id.isnot(None),
+            OrderLive.status.notin_(FINAL_STATUSES)
+        ).limit(1)
+    ).scalar()
+
+
+def _live_intent(uow, side, src, quantity=None, quote_qty=None):
+    """Транзакция 1: строка orders_live PENDING с clientOrderId. Ордер уходит только после её commit."""
+    if str(uow.exchange).upper() != "MEXC":
+        raise ValueError(f"LIVE: биржа {uow.exchange} не поддерживается")
+    cid = uuid.uuid4().hex[:32]
+    uow.s.add(OrderLive(exchange_order_id=cid, client_order_id=cid, symbol=uow.symbol, exchange=uow.exchange,
+                        interval=uow.interval, side=side, qty=quantity, price=None, status="PENDING",
+                        ts_ms=clock.now_ms()))
+    return {"cid": cid, "symbol": uow.symbol, "exchange": uow.exchange, "interval": uow.interval,
+            "base_quote": uow.base_quote, "side": side, "src": src, "quantity": quantity, "quote_qty": quote_qty}
+
+
+def _live_send(o):
+    """Шаг 2: рыночный ордер с clientOrderId строки. SELL — на свободный остаток базового актива на бирже
+    (после комиссии покупки), не больше позиции. Итог неизвестен (таймаут, 5xx) — строка остаётся на сверку."""
+    from exch.mexc import client, MexcError
+    _PENDING.add((o["symbol"], o["exchange"], o["interval"]))
+    c = client()
+    sent = False
+    try:
+        qty = o["quantity"]
+        if o["side"] == "SELL":
+            base = o["symbol"][:-len(o["base_quote"])] if o["symbol"].endswith(o["base_quote"]) else o["symbol"]
+            qty = min(float(qty), c.free_balance(base))
+            if float(c.qty(o["symbol"], qty)) <= 0:
+                print(f"live SELL {o['symbol']}: нет свободного {base} на бирже")
+                return _live_apply(o, _unsent())
+        sent = True
+        f = c.market_fill(o["symbol"], o["side"], quantity=qty, quote_qty=o["quote_qty"], client_id=o["cid"])
+    except Exception as e:
+        print(f"live order error {o['symbol']}@{o['exchange']} {o['side']} {o['cid']}: {e!r}")
+        # ордер не отправлен или биржа его отклонила (4xx) — исполнения нет; иначе ждём сверки
+        if sent and not (isinstance(e, MexcError) and e.status < 500):
+            return {"status": "pending", "client_order_id": o["cid"]}
+        f = _unsent()
+    return _live_apply(o, f)
+
+
+def _live_apply(o, f):
+    """Транзакция 2: итог ордера в orders_live и сделка по исполненному количеству + уведомление.
+    SELL закрывает позицию целиком только при FILLED, частичное исполнение закрывает свою долю.
+    Строка уже в итоговом статусе — итог учтён раньше (сверка/другой поток), повторно не применяется."""
+    note = None
+    with unit_of_work(o["symbol"], o["exchange"], o["interval"], o["base_quote"]) as uow:
+        r = uow.s.execute(select(OrderLive).where(OrderLive.client_order_id == o["cid"])).scalars().first()
+        if r is None or r.status in FINAL_STATUSES:
+            res = {"status": "hold"}
+        else:
+            oid = f["order_id"] or r.exchange_order_id
+            r.exchange_order_id, r.status, r.ts_ms = oid, f["status"], f["ts_ms"]
+            r.qty, r.price = f["qty"], f["avg_price"]
+            t = uow.position
+            if not f["final"]:
+                res = {"status": "pending", "order_id": oid}
+            elif f["qty"] <= 0:
+                res = {"status": "skip" if o["side"] == "BUY" else "error", "reason": "order_unfilled", "order_id": oid}
+            elif o["side"] == "BUY":
+                uow.open(f["avg_price"], f["qty"], f["quote"], meta={"src": o["src"], "order_id": oid})
+                note = ("BUY", f["qty"], f["avg_price"], None)
+                res = {"status": "open", "order_id": oid}
+            elif t is None:
+                res = {"status": "hold", "order_id": oid}
+            else:
+                full = f["status"] == "FILLED"
+                pnl = _pnl_pct(t.entry_price, f["avg_price"])
+                uow.close(f["avg_price"], meta={"src": o["src"], "order_id": oid, "filled_qty": f["qty"]},
+                          qty=None if full else f["qty"], proceeds=f["quote"])
+                note = ("SELL", f["qty"], f["avg_price"], pnl)
+                res = {"status": "closed" if full else "partial", "order_id": oid}
+            if note:
+                _notify(uow, *note)
+    if f["final"]:
+        _PENDING.discard((o["symbol"], o["exchange"], o["interval"]))
+    return res
+
+
+def reconcile_order(cid):
+    """Сверить незавершённый ордер с биржей по clientOrderId и применить итог (_live_apply).
+    Биржа ордера не знает, а подписанный запрос уже просрочен (recvWindow) — ордер не дошёл и не дойдёт."""
+    from exch.mexc import client, MexcError
+    with session_scope() as s:
+        r = s.execute(select(OrderLive).where(OrderLive.client_order_id == cid)).scalars().first()
+        if r is None:
+            return {"status": "hold"}
+        o = {"cid": cid, "symbol": r.symbol, "exchange": r.exchange, "interval": r.interval, "side": r.side,
+             "base_quote": trade().base_quote, "src": "reconcile"}
+        age_ms = clock.now_ms() - int(r.ts_ms or 0)
+    c = client()
+    try:
+        f = c.fill_info(c.get_order(o["symbol"], client_id=cid), cid)
+    except MexcError as e:
+        if e.code != -2013 or age_ms <= c.recv_window_ms + 2000 * c.timeout:
+            print(f"live reconcile {cid}: {e!r}")
+            return {"status": "pending", "client_order_id": cid}
+        f = _unsent()
+    except Exception as e:
+        print(f"live reconcile {cid}: {e!r}")
+        return {"status": "pending", "client_order_id": cid}
+    return _live_apply(o, f)
+
+
+def reconcile_live_orders():
+    """Старт ebot в LIVE: все незавершённые orders_live — сверка с биржей. {clientOrderId: статус}."""
+    with session_scope() as s:
+        rows = s.execute(
+            select(OrderLive.client_order_id, OrderLive.symbol, OrderLive.exchange, OrderLive.interval).where(
+                OrderLive.client_order_id.isnot(None),
+                OrderLive.status.notin_(FINAL_STATUSES)
+            )
+        ).all()
+    out = {}
+    for cid, symbol, exchange, interval in rows:
+        _PENDING.add((symbol, exchange, interval))
+        out[cid] = reconcile_order(cid)["status"]
+    return out
+
 
 def process_signal(symbol, exchange, interval, signal, price):
-    base_quote = cfg.TRADE.get("BASE_QUOTE", "USDC")
+    tc = trade()
+    base_quote = tc.base_quote
     # SL: если есть открытая и цена упала ниже входа на STOP_LOSS_PCT -> закрыть
-    sl_pct = float(getattr(cfg, "RISK", {}).get("STOP_LOSS_PCT", 0.005))
-
-    # Если есть открытая позиция — приоритизируем её ведение/закрытие
-    if has_open(symbol, exchange, interval):
-        t = get_open(symbol, exchange, interval)
-
-        # 1) Закрытие по сигналу SELL
-        if signal == "SELL" and t and t.base_qty and price:
-            try:
-                proceeds = float(t.base_qty) * float(price)
-                add_free(base_quote, proceeds)  # пополняем кошелёк выручкой
-                close_entry(symbol, exchange, interval, price, meta={"src": "engine_sell"})
-                # оценка pnl%
-                try:
-                    entry = float(t.entry_price) if t and t.entry_price else None
-                    pnl_pct = (float(price) - entry) / entry if (entry and entry > 0) else None
-                except Exception:
-                    pnl_pct = None
-                # нотификация
-                try:
-                    qty = float(t.base_qty) if t and t.base_qty else 0.0
-                    notify.trade_notify("SELL", symbol, exchange, qty, float(price), pnl_pct)
-                except Exception:
-                    pass
-                return {"status": "closed"}
-            except Exception:
-                # не блокируем цикл, если закрытие не удалось
-                return {"status": "error", "reason": "sell_close_failed"}
-
-        # 2) Стоп-лосс: цена упала ниже входа на SL-процент — закрываем
-        if t and t.entry_price and price and float(price) <= float(t.entry_price) * (1.0 - sl_pct):
-            proceeds = float(t.base_qty or 0.0) * float(price)
-            add_free(base_quote, proceeds)
-            close_entry(symbol, exchange, interval, price, meta={"src": "engine_sl"})
-            # Нотификация по SL (pnl% оценим относительно entry)
-            try:
-                entry = float(t.entry_price) if t and t.entry_price else None
-                pnl_pct = (float(price) - entry) / entry if (entry and entry > 0) else None
-            except Exception:
-                pnl_pct = None
-            try:
-                qty = float(t.base_qty) if t and t.base_qty else 0.0
-                notify.trade_notify("SELL", symbol, exchange, qty, float(price), pnl_pct)
-            except Exception:
-                pass
-            return {"status": "closed"}
-
-        # Если позиция есть, но ни SELL, ни SL — держим
+    sl_pct = risk().stop_loss_pct
+
+    # Быстрый путь по книге позиций процесса (без запросов): действовать нечего — HOLD
+    key = (symbol, exchange, interval)
+    pos = position_book.position(symbol, exchange, interval)
+    if key in _PENDING:
+        pass    # незавершённый LIVE-ордер пары — сверка ниже
+    elif pos is None and signal != "BUY":
         return {"status": "hold"}
+    elif pos is not None and signal != "SELL" and not (
+            pos.entry_price and price and float(price) <= float(pos.entry_price) * (1.0 - sl_pct)):
+        return {"status": "hold"}
+
+    # Позиция, кошелёк, запись сделки и уведомление в outbox — одна транзакция
+    # (один commit на выходе из блока). В Telegram отправляет фоновый notify.sender_loop.
+    # LIVE: в транзакции только строка ордера PENDING, сам ордер — после commit (_live_send).
+    note, order, pending = None, None, None
+    try:
+        with unit_of_work(symbol, exchange, interval, base_quote) as uow:
+            t = uow.position
+            if _live():
+                pending = _pending_order(uow)
+                if pending is None:
+                    _PENDING.discard(key)
+
+            # Незавершённый LIVE-ордер пары: новых не ставим, сначала его итог
+            if pending:
+                res = None
+
+            # Если есть открытая позиция — приоритизируем её ведение/закрытие
+            elif t is not None:
+                qty = float(t.base_qty) if t.base_qty else 0.0
+                entry = t.entry_price
+
+                # 1) Закрытие по сигналу SELL, 2) стоп-лосс: цена упала ниже входа на SL-процент
+                if signal == "SELL" and t.base_qty and price:
+                    src = "engine_sell"
+                elif t.entry_price and price and float(price) <= float(t.entry_price) * (1.0 - sl_pct):
+                    src = "engine_sl"
+                else:
+                    src = None
+
+                if src is None:
+                    # Если позиция есть, но ни SELL, ни SL — держим
+                    res = {"status": "hold"}
+                elif _live():
+                    # LIVE: продажа всего base_qty по рынку, сделка закрывается по факту исполнения
+                    order = _live_intent(uow, "SELL", src, quantity=qty)
+                else:
+                    uow.close(price, meta={"src": src})
+                    note = ("SELL", qty, _pnl_pct(entry, price))
+                    res = {"status": "closed"}
+
+            # Нет открытой позиции — рассматриваем BUY
+            elif signal == "BUY":
+                alloc_pct = tc.alloc_pct / 100.0
+                spend = max(0.0, uow.free * alloc_pct)
+                if spend <= 0:
+                    res = {"status": "skip", "reason": "no_quote"}
+                elif not price or float(price) <= 0:
+                    res = {"status": "skip", "reason": "bad_price"}
+                elif _live():
+                    # LIVE: рыночная покупка на spend котируемой, позиция — по факту исполнения
+                    order = _live_intent(uow, "BUY", "engine_buy", quote_qty=spend)
+                else:
+                    base_qty = spend / float(price)
+                    # списываем из кошелька и открываем сделку с фиксацией потраченной котировки
+                    uow.open(price, base_qty, spend, meta={"src": "engine_buy"})
+                    note = ("BUY", float(base_qty), None)
+                    res = {"status": "open"}
+
+            # По умолчанию — удерживаем
+            else:
+                res = {"status": "hold"}
+
+            if note:
+                action, qty, pnl_pct = note
+                _notify(uow, action, qty, price, pnl_pct)
+    except Exception as e:
+        if _live():
+            print(f"live trade error {symbol}@{exchange} {signal}: {e!r}")
+        # не блокируем цикл, если сделка не записалась (транзакция откатана целиком)
+        if signal == "SELL":
+            return {"status": "error", "reason": "sell_close_failed"}
+        return {"status": "error", "reason": "trade_tx_failed"}
 
-    # Нет открытой позиции — рассматриваем BUY
-    if signal == "BUY" and not has_open(symbol, exchange, interval):
-        quote_free = get_free(base_quote)
-        alloc_pct = float(cfg.TRADE.get("ALLOC_PCT", 5.0)) / 100.0
-        spend = max(0.0, quote_free * alloc_pct)
-        if spend <= 0:
-            return {"status": "skip", "reason": "no_quote"}
-        if not price or float(price) <= 0:
-            return {"status": "skip", "reason": "bad_price"}
-
-        base_qty = spend / float(price)
-
-        # списываем из кошелька и открываем сделку с фиксацией потраченной котировки
-        add_free(base_quote, -spend)
-        open_entry(symbol, exchange, interval, price, base_qty, spend, meta={"src": "engine_buy"})
-
-        try:
-            notify.trade_notify("BUY", symbol, exchange, float(base_qty), float(price), None)
-        except Exception:
-            pass
-        return {"status": "open"}
-
-    # По умолчанию — удерживаем
-    return {"status": "hold"}
+    try:
+        if pending:
+            return reconcile_order(pending)
+        if order:
+            return _live_send(order)
+    except Exception as e:
+        # итог ордера не записался — строка orders_live осталась незавершённой, её разберёт сверка
+        print(f"live order tx error {symbol}@{exchange} {signal}: {e!r}")
+        _PENDING.add(key)
+        return {"status": "error", "reason": "order_tx_failed"}
+    return res
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+# Инкрементальный движок сигнала EMA-кросса на (pair, exchange, interval).
+# Результат бит-в-бит совпадает с core.core.compute_signal(closes, ...) при любых EMA_FAST/EMA_SLOW
+# (проверка — python -m bench.indicator_engine):
+#  - окно то же: последние max(fast, slow)*3 значений, EMA засеивается первым значением окна;
+#  - EMA закрытых баров — тот же _ema_seq (точная рекурсия ema_exact, не блочная ema()), live-шаг — та же формула;
+#  - закрытые бары (окно минус live) пересчитываются один раз при закрытии бара;
+#  - движение live-цены — O(1): один шаг EMA от последнего закрытого значения.
+from collections import deque
+
+from core.core import _ema_seq, compute_signal
+
+STATE_VERSION = 1
+
+
+class IndicatorEngine:
+    def __init__(self, ema_fast=9, ema_slow=20, entry_min_gap_pct=0.0005, cross_grace_bars=3):
+        self.ema_fast = int(ema_fast)
+        self.ema_slow = int(ema_slow)
+        self.entry_min_gap_pct = float(entry_min_gap_pct)
+        self.cross_grace_bars = int(cross_grace_bars)
+        self.need = max(self.ema_fast, self.ema_slow) * 3
+        # закрытые бары окна: (ts_ms, close); live-бар хранится отдельно
+        self._bars = deque(maxlen=max(0, self.need - 1))
+        self._live = None            # (ts_ms, close)
+        self._dirty = True           # закрытая часть окна изменилась -> пересчитать EMA
+        self._f_last = None          # EMA fast/slow на последнем закрытом баре
+        self._s_last = None
+        self._lcu = None             # индекс последнего кросса вверх (в координатах окна)
+        self._cross_up_i1 = False
+
+    # ---------- параметры / снапшоты
+    def params(self) -> dict:
+        return {"ema_fast": self.ema_fast, "ema_slow": self.ema_slow,
+                "entry_min_gap_pct": self.entry_min_gap_pct, "cross_grace_bars": self.cross_grace_bars}
+
+    def last_closed_ts(self):
+        return self._bars[-1][0] if self._bars else None
+
+    def refresh_from_ts(self, refresh_bars: int = 0):
+        """ts, начиная с которого нужно перечитать свечи: последние refresh_bars закрытых + новые."""
+        if not self._bars:
+            return None
+        k = max(1, min(int(refresh_bars) + 1, len(self._bars)))
+        return self._bars[-k][0]
+
+    def snapshot(self) -> dict:
+        return {"v": STATE_VERSION, "params": self.params(), "bars": [[int(t), float(c)] for t, c in self._bars]}
+
+    @classmethod
+    def from_snapshot(cls, state: dict, **params):
+        eng = cls(**params)
+        if not isinstance(state, dict) or state.get("v") != STATE_VERSION or state.get("params") != eng.params():
+            return eng
+        for t, c in state.get("bars") or []:
+            eng._bars.append((int(t), float(c)))
+        eng._dirty = True
+        return eng
+
+    # ---------- обновление данных
+    def close_bar(self, ts_ms: int, close: float) -> None:
+        """Закрытый бар: новый (ts > последнего) дописывается, уже известный — заменяется при отличии."""
+        ts_ms, close = int(ts_ms), float(close)
+        last = self.last_closed_ts()
+        if last is None or ts_ms > last:
+            self._bars.append((ts_ms, close))
+            self._dirty = True
+            if self._live is not None and self._live[0] <= ts_ms:
+                self._live = None
+            return
+        if ts_ms < self._bars[0][0]:
+            return
+        for i in range(len(self._bars) - 1, -1, -1):
+            t, c = self._bars[i]
+            if t == ts_ms:
+                if c != close:
+                    self._bars[i] = (ts_ms, close)
+                    self._dirty = True
+                return
+            if t < ts_ms:
+                return
+
+    def update_live(self, ts_ms: int, close: float) -> None:
+        self._live = (int(ts_ms), float(close))
+
+    def sync(self, rows) -> bool:
+        """rows: [(ts_ms, close), ...] по возрастанию; все, кроме последней, — закрытые бары.
+        Возвращает True, если закрытая часть окна изменилась (стоит сохранить снапшот)."""
+        if not rows:
+            return False
+        before = self._dirty
+        self._dirty = False
+        for ts, c in rows[:-1]:
+            self.close_bar(ts, c)
+        changed = self._dirty
+        self._dirty = self._dirty or before
+        self.update_live(rows[-1][0], rows[-1][1])
+        return changed
+
+    # ---------- вычисления
+    def _recompute_closed(self) -> None:
+        arr = [c for _, c in self._bars]
+        f = _ema_seq(arr, self.ema_fast)
+        s = _ema_seq(arr, self.ema_slow)
+        self._f_last, self._s_last = f[-1], s[-1]
+        # k = len(arr) — индекс live-значения в окне; ищем кросс вверх на закрытых барах
+        k = len(arr)
+        self._cross_up_i1 = (f[k-2] < s[k-2]) and (f[k-1] >= s[k-1])
+        lcu = None
+        if self._cross_up_i1:
+            lcu = k - 1
+        else:
+            for off in range(1, self.cross_grace_bars + 2):
+                j = k - off
+                if j - 1 >= 0 and (f[j-1] < s[j-1]) and (f[j] >= s[j]):
+                    lcu = j
+                    break
+        self._lcu = lcu
+        self._dirty = False
+
+    def evaluate(self, price_now):
+        """(signal, meta) — как compute_signal(closes_window + [live], price_now, ...)."""
+        have = len(self._bars) + (1 if self._live is not None else 0)
+        if self._live is None or len(self._bars) < self.need - 1:
+            return "HOLD", {"reason": "not_enough_bars", "need": self.need, "have": have}
+        if self.ema_fast <= 0 or self.ema_slow <= 0:
+            closes = [c for _, c in self._bars] + [self._live[1]]
+            return compute_signal(closes, price_now, self.ema_fast, self.ema_slow,
+                                  self.entry_min_gap_pct, self.cross_grace_bars)
+        if self._dirty:
+            self._recompute_closed()
+
+        v = self._live[1]
+        kf = 2.0 / (self.ema_fast + 1.0)
+        ks = 2.0 / (self.ema_slow + 1.0)
+        ema9_i = v * kf + self._f_last * (1 - kf)
+        ema20_i = v * ks + self._s_last * (1 - ks)
+
+        k = self.need - 1
+        lcu = self._lcu
+        cross_window_ok = (lcu is not None) and ((k - lcu) <= self.cross_grace_bars)
+        ema_up_i = (ema9_i > ema20_i)
+        gap_i = (ema9_i - ema20_i) / float(price_now or 1.0)
+
+        if ema9_i <= ema20_i:
+            return "SELL", {"reason": "cross_down_live", "ema9": ema9_i, "ema20": ema20_i}
+
+        if cross_window_ok and ema_up_i and gap_i >= float(self.entry_min_gap_pct):
+            return "BUY", {"reason": "cross_up+gap", "gap": gap_i, "ema9": ema9_i, "ema20": ema20_i,
+                           "lcu": lcu, "grace": self.cross_grace_bars}
+
+        return "HOLD", {"reason": "no_entry", "ema9": ema9_i, "ema20": ema20_i, "gap": gap_i, "lcu": lcu}
+
+
+# ---------- реестр движков процесса
+_ENGINES = {}
+
+
+def get_engine(symbol: str, exchange: str, interval: str, **params) -> IndicatorEngine:
+    """Движок для ключа; при первом обращении восстанавливается из снапшота в БД."""
+    key = (symbol, exchange, interval)
+    eng = _ENGINES.get(key)
+    if eng is not None and eng.params() == IndicatorEngine(**params).params():
+        return eng
+    state = None
+    try:
+        from db.indicator_state import load_state
+        state = load_state(symbol, exchange, interval)
+    except Exception:
+        state = None
+    eng = IndicatorEngine.from_snapshot(state, **params) if state else IndicatorEngine(**params)
+    _ENGINES[key] = eng
+    return eng
+
+
+def save_engine(symbol: str, exchange: str, interval: str, eng: IndicatorEngine) -> None:
+    try:
+        from db.indicator_state import save_state
+        save_state(symbol, exchange, interval, eng.last_closed_ts(), eng.snapshot())
+    except Exception:
+        # снапшот — оптимизация, его потеря лишь удлиняет прогрев
+        pass
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+# Общая библиотека индикаторов на NumPy: EMA, MID=(H+L+C)/3, кроссы EMA с порогом gap
+# и «памятью» grace-баров, пары BUY->SELL. Используют compute_signal/движок сигнала,
+# графики (charts_core) и пакетный анализ; семантика — как у прежних циклов.
+#
+# EMA засеивается первым значением (y0 = x0), y[t] = a*x[t] + (1-a)*y[t-1].
+# ema(): длинные ряды — замкнутая форма по блокам: y[t] = q^(t+1)*y_prev + a*q^t*cumsum(x[j]/q^j),
+# длина блока ограничена так, чтобы q^-L не переполнялся (_EXP_MAX); отличие от рекурсии — в последних
+# битах (отн. погрешность < 1e-9, проверяет bench/indicators). Короткие ряды (<= SMALL_N) — обычная рекурсия.
+# Годится для графиков и пакетного анализа. Торговый сигнал (compute_signal, IndicatorEngine) считает
+# ema_exact() — всегда скалярная рекурсия, результат не зависит от длины окна и EMA_SLOW.
+from __future__ import annotations
+from math import log
+from typing import List, Tuple
+
+import numpy as np
+
+SMALL_N = 256
+_EXP_MAX = 300.0   # q^-L <= e^300 ~ 1e130 — далеко от переполнения float64
+
+
+def _ema_loop(x: List[float], a: float, prev: float, out: List[float]) -> List[float]:
+    for v in x:
+        prev = v * a + prev * (1 - a)
+        out.append(prev)
+    return out
+
+
+def ema_exact(x, period: int) -> List[float]:
+    """EMA(period) скалярной рекурсией (y0 = x0) — бит-в-бит как прежний _ema_seq при любой длине."""
+    x = x.tolist() if isinstance(x, np.ndarray) else list(x)
+    if not x or period <= 1:
+        return x
+    a = 2.0 / (period + 1.0)
+    return _ema_loop(x[1:], a, float(x[0]), [float(x[0])])
+
+
+def ema(x, period: int, seed: float = None) -> np.ndarray:
+    """EMA(period) ряда x той же длины; period <= 1 — копия x."""
+    x = np.asarray(x, dtype=np.float64)
+    n = len(x)
+    if n == 0 or period <= 1:
+        return x.copy()
+    a = 2.0 / (period + 1.0)
+    q = 1.0 - a
+    # без seed y0 = x0 ровно (а не a*x0 + q*x0, что может отличаться в последнем бите)
+    start = 1 if seed is None else 0
+    prev = float(x[0]) if seed is None else float(seed)
+    if n <= SMALL_N:
+        return np.array(_ema_loop(x[start:].tolist(), a, prev, [prev] if start else []), dtype=np.float64)
+
+    L = max(1, int(_EXP_MAX / -log(q)))
+    out = np.empty(n, dtype=np.float64)
+    out[0] = prev
+    pt_full = q ** np.arange(min(L, n), dtype=np.float64)          # q^t
+    for st in range(start, n, L):
+        seg = x[st:st + L]
+        m = len(seg)
+        pt = pt_full[:m]
+        y = (pt * q) * prev + a * pt * np.cumsum(seg / pt)
+        out[st:st + m] = y
+        prev = float(y[-1])
+    return out
+
+
+def typical_price(high, low, close) -> np.ndarray:
+    return (np.asarray(high, dtype=np.float64) + np.asarray(low, dtype=np.float64)
+            + np.asarray(close, dtype=np.float64)) / 3.0
+
+
+def mid(high, low, close, smooth: int = 9) -> np.ndarray:
+    """MID = (H+L+C)/3, сглаженная EMA(smooth) при smooth > 1."""
+    tp = typical_price(high, low, close)
+    return ema(tp, smooth) if smooth and smooth > 1 else tp
+
+
+def cross_up(f, s) -> np.ndarray:
+    """Маска баров i, где f[i-1] < s[i-1] и f[i] >= s[i] (бар 0 — False)."""
+    f = np.asarray(f, dtype=np.float64); s = np.asarray(s, dtype=np.float64)
+    out = np.zeros(min(len(f), len(s)), dtype=bool)
+    n = len(out)
+    if n > 1:
+        out[1:] = (f[:n-1] < s[:n-1]) & (f[1:n] >= s[1:n])
+    return out
+
+
+def cross_down(f, s) -> np.ndarray:
+    """Маска баров i, где f[i-1] > s[i-1] и f[i] <= s[i] (бар 0 — False)."""
+    f = np.asarray(f, dtype=np.float64); s = np.asarray(s, dtype=np.float64)
+    out = np.zeros(min(len(f), len(s)), dtype=bool)
+    n = len(out)
+    if n > 1:
+        out[1:] = (f[:n-1] > s[:n-1]) & (f[1:n] <= s[1:n])
+    return out
+
+
+def _confirmed(cross: np.ndarray, cond: np.ndarray, grace: int) -> np.ndarray:
+    """Бар i подтверждает последний кросс c <= i, если cond[i], i - c < grace и это первый cond с c."""
+    n = len(cross)
+    idx = np.arange(n)
+    c_last = np.maximum.accumulate(np.where(cross, idx, -1)) if n else idx
+    # первый бар с cond, начиная с j (включительно)
+    first_cond = np.minimum.accumulate(np.where(cond, idx, n)[::-1])[::-1] if n else idx
+    has = c_last >= 0
+    c_safe = np.where(has, c_last, 0)
+    return cond & has & ((idx - c_last) < grace) & (first_cond[c_safe] == idx)
+
+
+def find_cross_points(ema_f, ema_s, entry_min_gap_pct: float, cross_grace_bars: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Индексы BUY и SELL: кросс EMA, подтверждённый зазором gap в течение grace баров (включая бар кросса)."""
+    n = min(len(ema_f), len(ema_s))
+    f = np.asarray(ema_f, dtype=np.float64)[:n]
+    s = np.asarray(ema_s, dtype=np.float64)[:n]
+    grace = max(1, int(cross_grace_bars))
+    gap = float(entry_min_gap_pct)
+    up_ok = f >= s * (1.0 + gap)
+    dn_ok = f <= s * (1.0 - gap)
+    if n:
+        up_ok[0] = dn_ok[0] = False
+    buy = _confirmed(cross_up(f, s), up_ok, grace)
+    sell = _confirmed(cross_down(f, s), dn_ok, grace)
+    return np.flatnonzero(buy), np.flatnonzero(sell)
+
+
+def pair_crosses(buy_idx, sell_idx) -> List[Tuple[int, int]]:
+    """К каждому BUY — ближайший следующий (ещё не занятый) SELL."""
+    b = np.asarray(buy_idx, dtype=np.int64)
+    s = np.asarray(sell_idx, dtype=np.int64)
+    if len(b) == 0 or len(s) == 0:
+        return []
+    k = np.arange(len(b))
+    # указатель на SELL: si_k = max(первый SELL > b_k, si_{k-1} + 1) -> накопленный максимум по (ss - k)
+    si = np.maximum.accumulate(np.searchsorted(s, b, side="right") - k) + k
+    ok = si < len(s)
+    return list(zip(b[ok].tolist(), s[si[ok]].tolist()))
@@ -1,9 +1,11 @@
 # -*- coding: utf-8 -*-
 import os, importlib
 from contextlib import contextmanager
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
-import config as cfg
+from sqlalchemy.pool import NullPool
+from config_loader import cfg
+import metrics
 
 def _dsn():
     if getattr(cfg, "DB_URL", None):
@@ -13,21 +15,125 @@ def _dsn():
     path = os.path.abspath(os.path.join(data_dir, "ebot.db"))
     return f"sqlite:///{path}"
 
-ENGINE = create_engine(_dsn(), echo=False, future=True)
+# Профиль SQLite: несколько процессов (price_agg_ws, candles_*, ebot, отчёты) пишут в один файл.
+# WAL даёт читателям не ждать писателя, busy_timeout — ждать блокировку, а не падать с "database is locked".
+_SQLITE_DEFAULTS = {
+    "JOURNAL_MODE": "WAL",
+    "SYNCHRONOUS": "NORMAL",
+    "BUSY_TIMEOUT_MS": 10000,
+    "CACHE_SIZE_KB": 65536,
+    "MMAP_SIZE_MB": 256,
+    "TEMP_STORE": "MEMORY",
+}
+# пул соединений по роли процесса
+_ROLE_POOLS = {
+    "default": {"POOL_SIZE": 5, "MAX_OVERFLOW": 10},
+    "bot":     {"POOL_SIZE": 8, "MAX_OVERFLOW": 8},     # ebot --daemon: пул потоков тиков
+    "service": {"POOL_SIZE": 2, "MAX_OVERFLOW": 2, "BEGIN": "IMMEDIATE"},  # сервисы-писатели
+    "report":  {"NULL_POOL": True},                     # короткие запуски из cron
+}
+
+def _db_profile():
+    return getattr(cfg, "DB_PROFILE", {})
+
+def sqlite_pragmas(profile=None):
+    p = dict(_SQLITE_DEFAULTS)
+    p.update((profile if profile is not None else _db_profile()).get("SQLITE", {}))
+    out = []
+    if p.get("JOURNAL_MODE"): out.append(f"PRAGMA journal_mode={p['JOURNAL_MODE']}")
+    if p.get("SYNCHRONOUS"): out.append(f"PRAGMA synchronous={p['SYNCHRONOUS']}")
+    if p.get("BUSY_TIMEOUT_MS") is not None: out.append(f"PRAGMA busy_timeout={int(p['BUSY_TIMEOUT_MS'])}")
+    if p.get("CACHE_SIZE_KB"): out.append(f"PRAGMA cache_size=-{int(p['CACHE_SIZE_KB'])}")
+    if p.get("MMAP_SIZE_MB") is not None: out.append(f"PRAGMA mmap_size={int(p['MMAP_SIZE_MB']) * 1024 * 1024}")
+    if p.get("TEMP_STORE"): out.append(f"PRAGMA temp_store={p['TEMP_STORE']}")
+    return out
+
+def make_engine(dsn=None, role="default", profile=None):
+    profile = profile if profile is not None else _db_profile()
+    dsn = dsn or _dsn()
+    kw = {}
+    if dsn.startswith("sqlite") and profile.get("ENABLED", True):
+        pool = dict(_ROLE_POOLS.get(role, _ROLE_POOLS["default"]))
+        pool.update(profile.get("ROLES", {}).get(role, {}))
+        if pool.get("NULL_POOL"):
+            kw["poolclass"] = NullPool
+        else:
+            kw["pool_size"] = int(pool.get("POOL_SIZE", 5))
+            kw["max_overflow"] = int(pool.get("MAX_OVERFLOW", 10))
+        kw["connect_args"] = {"check_same_thread": False}
+    eng = create_engine(dsn, echo=False, future=True, **kw)
+    if eng.dialect.name == "sqlite" and profile.get("ENABLED", True):
+        pragmas = sqlite_pragmas(profile)
+        begin = str(pool.get("BEGIN", "DEFERRED")).upper()
+
+        @event.listens_for(eng, "connect")
+        def _on_connect(dbapi_conn, _rec):
+            # транзакции открываем сами (событие begin): sqlite3 не должен делать это неявно
+            dbapi_conn.isolation_level = None
+            cur = dbapi_conn.cursor()
+            try:
+                for sql in pragmas:
+                    cur.execute(sql)
+            finally:
+                cur.close()
+
+        @event.listens_for(eng, "begin")
+        def _on_begin(conn):
+            # IMMEDIATE берёт блокировку записи сразу: писатель ждёт busy_timeout,
+            # а не получает SQLITE_BUSY при повышении блокировки посреди транзакции.
+            # Сессия может потребовать IMMEDIATE сама (session_scope(immediate=True)) при DEFERRED роли
+            conn.exec_driver_sql(f"BEGIN {conn.get_execution_options().get('sqlite_begin', begin)}")
+    return eng
+
+ENGINE = make_engine()
 SessionLocal = sessionmaker(bind=ENGINE, autoflush=False, autocommit=False, future=True)
 
+def configure(role: str, dsn: str = None) -> None:
+    """Пересоздать ENGINE под роль процесса (bot/service/report); вызывать в начале main().
+    dsn — другая база (изолированная БД replay), иначе DB_URL."""
+    global ENGINE
+    old = ENGINE
+    ENGINE = make_engine(dsn, role=role)
+    SessionLocal.configure(bind=ENGINE)
+    old.dispose()
+
 @contextmanager
-def session_scope():
+def session_scope(immediate: bool = False):
+    """Сессия с commit на выходе. immediate=True — транзакция чтение-затем-запись (позиция/кошелёк -> сделка):
+    в SQLite она начинается с BEGIN IMMEDIATE при любой роли, иначе повышение блокировки чтения после
+    чужого commit (другой процесс, поток signal sink) даёт SQLITE_BUSY сразу, без busy_timeout."""
     session = SessionLocal()
+    if immediate:
+        session.connection(execution_options={"sqlite_begin": "IMMEDIATE"})
     try:
         yield session
         session.commit()
+        metrics.inc("ebot_db_commits_total")
     except:
         session.rollback()
+        metrics.inc("ebot_db_rollbacks_total")
         raise
     finally:
         session.close()
 
+def insert_stmt(model):
+    """INSERT c поддержкой on_conflict_do_update для текущего диалекта (SQLite/PostgreSQL)."""
+    if ENGINE.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(model)
+
+def upsert_stmt(model, index_elements, update_cols):
+    """INSERT ... ON CONFLICT (index_elements) DO UPDATE SET update_cols = excluded.*"""
+    stmt = insert_stmt(model)
+    return stmt.on_conflict_do_update(
+        index_elements=list(index_elements),
+        set_={c: getattr(stmt.excluded, c) for c in update_cols},
+    )
+
 def create_all():
     models = importlib.import_module("db.models")
     models.Base.metadata.create_all(bind=ENGINE)
+    # существующие таблицы create_all не меняет — индексы/изменения приезжают миграциями
+    importlib.import_module("db.migrate").upgrade()
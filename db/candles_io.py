@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+# Чтение свечей: хвост через DESC LIMIT по PK (pair, exchange, interval, ts_ms)
+# + процессный кольцевой кэш на (pair, exchange, interval), который на следующих
+# тиках дочитывает только строки новее последнего увиденного ts_ms.
+import threading
+from collections import deque
+from .base import session_scope
+from .models import Candle
+from config_loader import cfg
+
+def interval_ms(interval: str) -> int:
+    iv = (interval or "1m").strip()
+    n = int(iv[:-1] or 1)
+    unit = iv[-1]
+    if unit == "m": return n * 60_000
+    if unit == "h": return n * 3_600_000
+    if unit == "d": return n * 86_400_000
+    if unit == "W": return n * 7 * 86_400_000
+    return 60_000
+
+def _cache_cfg():
+    return getattr(cfg, "CANDLE_CACHE", {})
+
+def load_tail(symbol: str, exchange: str, interval: str, limit: int, since_ts=None):
+    """Последние limit свечей (ts >= since_ts, если задан) по возрастанию: [(ts, o, h, l, c, v)]."""
+    with session_scope() as s:
+        q = (s.query(Candle.ts_ms, Candle.open, Candle.high, Candle.low, Candle.close, Candle.volume)
+               .filter(Candle.pair == symbol, Candle.exchange == exchange, Candle.interval == interval))
+        if since_ts is not None:
+            q = q.filter(Candle.ts_ms >= int(since_ts))
+        rows = q.order_by(Candle.ts_ms.desc()).limit(int(limit)).all()
+    return [(int(ts), float(o), float(h), float(l), float(c), float(v or 0.0))
+            for ts, o, h, l, c, v in reversed(rows)]
+
+class CandleRing:
+    def __init__(self, maxlen: int):
+        self.maxlen = int(maxlen)
+        self.rows = deque(maxlen=self.maxlen)
+        self.lock = threading.Lock()
+
+    def merge(self, rows) -> None:
+        """rows по возрастанию ts: новые дописываются, известные — заменяются."""
+        for r in rows:
+            if not self.rows or r[0] > self.rows[-1][0]:
+                self.rows.append(r)
+                continue
+            for i in range(len(self.rows) - 1, -1, -1):
+                ts = self.rows[i][0]
+                if ts == r[0]:
+                    self.rows[i] = r
+                    break
+                if ts < r[0]:
+                    break
+
+    def since(self, ts_ms: int):
+        out = []
+        for r in reversed(self.rows):
+            if r[0] < ts_ms:
+                break
+            out.append(r)
+        out.reverse()
+        return out
+
+    def tail(self, n: int):
+        n = min(int(n), len(self.rows))
+        return [self.rows[i] for i in range(len(self.rows) - n, len(self.rows))]
+
+_RINGS = {}
+_RINGS_LOCK = threading.Lock()
+
+def _refreshed(symbol: str, exchange: str, interval: str, limit: int) -> CandleRing:
+    key = (symbol, exchange, interval)
+    with _RINGS_LOCK:
+        ring = _RINGS.get(key)
+        if ring is None or ring.maxlen < limit:
+            ring = CandleRing(max(int(limit), int(_cache_cfg().get("MAX_BARS", 500))))
+            _RINGS[key] = ring
+    with ring.lock:
+        if not ring.rows:
+            ring.merge(load_tail(symbol, exchange, interval, ring.maxlen))
+        else:
+            # перечитываем REFRESH_BARS последних баров (их может переписать candles_increment) + всё новее
+            refresh = int(_cache_cfg().get("REFRESH_BARS", 2))
+            since = ring.rows[-min(refresh + 1, len(ring.rows))][0]
+            ring.merge(load_tail(symbol, exchange, interval, ring.maxlen, since_ts=since))
+    return ring
+
+def candles_tail(symbol: str, exchange: str, interval: str, limit: int):
+    """Последние limit свечей из кэша (после дочитки новых строк)."""
+    ring = _refreshed(symbol, exchange, interval, limit)
+    with ring.lock:
+        return ring.tail(limit)
+
+def candles_since(symbol: str, exchange: str, interval: str, since_ts, limit: int):
+    """Свечи с ts >= since_ts из кэша; без since_ts — последние limit."""
+    ring = _refreshed(symbol, exchange, interval, limit)
+    with ring.lock:
+        if since_ts is None:
+            return ring.tail(limit)
+        return ring.since(int(since_ts))[-int(limit):]
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+# Старшие таймфреймы (CANDLES.ROLLUPS, по умолчанию 5m/15m/1h) из 1m-свечей в той же таблице candles.
+# Инкрементально: на новую/изменённую 1m-свечу пересчитывается только её бар каждого таймфрейма
+# (перечитываются 1m этого бара — не больше iv/1m строк). Исторически — пакетно по диапазону.
+#   python -m db.candles_rollup --days 30            — пересобрать за 30 дней по всем парам
+#   python -m db.candles_rollup --days 30 --pair BTCUSDC@MEXC
+import time, argparse
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from .base import session_scope, upsert_stmt, configure
+from .models import Candle
+from .candles_io import interval_ms
+from config_loader import cfg
+
+SOURCE = "1m"
+_UPSERT = upsert_stmt(Candle, ["pair", "exchange", "interval", "ts_ms"], ["open", "high", "low", "close", "volume"])
+
+
+def targets() -> List[str]:
+    return [iv for iv in getattr(cfg, "CANDLES", {}).get("ROLLUPS", ["5m", "15m", "1h"]) if iv != SOURCE]
+
+
+def aggregate(rows, iv_ms: int):
+    """rows [(ts, o, h, l, c, v)] по возрастанию ts -> [(bucket_ts, o, h, l, c, v)] по барам iv_ms."""
+    if not rows:
+        return []
+    a = np.asarray(rows, dtype=np.float64)
+    ts = a[:, 0].astype(np.int64)
+    b = (ts // iv_ms) * iv_ms
+    starts = np.flatnonzero(np.r_[True, b[1:] != b[:-1]])
+    ends = np.r_[starts[1:], len(b)] - 1
+    o = a[starts, 1]
+    h = np.maximum.reduceat(a[:, 2], starts)
+    l = np.minimum.reduceat(a[:, 3], starts)
+    c = a[ends, 4]
+    v = np.add.reduceat(np.nan_to_num(a[:, 5]), starts)
+    return list(zip(b[starts].tolist(), o.tolist(), h.tolist(), l.tolist(), c.tolist(), v.tolist()))
+
+
+def _load_1m(s, pair: str, exchange: str, from_ms: int, to_ms: int):
+    q = (s.query(Candle.ts_ms, Candle.open, Candle.high, Candle.low, Candle.close, Candle.volume)
+           .filter(Candle.pair == pair, Candle.exchange == exchange, Candle.interval == SOURCE,
+                   Candle.ts_ms >= int(from_ms), Candle.ts_ms < int(to_ms))
+           .order_by(Candle.ts_ms.asc()))
+    return [(int(t), o, h, l, c, v or 0.0) for t, o, h, l, c, v in q.all()]
+
+
+def _write(s, pair: str, exchange: str, interval: str, bars) -> int:
+    if not bars:
+        return 0
+    s.execute(_UPSERT, [dict(pair=pair, exchange=exchange, interval=interval, ts_ms=int(t),
+                             open=o, high=h, low=l, close=c, volume=v) for t, o, h, l, c, v in bars])
+    return len(bars)
+
+
+def update_bars(s, pair: str, exchange: str, ts_list: Iterable[int], intervals: Optional[List[str]] = None) -> int:
+    """В открытой сессии s: пересчитать бары старших таймфреймов, содержащие 1m-свечи ts_list."""
+    ts_list = [int(t) for t in ts_list]
+    if not ts_list:
+        return 0
+    lo, hi = min(ts_list), max(ts_list)
+    n = 0
+    for iv in intervals or targets():
+        ivm = interval_ms(iv)
+        b0, b1 = (lo // ivm) * ivm, (hi // ivm) * ivm + ivm
+        n += _write(s, pair, exchange, iv, aggregate(_load_1m(s, pair, exchange, b0, b1), ivm))
+    return n
+
+
+def rebuild(pair: str, exchange: str, from_ms: int, to_ms: int,
+            intervals: Optional[List[str]] = None, chunk_ms: int = 86_400_000) -> Dict[str, int]:
+    """Пакетная пересборка за [from_ms, to_ms): кусками по chunk_ms (выровнены по самому длинному таймфрейму)."""
+    ivs = intervals or targets()
+    if not ivs:
+        return {}
+    big = max(interval_ms(iv) for iv in ivs)
+    step = max(big, (int(chunk_ms) // big) * big)
+    start = (int(from_ms) // big) * big
+    out = {iv: 0 for iv in ivs}
+    for w in range(start, int(to_ms), step):
+        with session_scope() as s:
+            rows = _load_1m(s, pair, exchange, w, w + step)
+            for iv in ivs:
+                out[iv] += _write(s, pair, exchange, iv, aggregate(rows, interval_ms(iv)))
+    return out
+
+
+def _pairs() -> List[Dict]:
+    return [p for p in cfg.STRATEGY.get("PAIRS", []) if p.get("interval", SOURCE) == SOURCE]
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--days", type=float, default=7)
+    ap.add_argument("--pair", type=str, default=None)   # BTCUSDC@MEXC
+    a = ap.parse_args()
+    configure("service")
+    now = int(time.time() * 1000)
+    if a.pair:
+        sym, ex = a.pair.split("@", 1)
+        pairs = [dict(symbol=sym, exchange=ex)]
+    else:
+        pairs = _pairs()
+    for p in pairs:
+        t0 = time.time()
+        res = rebuild(p["symbol"], p["exchange"], now - int(a.days * 86_400_000), now)
+        print(f"candles_rollup {p['symbol']}@{p['exchange']}: {res} in {time.time() - t0:.2f}s")
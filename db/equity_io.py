@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+# Ряд equity в таблице equity_snapshot (PK mode, ts_ms): запись — одна вставка,
+# ближайшая точка к моменту — два поиска по индексу (<= и >=), без чтения всего ряда.
+# Пишут services/equity_sampler.py (раз в EQUITY.SAMPLE_SEC) и notify (точка на сделке).
+import time
+from collections import namedtuple
+from typing import Dict, List, Optional
+from sqlalchemy import delete
+from .base import session_scope, upsert_stmt
+from .models import EquitySnapshot, Wallet, TradeDry, TradeLive
+from config_loader import cfg
+
+EquityPoint = namedtuple("EquityPoint", "ts_ms equity_usdc free_usdc open_usdc usdc_usdt src")
+
+WINDOWS_MS = {"1h": 3_600_000, "24h": 86_400_000, "7d": 7 * 86_400_000}
+
+_COLS = ["equity_usdc", "free_usdc", "open_usdc", "usdc_usdt", "src"]
+
+
+def _mode(mode=None) -> str:
+    return mode or ("DRY" if getattr(cfg, "DRY_RUN", True) else "LIVE")
+
+
+def _pt(r) -> EquityPoint:
+    return EquityPoint(int(r.ts_ms), float(r.equity_usdc), r.free_usdc, r.open_usdc, r.usdc_usdt, r.src)
+
+
+def current(price_now: float, mode=None) -> Dict[str, float]:
+    """Equity в USDC: free + сумма открытых позиций (qty * price_now)."""
+    mode = _mode(mode)
+    base_quote = cfg.TRADE.get("BASE_QUOTE", "USDC")
+    T = TradeDry if mode == "DRY" else TradeLive
+    with session_scope() as s:
+        w = s.get(Wallet, base_quote)
+        free = float(w.free) if w else 0.0
+        qty = sum(float(q or 0.0) for (q,) in s.query(T.base_qty).filter(T.is_open == True).all())  # noqa: E712
+    open_usdc = qty * float(price_now or 0.0)
+    return {"equity_usdc": free + open_usdc, "free_usdc": free, "open_usdc": open_usdc, "open_qty": qty}
+
+
+def record(equity_usdc: float, ts_ms: int = None, free_usdc=None, open_usdc=None,
+           usdc_usdt=None, src: str = "sampler", mode=None) -> None:
+    row = dict(mode=_mode(mode), ts_ms=int(ts_ms or time.time() * 1000), equity_usdc=float(equity_usdc),
+               free_usdc=free_usdc, open_usdc=open_usdc, usdc_usdt=usdc_usdt, src=src)
+    with session_scope() as s:
+        s.execute(upsert_stmt(EquitySnapshot, ["mode", "ts_ms"], _COLS), [row])
+
+
+def nearest(ts_ms: int, mode=None, max_dist_ms: int = None) -> Optional[EquityPoint]:
+    """Точка, ближайшая к ts_ms (с любой стороны); None, если дальше max_dist_ms."""
+    mode, ts_ms = _mode(mode), int(ts_ms)
+    with session_scope() as s:
+        q = s.query(EquitySnapshot).filter(EquitySnapshot.mode == mode)
+        lo = q.filter(EquitySnapshot.ts_ms <= ts_ms).order_by(EquitySnapshot.ts_ms.desc()).limit(1).first()
+        hi = q.filter(EquitySnapshot.ts_ms >= ts_ms).order_by(EquitySnapshot.ts_ms.asc()).limit(1).first()
+        best = min((r for r in (lo, hi) if r is not None), key=lambda r: abs(int(r.ts_ms) - ts_ms), default=None)
+        if best is None or (max_dist_ms is not None and abs(int(best.ts_ms) - ts_ms) > max_dist_ms):
+            return None
+        return _pt(best)
+
+
+def change_pct(cur_usdc: float, window_ms: int, now_ms: int = None, mode=None) -> Optional[float]:
+    """Изменение equity за окно в долях (0.05 = +5%); None — нет точки рядом с началом окна."""
+    now_ms = int(now_ms or time.time() * 1000)
+    # допускаем отклонение до четверти окна: за 1ч — 15 мин, за 24ч — 6ч
+    p = nearest(now_ms - int(window_ms), mode=mode, max_dist_ms=int(window_ms) // 4)
+    if p is None or p.equity_usdc <= 0:
+        return None
+    return (float(cur_usdc) - p.equity_usdc) / p.equity_usdc
+
+
+def changes(cur_usdc: float, windows=("1h", "24h", "7d"), now_ms: int = None, mode=None) -> Dict[str, Optional[float]]:
+    return {w: change_pct(cur_usdc, WINDOWS_MS[w], now_ms=now_ms, mode=mode) for w in windows}
+
+
+def series(from_ms: int, to_ms: int, mode=None, step_ms: int = None) -> List[EquityPoint]:
+    """Точки на [from_ms, to_ms) по возрастанию; step_ms — прореживание (последняя точка шага) для графиков."""
+    with session_scope() as s:
+        rows = (s.query(EquitySnapshot)
+                  .filter(EquitySnapshot.mode == _mode(mode),
+                          EquitySnapshot.ts_ms >= int(from_ms), EquitySnapshot.ts_ms < int(to_ms))
+                  .order_by(EquitySnapshot.ts_ms.asc()).all())
+        pts = [_pt(r) for r in rows]
+    if not step_ms or not pts:
+        return pts
+    out = {}
+    for p in pts:
+        out[p.ts_ms // int(step_ms)] = p
+    return list(out.values())
+
+
+def prune(older_than_ms: int, mode=None) -> int:
+    with session_scope() as s:
+        q = delete(EquitySnapshot).where(EquitySnapshot.ts_ms < int(older_than_ms))
+        if mode:
+            q = q.where(EquitySnapshot.mode == mode)
+        return s.execute(q).rowcount or 0
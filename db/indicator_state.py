@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+import json
+from .base import session_scope
+from .models import IndicatorState
+
+def load_state(symbol: str, exchange: str, interval: str):
+    with session_scope() as s:
+        row = s.get(IndicatorState, (symbol, exchange, interval))
+        if not row or not row.state_json:
+            return None
+        try:
+            return json.loads(row.state_json)
+        except Exception:
+            return None
+
+def save_state(symbol: str, exchange: str, interval: str, ts_ms, state: dict) -> None:
+    with session_scope() as s:
+        row = s.get(IndicatorState, (symbol, exchange, interval))
+        if not row:
+            row = IndicatorState(pair=symbol, exchange=exchange, interval=interval)
+            s.add(row)
+        row.ts_ms = int(ts_ms) if ts_ms is not None else None
+        row.state_json = json.dumps(state, separators=(",", ":"))
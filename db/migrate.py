@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+# Версионные миграции db/migrations/vNNNN_*.py (VERSION, NAME, upgrade(conn, dialect))
+# и проверка планов горячих запросов.
+#   python -m db.migrate            — применить недостающие миграции
+#   python -m db.migrate --plan     — EXPLAIN QUERY PLAN горячих запросов
+import os, time, importlib, pkgutil, argparse
+from sqlalchemy import text
+from . import base
+from .models import SchemaVersion
+
+_MIG_DIR = os.path.join(os.path.dirname(__file__), "migrations")
+
+def _migrations():
+    mods = []
+    for m in pkgutil.iter_modules([_MIG_DIR]):
+        if m.name.startswith("v") and m.name[1:5].isdigit():
+            mods.append(importlib.import_module(f"db.migrations.{m.name}"))
+    return sorted(mods, key=lambda m: m.VERSION)
+
+def applied_versions() -> set:
+    SchemaVersion.__table__.create(bind=base.ENGINE, checkfirst=True)
+    with base.session_scope() as s:
+        return {int(v) for (v,) in s.query(SchemaVersion.version).all()}
+
+def _mark(conn, m) -> None:
+    # INSERT OR IGNORE / ON CONFLICT DO NOTHING: версию мог записать параллельный процесс
+    conn.execute(base.insert_stmt(SchemaVersion).values(
+        version=m.VERSION, name=m.NAME, applied_ms=int(time.time()*1000)).on_conflict_do_nothing())
+
+def upgrade() -> list:
+    """Применяет недостающие миграции по порядку. В SQLite каждая — в своей транзакции BEGIN IMMEDIATE:
+    версия перепроверяется под блокировкой записи и пишется в той же транзакции, поэтому процессы,
+    стартующие одновременно (ebot, notify, price_agg_ws через create_all), применяют её один раз."""
+    done = applied_versions()
+    dialect = base.ENGINE.dialect.name
+    out = []
+    for m in _migrations():
+        if m.VERSION in done:
+            continue
+        t0 = time.time()
+        if dialect == "postgresql":
+            # CREATE INDEX CONCURRENTLY — вне транзакции; миграции идемпотентны (IF NOT EXISTS)
+            with base.ENGINE.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                m.upgrade(conn, dialect)
+                _mark(conn, m)
+        else:
+            with base.ENGINE.connect().execution_options(sqlite_begin="IMMEDIATE") as conn, conn.begin():
+                if conn.execute(text("SELECT 1 FROM schema_version WHERE version = :v"),
+                                {"v": m.VERSION}).first():
+                    continue    # применил другой процесс, пока мы ждали блокировку
+                m.upgrade(conn, dialect)
+                _mark(conn, m)
+        out.append((m.VERSION, m.NAME, round(time.time() - t0, 3)))
+        print(f"migration {m.VERSION:04d} {m.NAME}: {time.time()-t0:.3f}s")
+    return out
+
+# ---------------- планы горячих запросов
+HOT_QUERIES = {
+    "candles_tail": ("SELECT ts_ms, close FROM candles WHERE pair=:p AND exchange=:e AND interval=:i "
+                     "ORDER BY ts_ms DESC LIMIT 300", {"p": "BTCUSDC", "e": "MEXC", "i": "1m"}),
+    "current_price_last": ("SELECT * FROM current_price ORDER BY ts_ms DESC LIMIT 1", {}),
+    "trades_dry_open_pos": ("SELECT * FROM trades_dry WHERE symbol=:p AND exchange=:e AND interval=:i AND is_open=1 LIMIT 1",
+                            {"p": "BTCUSDC", "e": "MEXC", "i": "1m"}),
+    "trades_live_open_pos": ("SELECT * FROM trades_live WHERE symbol=:p AND exchange=:e AND interval=:i AND is_open=1 LIMIT 1",
+                             {"p": "BTCUSDC", "e": "MEXC", "i": "1m"}),
+    "trades_dry_open_all": ("SELECT * FROM trades_dry WHERE is_open=1", {}),
+    "signals_24h": ("SELECT COUNT(*) FROM signals WHERE ts_ms >= :t", {"t": 0}),
+    "signals_last": ("SELECT * FROM signals WHERE ts_ms >= :t ORDER BY ts_ms DESC LIMIT 5", {"t": 0}),
+    "wallet_asset": ("SELECT free FROM wallet WHERE asset=:a", {"a": "USDC"}),
+}
+
+def check_plans() -> dict:
+    """{name: (ok, [строки плана])}; ok=False — полный проход по таблице или сортировка во временном B-tree."""
+    res = {}
+    if base.ENGINE.dialect.name != "sqlite":
+        return res
+    with base.ENGINE.connect() as conn:
+        for name, (sql, params) in HOT_QUERIES.items():
+            try:
+                rows = conn.execute(text("EXPLAIN QUERY PLAN " + sql), params).fetchall()
+            except Exception as e:
+                res[name] = (False, [f"error: {e}"])
+                continue
+            details = [str(r[-1]) for r in rows]
+            bad = any((d.startswith("SCAN") and "USING" not in d) or "TEMP B-TREE" in d for d in details)
+            res[name] = (not bad, details)
+    return res
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--plan", action="store_true")
+    a = ap.parse_args()
+    base.configure("report")
+    base.create_all()
+    if a.plan:
+        for name, (ok, details) in check_plans().items():
+            print(f"{'OK  ' if ok else 'SCAN'} {name}: {' | '.join(details)}")
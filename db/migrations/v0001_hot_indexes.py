@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+# Индексы горячих запросов (см. DB_SCHEMA.md).
+# candles и current_price не трогаем: PK (pair, exchange, interval, ts_ms) и PK ts_ms
+# уже обслуживают ORDER BY ts_ms DESC LIMIT обратным проходом по индексу.
+VERSION = 1
+NAME = "hot_indexes"
+
+INDEXES = [
+    ("trades_dry_idx_pos",   "trades_dry",  "symbol, exchange, interval, is_open"),
+    ("trades_dry_idx_open",  "trades_dry",  "is_open, ts_open_ms DESC"),
+    ("trades_live_idx_pos",  "trades_live", "symbol, exchange, interval, is_open"),
+    ("trades_live_idx_open", "trades_live", "is_open, ts_open_ms DESC"),
+    ("signals_idx_time",     "signals",     "ts_ms"),
+    ("signals_idx_pair",     "signals",     "pair, exchange, interval, ts_ms"),
+]
+
+def upgrade(conn, dialect: str) -> None:
+    # PostgreSQL строит без блокировки записи (CONCURRENTLY, соединение в autocommit);
+    # SQLite в WAL строит индекс, не мешая читателям, писатели ждут busy_timeout.
+    concurrently = "CONCURRENTLY " if dialect == "postgresql" else ""
+    for name, table, cols in INDEXES:
+        conn.exec_driver_sql(f"CREATE INDEX {concurrently}IF NOT EXISTS {name} ON {table} ({cols})")
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+# notify_outbox: аренда записи отправителем (owner, lease_until_ms) — несколько отправителей
+# (ebot --daemon, notify.py --sender, разовый send_pending) не шлют одно сообщение дважды.
+# Новые базы получают колонки из models через create_all — добавляем только недостающие.
+from sqlalchemy import inspect
+
+VERSION = 2
+NAME = "outbox_lease"
+
+COLUMNS = [
+    ("owner", "VARCHAR(40)"),
+    ("lease_until_ms", "BIGINT"),
+]
+
+def upgrade(conn, dialect: str) -> None:
+    have = {c["name"] for c in inspect(conn).get_columns("notify_outbox")}
+    for name, typ in COLUMNS:
+        if name not in have:
+            conn.exec_driver_sql(f"ALTER TABLE notify_outbox ADD COLUMN {name} {typ}")
@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+# orders_live: clientOrderId и ключ позиции (exchange, interval) — строка PENDING пишется до отправки
+# ордера, итог — второй транзакцией; незавершённые строки сверяются с биржей по clientOrderId.
+# Новые базы получают колонки из models через create_all — добавляем только недостающие.
+from sqlalchemy import inspect
+
+VERSION = 3
+NAME = "orders_live_client_id"
+
+COLUMNS = [
+    ("client_order_id", "VARCHAR(40)"),
+    ("exchange", "VARCHAR(20)"),
+    ("interval", "VARCHAR(10)"),
+]
+
+def upgrade(conn, dialect: str) -> None:
+    have = {c["name"] for c in inspect(conn).get_columns("orders_live")}
+    for name, typ in COLUMNS:
+        if name not in have:
+            conn.exec_driver_sql(f"ALTER TABLE orders_live ADD COLUMN {name} {typ}")
+    conn.exec_driver_sql("CREATE UNIQUE INDEX IF NOT EXISTS orders_live_idx_client ON orders_live (client_order_id)")
@@ -1,6 +1,6 @@
 # -*- coding: utf-8 -*-
 from sqlalchemy.orm import declarative_base
-from sqlalchemy import Column, Integer, String, Float, BigInteger, Boolean, JSON
+from sqlalchemy import Column, Integer, String, Float, BigInteger, Boolean, JSON, Index
 
 Base = declarative_base()
 
@@ -40,6 +40,12 @@ class TradeLive(Base):
     is_open = Column(Boolean, default=True)
     meta_json = Column(JSON)
 
+# Горячие запросы: открытая позиция по (symbol, exchange, interval), все открытые (equity)
+Index("trades_dry_idx_pos", TradeDry.symbol, TradeDry.exchange, TradeDry.interval, TradeDry.is_open)
+Index("trades_dry_idx_open", TradeDry.is_open, TradeDry.ts_open_ms.desc())
+Index("trades_live_idx_pos", TradeLive.symbol, TradeLive.exchange, TradeLive.interval, TradeLive.is_open)
+Index("trades_live_idx_open", TradeLive.is_open, TradeLive.ts_open_ms.desc())
+
 class Wallet(Base):
     __tablename__ = "wallet"
     asset = Column(String(20), primary_key=True)
@@ -49,9 +55,13 @@ class Wallet(Base):
 
 class OrderLive(Base):
     __tablename__ = "orders_live"
-    exchange_order_id = Column(String(64), primary_key=True)
+    exchange_order_id = Column(String(64), primary_key=True)   # до ответа биржи — client_order_id
     symbol = Column(String(40)); qty = Column(Float); price = Column(Float)
     side = Column(String(4)); status = Column(String(20)); ts_ms = Column(BigInteger)
+    client_order_id = Column(String(40))                       # newClientOrderId, пишется до отправки
+    exchange = Column(String(20)); interval = Column(String(10))
+
+Index("orders_live_idx_client", OrderLive.client_order_id, unique=True)
 # --- Signals log model (append) ---
 from sqlalchemy import Column, Integer, BigInteger, String, Float
 
@@ -70,3 +80,107 @@ class Signal(Base):
     exec_status = Column(String)
     reason      = Column(String)
     meta_json   = Column(String)
+
+# окна по времени (daily_report, alerts_no_signals) и по паре
+Index("signals_idx_time", Signal.ts_ms)
+Index("signals_idx_pair", Signal.pair, Signal.exchange, Signal.interval, Signal.ts_ms)
+
+class IndicatorState(Base):
+    """Снапшот инкрементального движка сигнала (core/indicator_engine) на пару/биржу/интервал."""
+    __tablename__ = "indicator_state"
+
+    pair       = Column(String(40), primary_key=True)
+    exchange   = Column(String(20), primary_key=True)
+    interval   = Column(String(10), primary_key=True)
+    ts_ms      = Column(BigInteger)   # ts последнего закрытого бара в снапшоте
+    state_json = Column(String)
+
+class SchemaVersion(Base):
+    """Применённые миграции db/migrations."""
+    __tablename__ = "schema_version"
+
+    version    = Column(Integer, primary_key=True)
+    name       = Column(String(80))
+    applied_ms = Column(BigInteger)
+
+class BackfillProgress(Base):
+    """Чекпоинты services/candles_fetch.backfill: загруженные окна истории."""
+    __tablename__ = "backfill_progress"
+
+    pair       = Column(String(40), primary_key=True)
+    exchange   = Column(String(20), primary_key=True)
+    interval   = Column(String(10), primary_key=True)
+    start_ms   = Column(BigInteger, primary_key=True)   # начало окна (выровнено по сетке окон)
+    end_ms     = Column(BigInteger)
+    rows       = Column(Integer)
+    done_ms    = Column(BigInteger)
+
+class CurrentPrice1m(Base):
+    """Минутные агрегаты current_price для тиков старше CURRENT_PRICE.RETENTION_HOURS."""
+    __tablename__ = "current_price_1m"
+
+    ts_ms          = Column(BigInteger, primary_key=True)   # начало минуты, UTC ms
+    median_min     = Column(Float)
+    median_max     = Column(Float)
+    median_median  = Column(Float)
+    median_last    = Column(Float)
+    mexc_last      = Column(Float); binance_last = Column(Float); bybit_last = Column(Float)
+    usdc_usdt_last = Column(Float)
+    last_ts_ms     = Column(BigInteger)                     # ts последнего сырого тика минуты
+    ticks          = Column(Integer)
+
+class NotifyOutbox(Base):
+    """Очередь уведомлений Telegram (notify.py): пишется в транзакции сделки, отправляется фоном."""
+    __tablename__ = "notify_outbox"
+
+    id           = Column(Integer, primary_key=True, autoincrement=True)
+    ts_ms        = Column(BigInteger, nullable=False)
+    kind         = Column(String(20), nullable=False)    # trade | text
+    payload_json = Column(String, nullable=False)
+    status       = Column(String(10), nullable=False, default="pending")   # pending | sending | sent | dead
+    attempts     = Column(Integer, default=0)
+    next_try_ms  = Column(BigInteger)
+    sent_ms      = Column(BigInteger)
+    error        = Column(String(200))
+    owner        = Column(String(40))       # отправитель, взявший запись (status=sending)
+    lease_until_ms = Column(BigInteger)     # аренда истекла — запись может взять другой отправитель
+
+Index("notify_outbox_idx_pending", NotifyOutbox.status, NotifyOutbox.next_try_ms)
+
+class EquitySnapshot(Base):
+    """Ряд equity (db/equity_io.py): периодический сэмплер + точки на сделках; PK даёт поиск ближайшей точки по индексу."""
+    __tablename__ = "equity_snapshot"
+
+    mode        = Column(String(4), primary_key=True)        # DRY | LIVE
+    ts_ms       = Column(BigInteger, primary_key=True)
+    equity_usdc = Column(Float, nullable=False)              # free + открытые позиции по текущей цене
+    free_usdc   = Column(Float)
+    open_usdc   = Column(Float)
+    usdc_usdt   = Column(Float)                              # курс на момент точки (для $ на графиках)
+    src         = Column(String(10))                         # sampler | trade
+
+class StatsHourly(Base):
+    """Часовые корзины метрик отчётов (db/stats.py): сигналы — инкрементально по id, сделки — пересчётом свежих часов."""
+    __tablename__ = "stats_hourly"
+
+    hour_ms      = Column(BigInteger, primary_key=True)     # начало часа, UTC ms
+    pair         = Column(String(40), primary_key=True)
+    exchange     = Column(String(20), primary_key=True)
+    interval     = Column(String(10), primary_key=True)
+    signals      = Column(Integer, default=0)
+    sig_buy      = Column(Integer, default=0)
+    sig_sell     = Column(Integer, default=0)
+    sig_cross_up = Column(Integer, default=0)               # reason = cross_up+gap
+    dry_opened   = Column(Integer, default=0)
+    dry_closed   = Column(Integer, default=0)
+    dry_pnl      = Column(Float, default=0.0)               # (exit - entry) * qty закрытых за час
+    live_opened  = Column(Integer, default=0)
+    live_closed  = Column(Integer, default=0)
+    live_pnl     = Column(Float, default=0.0)
+
+class StatsWatermark(Base):
+    """Докуда уже учтены исходные таблицы в stats_hourly."""
+    __tablename__ = "stats_watermark"
+
+    name  = Column(String(40), primary_key=True)            # signals_id | trades_ms
+    value = Column(BigInteger, nullable=False)
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+# Книга позиций и кэш кошелька процесса: открытые сделки по (symbol, exchange, interval) и free по активам.
+# Загружается целиком (два запроса) при первом обращении, дальше HOLD-тик не делает запросов к
+# trades_*/wallet. Запись — write-through: trades_io/wallet после commit кладут сюда новое состояние
+# и увеличивают счётчик в файле-метке <db>.trades.version (flock). Версия — сам счётчик, а не mtime:
+# две записи в один тик mtime или чужая запись между нашей и stat не теряются. Свою запись процесс
+# засчитывает себе, только если до неё счётчик был равен известному (никто не писал между) — иначе
+# книга перечитывается. TTL_SEC — страховка от правок мимо trades_io (ручной SQL, PostgreSQL без метки).
+import os, time, fcntl, threading
+from collections import namedtuple
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import select
+
+from . import base
+from .models import TradeDry, TradeLive, Wallet
+from config_loader import cfg
+
+Pos = namedtuple("Pos", "id entry_price base_qty quote_spent ts_open_ms")
+Key = Tuple[str, str, str]   # (symbol, exchange, interval)
+
+_LOCK = threading.RLock()
+_ST = {"sig": None, "stamp": None, "loaded": 0.0, "pos": {}, "free": {}}
+_FD = {}    # (pid, путь метки) -> открытый fd (метка читается на каждом тике; после fork — свой, flock не делится)
+
+
+def _tab():
+    return TradeDry if getattr(cfg, "DRY_RUN", True) else TradeLive
+
+
+def _ttl() -> float:
+    return float((getattr(cfg, "POSITION_BOOK", {}) or {}).get("TTL_SEC", 30.0))
+
+
+def _marker() -> Optional[str]:
+    url = base.ENGINE.url
+    if url.get_backend_name() != "sqlite" or not url.database or url.database == ":memory:":
+        return None
+    return os.path.abspath(url.database) + ".trades.version"
+
+
+def _fd(path: str) -> int:
+    key = (os.getpid(), path)
+    fd = _FD.get(key)
+    if fd is None:
+        fd = _FD[key] = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    return fd
+
+
+def _read(fd: int) -> int:
+    raw = os.pread(fd, 32, 0).strip()
+    return int(raw) if raw.isdigit() else 0      # пустая метка (старый формат) — версия 0
+
+
+def _stamp(path: Optional[str]):
+    if not path:
+        return None
+    try:
+        fd = _fd(path)
+        fcntl.flock(fd, fcntl.LOCK_SH)
+        try:
+            return _read(fd)
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+    except OSError:
+        return object()     # метка недоступна — книга считается устаревшей
+
+
+def _touch() -> None:
+    """Отметить запись сделки/кошелька для других процессов: счётчик +1 под flock.
+    Новую версию запоминаем, только если до нас счётчик был нашим — иначе чужая запись не потеряется."""
+    path = _marker()
+    if not path:
+        return
+    try:
+        fd = _fd(path)
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            prev = _read(fd)
+            os.pwrite(fd, f"{prev + 1:020d}\n".encode(), 0)
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+    except OSError:
+        _ST["sig"] = None
+        return
+    if _ST["stamp"] == prev:
+        _ST["stamp"] = prev + 1
+
+
+def _load() -> None:
+    T = _tab()
+    with base.session_scope() as s:
+        rows = s.execute(select(T.id, T.symbol, T.exchange, T.interval, T.entry_price, T.base_qty,
+                                T.quote_spent, T.ts_open_ms).where(T.is_open == True)).all()   # noqa: E712
+        wal = s.execute(select(Wallet.asset, Wallet.free)).all()
+    pos = {}
+    for r in sorted(rows, key=lambda r: r[0]):   # как LIMIT 1 по ключу: при дублях — последняя открытая
+        pos[(r[1], r[2], r[3])] = Pos(r[0], r[4], r[5], r[6], r[7])
+    _ST["pos"] = pos
+    _ST["free"] = {a: float(f or 0.0) for a, f in wal}
+
+
+def _fresh() -> None:
+    sig = (str(base.ENGINE.url), _tab().__tablename__)
+    path = _marker()
+    stamp = _stamp(path)
+    if sig != _ST["sig"] or stamp != _ST["stamp"] or time.monotonic() - _ST["loaded"] > _ttl():
+        _load()
+        _ST["sig"], _ST["stamp"], _ST["loaded"] = sig, stamp, time.monotonic()
+
+
+# ---------- чтение
+def position(symbol: str, exchange: str, interval: str) -> Optional[Pos]:
+    with _LOCK:
+        _fresh()
+        return _ST["pos"].get((symbol, exchange, interval))
+
+
+def free(asset: str) -> float:
+    with _LOCK:
+        _fresh()
+        return _ST["free"].get(asset, 0.0)
+
+
+def snapshot() -> Dict:
+    with _LOCK:
+        _fresh()
+        return {"positions": dict(_ST["pos"]), "free": dict(_ST["free"])}
+
+
+# ---------- write-through (вызывать после commit)
+def put(key: Optional[Key] = None, pos: Optional[Pos] = None,
+        asset: Optional[str] = None, free_value: Optional[float] = None) -> None:
+    """key задан — позиция key становится pos (None — закрыта); asset+free_value — новый free."""
+    with _LOCK:
+        _fresh()
+        if key is not None:
+            if pos is None:
+                _ST["pos"].pop(key, None)
+            else:
+                _ST["pos"][key] = pos
+        if asset is not None and free_value is not None:
+            _ST["free"][asset] = float(free_value)
+        _touch()
+
+
+def invalidate() -> None:
+    """Сбросить книгу (перечитается при следующем обращении) и оповестить другие процессы."""
+    with _LOCK:
+        _ST["sig"] = None
+        _touch()
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+# Чтение текущей цены из двух слоёв: сырые тики current_price (последние RETENTION_HOURS)
+# и минутные агрегаты current_price_1m (старше). Вызывающему всё равно, откуда точка.
+from collections import namedtuple
+from typing import List, Optional
+from .base import session_scope
+from .models import CurrentPrice, CurrentPrice1m
+
+# current_price/current_price_1m без колонки символа: это цена одного символа (его пишет services/price_agg_ws)
+SYMBOL = "BTCUSDC"
+
+PricePoint = namedtuple("PricePoint", "ts_ms current_median mexc_mid usdc_usdt_rate tier")
+
+def _raw(r) -> PricePoint:
+    return PricePoint(int(r.ts_ms), r.current_median, r.mexc_mid, r.usdc_usdt_rate, "raw")
+
+def _rollup(r) -> PricePoint:
+    return PricePoint(int(r.last_ts_ms or r.ts_ms), r.median_last, r.mexc_last, r.usdc_usdt_last, "1m")
+
+def latest() -> Optional[PricePoint]:
+    with session_scope() as s:
+        r = s.query(CurrentPrice).order_by(CurrentPrice.ts_ms.desc()).limit(1).first()
+        if r:
+            return _raw(r)
+        r = s.query(CurrentPrice1m).order_by(CurrentPrice1m.ts_ms.desc()).limit(1).first()
+        return _rollup(r) if r else None
+
+def at(ts_ms: int) -> Optional[PricePoint]:
+    """Последняя известная точка на момент ts_ms (включительно)."""
+    with session_scope() as s:
+        r = (s.query(CurrentPrice).filter(CurrentPrice.ts_ms <= int(ts_ms))
+               .order_by(CurrentPrice.ts_ms.desc()).limit(1).first())
+        if r:
+            return _raw(r)
+        r = (s.query(CurrentPrice1m).filter(CurrentPrice1m.ts_ms <= int(ts_ms))
+               .order_by(CurrentPrice1m.ts_ms.desc()).limit(1).first())
+        return _rollup(r) if r else None
+
+def series(from_ms: int, to_ms: int) -> List[PricePoint]:
+    """Точки на [from_ms, to_ms): агрегаты там, где сырые тики уже свёрнуты, далее — сырые."""
+    with session_scope() as s:
+        agg = (s.query(CurrentPrice1m)
+                 .filter(CurrentPrice1m.ts_ms >= int(from_ms), CurrentPrice1m.ts_ms < int(to_ms))
+                 .order_by(CurrentPrice1m.ts_ms.asc()).all())
+        raw = (s.query(CurrentPrice)
+                 .filter(CurrentPrice.ts_ms >= int(from_ms), CurrentPrice.ts_ms < int(to_ms))
+                 .order_by(CurrentPrice.ts_ms.asc()).all())
+        pts = [_rollup(r) for r in agg]
+        # минута может быть в обоих слоях только в момент компакции — сырые точнее
+        raw_pts = [_raw(r) for r in raw]
+        if raw_pts:
+            first_raw_min = (raw_pts[0].ts_ms // 60000) * 60000
+            pts = [p for p in pts if p.ts_ms < first_raw_min]
+        return pts + raw_pts
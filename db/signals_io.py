@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+# Буферизованная запись сигналов: тик только кладёт запись в память (микросекунды),
+# фоновый поток раз в SIGNAL_SINK.FLUSH_SEC или при накоплении BATCH записей пишет
+# пачку одним многострочным INSERT в signals и строки в logs/signals.log
+# (RotatingFileHandler по LOGGING.ROTATE_MB / BACKUP_COUNT). json.dumps(meta) и
+# форматирование строки лога — тоже в потоке сброса. stop()/atexit дописывают остаток.
+import os, json, time, atexit, threading, logging
+from collections import deque
+from logging.handlers import RotatingFileHandler
+from typing import Optional
+
+from .base import session_scope, insert_stmt
+from .models import Signal
+from config_loader import cfg
+import clock
+
+
+def _now_ms() -> int:
+    return clock.now_ms()
+
+
+def _f(v) -> Optional[float]:
+    try:
+        return float(v) if v is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _row(rec) -> dict:
+    ts, symbol, exchange, interval, signal, meta, res, price, _ = rec
+    m = meta if isinstance(meta, dict) else {}
+    ema_fast, ema_slow = _f(m.get("ema9")), _f(m.get("ema20"))
+    gap, gap_bps = _f(m.get("gap")), None
+    if gap is not None:
+        gap_bps = gap * 10000.0
+    elif ema_fast is not None and ema_slow is not None and price:
+        gap_bps = ((ema_fast - ema_slow) / float(price)) * 10000.0
+    return dict(
+        ts_ms=ts, pair=symbol, exchange=exchange, interval=interval, signal=signal,
+        ema_fast=ema_fast, ema_slow=ema_slow, gap_bps=gap_bps,
+        exec_status=(res.get("status") if isinstance(res, dict) else None),
+        reason=m.get("reason"),
+        meta_json=(json.dumps(meta, ensure_ascii=False, default=str) if isinstance(meta, dict) else None),
+    )
+
+
+def _text_logger(path: str) -> logging.Logger:
+    lc = getattr(cfg, "LOGGING", {}) or {}
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    log = logging.getLogger("ebot.signals")
+    log.setLevel(logging.INFO)
+    log.propagate = False
+    if not log.handlers:
+        h = RotatingFileHandler(path, maxBytes=int(float(lc.get("ROTATE_MB", 10)) * 1024 * 1024),
+                                backupCount=int(lc.get("BACKUP_COUNT", 5)), encoding="utf-8")
+        h.setFormatter(logging.Formatter("%(message)s"))
+        log.addHandler(h)
+    return log
+
+
+class SignalSink:
+    def __init__(self, batch: int = None, flush_sec: float = None, max_buffer: int = None, log_file: str = None):
+        sc = getattr(cfg, "SIGNAL_SINK", {}) or {}
+        self.batch = int(batch or sc.get("BATCH", 200))
+        self.flush_sec = float(flush_sec or sc.get("FLUSH_SEC", 1.0))
+        self.max_buffer = int(max_buffer or sc.get("MAX_BUFFER", 50_000))
+        self.log_file = log_file or sc.get("FILE", "logs/signals.log")
+        self.buf = deque()
+        self.lock = threading.Lock()     # один сброс за раз
+        self.wake = threading.Event()
+        self.stop_ev = threading.Event()
+        self.thread = None
+        self.log = None
+        self.stats = {"records": 0, "flushes": 0, "rows": 0, "dropped": 0, "errors": 0}
+
+    # ---------- приём (горячий путь тика)
+    def record(self, symbol: str, exchange: str, interval: str, signal: str, meta=None, res=None,
+               price: float = None, payload=None, ts_ms: int = None) -> None:
+        self.buf.append((int(ts_ms or _now_ms()), symbol, exchange, interval, signal, meta, res, price, payload))
+        self.stats["records"] += 1
+        if len(self.buf) >= self.batch:
+            self.wake.set()
+
+    # ---------- запись
+    def _drain(self):
+        out = []
+        while True:
+            try:
+                out.append(self.buf.popleft())
+            except IndexError:
+                return out
+
+    def flush(self) -> int:
+        """Записать всё накопленное: лог-файл + один INSERT на пачку. При ошибке БД записи возвращаются в буфер."""
+        with self.lock:
+            recs = self._drain()
+            if not recs:
+                return 0
+            try:
+                self.log = self.log or _text_logger(self.log_file)
+                for r in recs:
+                    ts = r[0]
+                    human = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(ts / 1000))
+                    self.log.info(f"{ts} | {human} | tick: {r[8] if r[8] is not None else r[4]}")
+            except Exception as e:
+                print("signal_sink log error:", repr(e))
+            try:
+                with session_scope() as s:
+                    s.execute(insert_stmt(Signal), [_row(r) for r in recs])
+            except Exception as e:
+                self.stats["errors"] += 1
+                print("signal_sink db error:", repr(e))
+                keep = recs[-self.max_buffer:]
+                self.stats["dropped"] += len(recs) - len(keep)
+                self.buf.extendleft(reversed(keep))
+                while len(self.buf) > self.max_buffer:   # переполнение при долгой недоступности БД — старые выбрасываем
+                    self.buf.popleft()
+                    self.stats["dropped"] += 1
+                return 0
+            self.stats["flushes"] += 1
+            self.stats["rows"] += len(recs)
+            return len(recs)
+
+    def _loop(self) -> None:
+        while not self.stop_ev.is_set():
+            self.wake.wait(self.flush_sec)
+            self.wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print("signal_sink flush error:", repr(e))
+
+    def start(self) -> "SignalSink":
+        if self.thread is None or not self.thread.is_alive():
+            self.stop_ev.clear()
+            self.thread = threading.Thread(target=self._loop, name="signal-sink", daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Остановить поток и дописать остаток (вызывается и из atexit)."""
+        self.stop_ev.set()
+        self.wake.set()
+        if self.thread is not None:
+            self.thread.join(timeout=timeout)
+        try:
+            self.flush()
+        except Exception as e:
+            print("signal_sink final flush error:", repr(e))
+
+
+_SINK: Optional[SignalSink] = None
+_SINK_LOCK = threading.Lock()
+
+
+def sink() -> SignalSink:
+    """Общий для процесса приёмник; поток сброса стартует при первом обращении."""
+    global _SINK
+    if _SINK is None:
+        with _SINK_LOCK:
+            if _SINK is None:
+                _SINK = SignalSink().start()
+                atexit.register(_SINK.stop)
+    return _SINK
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+# Статистика отчётов из часовых корзин stats_hourly (pair, exchange, interval, час).
+#  - signals (append-only): один сгруппированный проход по строкам id > водяного знака,
+#    счётчики корзин прибавляются (ON CONFLICT ... SET x = x + excluded.x);
+#  - trades_dry/trades_live (строки меняются при закрытии): часы начиная с прошлого
+#    refresh пересчитываются целиком — один сгруппированный проход на событие (open/close).
+# Окна 24h/7d/30d отвечают суммой корзин, без сканирования сырых таблиц. Граница окна — по часу.
+#   python -m db.stats              — refresh (cron раз в час или перед отчётом)
+#   python -m db.stats --rebuild    — пересобрать всё с нуля
+import time, argparse
+from typing import Dict, List
+from sqlalchemy import select, func, case, update, delete
+from .base import session_scope, insert_stmt, configure
+from .models import StatsHourly, StatsWatermark, Signal, TradeDry, TradeLive
+
+HOUR_MS = 3_600_000
+WINDOWS_MS = {"24h": 24 * HOUR_MS, "7d": 7 * 24 * HOUR_MS, "30d": 30 * 24 * HOUR_MS}
+
+_KEY = ["hour_ms", "pair", "exchange", "interval"]
+_SIG_COLS = ["signals", "sig_buy", "sig_sell", "sig_cross_up"]
+_TRADE_COLS = {"dry": ["dry_opened", "dry_closed", "dry_pnl"], "live": ["live_opened", "live_closed", "live_pnl"]}
+_ALL_COLS = _SIG_COLS + _TRADE_COLS["dry"] + _TRADE_COLS["live"]
+
+
+def _hour(col):
+    return (col // HOUR_MS) * HOUR_MS   # BIGINT // int -> целочисленное деление в SQLite и PostgreSQL
+
+
+def _get_wm(s, name: str, default: int = 0) -> int:
+    w = s.get(StatsWatermark, name)
+    return int(w.value) if w else default
+
+
+def _set_wm(s, name: str, value: int) -> None:
+    s.merge(StatsWatermark(name=name, value=int(value)))
+
+
+def _upsert(s, rows: List[Dict], cols: List[str], add: bool) -> None:
+    if not rows:
+        return
+    full = [{**{c: 0 for c in _ALL_COLS}, **r} for r in rows]
+    stmt = insert_stmt(StatsHourly)
+    t = StatsHourly.__table__.c
+    set_ = {c: (t[c] + getattr(stmt.excluded, c)) if add else getattr(stmt.excluded, c) for c in cols}
+    s.execute(stmt.on_conflict_do_update(index_elements=_KEY, set_=set_), full)
+
+
+def _refresh_signals(s) -> int:
+    last_id = _get_wm(s, "signals_id")
+    max_id = s.execute(select(func.max(Signal.id))).scalar()
+    if max_id is None or max_id <= last_id:
+        return 0
+    h = _hour(Signal.ts_ms).label("h")
+    q = (select(h, Signal.pair, Signal.exchange, Signal.interval,
+                func.count(),
+                func.sum(case((Signal.signal == "BUY", 1), else_=0)),
+                func.sum(case((Signal.signal == "SELL", 1), else_=0)),
+                func.sum(case((Signal.reason == "cross_up+gap", 1), else_=0)))
+         .where(Signal.id > last_id, Signal.id <= max_id)
+         .group_by(h, Signal.pair, Signal.exchange, Signal.interval))
+    rows = [dict(hour_ms=int(r[0]), pair=r[1], exchange=r[2], interval=r[3],
+                 signals=int(r[4]), sig_buy=int(r[5] or 0), sig_sell=int(r[6] or 0), sig_cross_up=int(r[7] or 0))
+            for r in s.execute(q)]
+    _upsert(s, rows, _SIG_COLS, add=True)
+    _set_wm(s, "signals_id", max_id)
+    return len(rows)
+
+
+def _refresh_trades(s, now_ms: int) -> int:
+    since = (_get_wm(s, "trades_ms") // HOUR_MS) * HOUR_MS
+    zero = {c: 0 for cols in _TRADE_COLS.values() for c in cols}
+    s.execute(update(StatsHourly).where(StatsHourly.hour_ms >= since).values(**zero))
+    acc: Dict[tuple, Dict] = {}
+    for mode, T in (("dry", TradeDry), ("live", TradeLive)):
+        c_open, c_closed, c_pnl = _TRADE_COLS[mode]
+        ho = _hour(T.ts_open_ms).label("h")
+        for r in s.execute(select(ho, T.symbol, T.exchange, T.interval, func.count())
+                           .where(T.ts_open_ms >= since)
+                           .group_by(ho, T.symbol, T.exchange, T.interval)):
+            acc.setdefault((int(r[0]), r[1], r[2], r[3]), {})[c_open] = int(r[4])
+        hc = _hour(T.ts_close_ms).label("h")
+        pnl = func.sum((func.coalesce(T.exit_price, 0) - func.coalesce(T.entry_price, 0)) * func.coalesce(T.base_qty, 0))
+        for r in s.execute(select(hc, T.symbol, T.exchange, T.interval, func.count(), pnl)
+                           .where(T.ts_close_ms >= since, T.is_open == False)   # noqa: E712
+                           .group_by(hc, T.symbol, T.exchange, T.interval)):
+            d = acc.setdefault((int(r[0]), r[1], r[2], r[3]), {})
+            d[c_closed] = int(r[4]); d[c_pnl] = float(r[5] or 0.0)
+    rows = [dict(hour_ms=k[0], pair=k[1] or "", exchange=k[2] or "", interval=k[3] or "", **v) for k, v in acc.items()]
+    _upsert(s, rows, list(zero), add=False)
+    _set_wm(s, "trades_ms", now_ms)
+    return len(rows)
+
+
+def refresh(now_ms: int = None) -> Dict[str, int]:
+    """Догнать корзины до текущего момента. Стоимость ~ новые строки с прошлого refresh."""
+    now_ms = int(now_ms or time.time() * 1000)
+    with session_scope() as s:
+        n_sig = _refresh_signals(s)
+        n_tr = _refresh_trades(s, now_ms)
+    return {"signal_buckets": n_sig, "trade_buckets": n_tr}
+
+
+def rebuild() -> Dict[str, int]:
+    with session_scope() as s:
+        s.execute(delete(StatsHourly))
+        s.execute(delete(StatsWatermark))
+    return refresh()
+
+
+def window(window_ms: int, now_ms: int = None, by_pair: bool = True) -> List[Dict]:
+    """Суммы метрик за последние window_ms (по целым часам), по (pair, exchange, interval) или итогом."""
+    now_ms = int(now_ms or time.time() * 1000)
+    since = ((now_ms - int(window_ms)) // HOUR_MS) * HOUR_MS
+    keys = [StatsHourly.pair, StatsHourly.exchange, StatsHourly.interval] if by_pair else []
+    sums = [func.coalesce(func.sum(getattr(StatsHourly, c)), 0).label(c) for c in _ALL_COLS]
+    q = select(*keys, *sums).where(StatsHourly.hour_ms >= since)
+    if by_pair:
+        q = q.group_by(*keys).order_by(*keys)
+    with session_scope() as s:
+        return [dict(r._mapping) for r in s.execute(q)]
+
+
+def totals(window_ms: int, now_ms: int = None) -> Dict:
+    rows = window(window_ms, now_ms, by_pair=False)
+    return rows[0] if rows else {c: 0 for c in _ALL_COLS}
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rebuild", action="store_true")
+    a = ap.parse_args()
+    configure("service")
+    t0 = time.time()
+    print("stats:", rebuild() if a.rebuild else refresh(), f"{time.time() - t0:.2f}s")
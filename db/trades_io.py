@@ -1,30 +1,24 @@
 # -*- coding: utf-8 -*-
-import time
+import clock
+from contextlib import contextmanager
 from sqlalchemy import select
 from .base import session_scope
-from .models import TradeDry, TradeLive
-import config as cfg
+from .models import TradeDry, TradeLive, Wallet
+from . import position_book
+from config_loader import cfg
 
 def _tab():
     return TradeDry if getattr(cfg, "DRY_RUN", True) else TradeLive
 
 def has_open(symbol: str, exchange: str, interval: str) -> bool:
-    with session_scope() as s:
-        q = s.execute(
-            select(_tab()).where(
-                _tab().symbol == symbol,
-                _tab().exchange == exchange,
-                _tab().interval == interval,
-                _tab().is_open == True
-            ).limit(1)
-        ).scalars().first()
-        return q is not None
+    # из книги позиций процесса (db/position_book), без запроса
+    return position_book.position(symbol, exchange, interval) is not None
 
 def open_entry(symbol: str, exchange: str, interval: str,
                entry_price: float, base_qty: float, quote_spent: float = 0.0, meta=None) -> None:
     with session_scope() as s:
         t = _tab()(
-            ts_open_ms=int(time.time()*1000),
+            ts_open_ms=clock.now_ms(),
             ts_close_ms=None,
             symbol=symbol, exchange=exchange, interval=interval,
             entry_price=float(entry_price), exit_price=None,
@@ -32,6 +26,7 @@ def open_entry(symbol: str, exchange: str, interval: str,
             is_open=True, meta_json=(meta or {})
         )
         s.add(t)
+    position_book.invalidate()
 
 def close_entry(symbol: str, exchange: str, interval: str,
                 exit_price: float, meta=None) -> bool:
@@ -47,12 +42,13 @@ def close_entry(symbol: str, exchange: str, interval: str,
         if not q:
             return False
         q.exit_price = float(exit_price)
-        q.ts_close_ms = int(time.time()*1000)
+        q.ts_close_ms = clock.now_ms()
         q.is_open = False
         if meta:
             q.meta_json = {**(q.meta_json or {}), **meta}
         s.add(q)
-        return True
+    position_book.invalidate()
+    return True
 
 
 def get_open(symbol: str, exchange: str, interval: str):
@@ -66,3 +62,120 @@ def get_open(symbol: str, exchange: str, interval: str):
                 _tab().is_open==True
             ).limit(1)
         ).scalars().first()
+
+
+# ---------------- unit of work: позиция + кошелёк в одной транзакции
+class TradeUnitOfWork:
+    """Чтение позиции/кошелька и запись сделки+кошелька в одной сессии; commit один — на выходе."""
+
+    def __init__(self, session, symbol: str, exchange: str, interval: str, base_quote: str):
+        self.s = session
+        self.symbol, self.exchange, self.interval = symbol, exchange, interval
+        self.base_quote = base_quote
+        self._pos = None
+        self._pos_loaded = False
+        self._wallet = None
+        self._book = None            # (Pos | None, free | None) для position_book после commit
+
+    @property
+    def position(self):
+        if not self._pos_loaded:
+            T = _tab()
+            self._pos = self.s.execute(
+                select(T).where(
+                    T.symbol == self.symbol,
+                    T.exchange == self.exchange,
+                    T.interval == self.interval,
+                    T.is_open == True
+                ).limit(1)
+            ).scalars().first()
+            self._pos_loaded = True
+        return self._pos
+
+    def _wallet_row(self):
+        if self._wallet is None:
+            w = self.s.get(Wallet, self.base_quote)
+            if not w:
+                w = Wallet(asset=self.base_quote, free=0.0, locked=0.0, updated_ms=clock.now_ms())
+                self.s.add(w)
+            self._wallet = w
+        return self._wallet
+
+    @property
+    def free(self) -> float:
+        return float(self._wallet_row().free or 0.0)
+
+    def _add_free(self, delta: float) -> None:
+        w = self._wallet_row()
+        w.free = float(w.free or 0.0) + float(delta)
+        w.updated_ms = clock.now_ms()
+
+    def open(self, entry_price: float, base_qty: float, quote_spent: float, meta=None):
+        self._add_free(-float(quote_spent))
+        t = _tab()(
+            ts_open_ms=clock.now_ms(),
+            ts_close_ms=None,
+            symbol=self.symbol, exchange=self.exchange, interval=self.interval,
+            entry_price=float(entry_price), exit_price=None,
+            base_qty=float(base_qty), quote_spent=float(quote_spent),
+            is_open=True, meta_json=(meta or {})
+        )
+        self.s.add(t)
+        self._pos, self._pos_loaded = t, True
+        return t
+
+    def close(self, exit_price: float, meta=None, qty: float = None, proceeds: float = None) -> float:
+        """Закрыть позицию по exit_price, выручку зачислить в кошелёк. Возвращает выручку.
+        qty меньше base_qty — частичное закрытие: строка закрывается на qty (quote_spent — пропорционально),
+        остаток открыт новой строкой с тем же входом. proceeds — фактическая выручка (иначе qty * exit_price)."""
+        t = self.position
+        if t is None:
+            return 0.0
+        base = float(t.base_qty or 0.0)
+        rest = None
+        if qty is not None and 0 < float(qty) < base:
+            left = base - float(qty)
+            spent = float(t.quote_spent or 0.0)
+            rest = _tab()(
+                ts_open_ms=t.ts_open_ms, ts_close_ms=None,
+                symbol=t.symbol, exchange=t.exchange, interval=t.interval,
+                entry_price=t.entry_price, exit_price=None,
+                base_qty=left, quote_spent=spent * left / base,
+                is_open=True, meta_json={**(t.meta_json or {}), "split_from": t.id}
+            )
+            t.base_qty, t.quote_spent = float(qty), spent - rest.quote_spent
+            self.s.add(rest)
+        proceeds = float(t.base_qty or 0.0) * float(exit_price) if proceeds is None else float(proceeds)
+        self._add_free(proceeds)
+        t.exit_price = float(exit_price)
+        t.ts_close_ms = clock.now_ms()
+        t.is_open = False
+        if meta:
+            t.meta_json = {**(t.meta_json or {}), **meta}
+        self._pos = rest
+        return proceeds
+
+    def _capture(self) -> None:
+        """Снимок позиции/кошелька до commit (после него ORM-объекты истекают)."""
+        self.s.flush()
+        t = self._pos if self._pos_loaded else None
+        pos = position_book.Pos(t.id, t.entry_price, t.base_qty, t.quote_spent, t.ts_open_ms) if t is not None else None
+        free = float(self._wallet.free or 0.0) if self._wallet is not None else None
+        self._book = (pos, free)
+
+    def _publish(self) -> None:
+        if self._book is None:
+            return
+        pos, free = self._book
+        key = (self.symbol, self.exchange, self.interval) if self._pos_loaded else None
+        position_book.put(key, pos, self.base_quote, free)
+
+@contextmanager
+def unit_of_work(symbol: str, exchange: str, interval: str, base_quote: str = "USDC"):
+    # читает позицию/кошелёк и пишет в той же транзакции — BEGIN IMMEDIATE (см. db/base.session_scope)
+    with session_scope(immediate=True) as s:
+        uow = TradeUnitOfWork(s, symbol, exchange, interval, base_quote)
+        yield uow
+        uow._capture()
+    # commit прошёл — write-through в книгу позиций процесса
+    uow._publish()
@@ -1,64 +1,69 @@
 # -*- coding: utf-8 -*-
-import time, json
-import config as cfg
-from db.base import create_all, session_scope
-from db.models import Candle, CurrentPrice, Signal
+import time, signal as _signal, argparse, threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from config_loader import cfg, strategy, trade
+import notify
+import metrics
+from metrics import timer
+from db.base import create_all, configure
+from db.signals_io import sink as signal_sink
+from db.prices_io import latest as prices_latest, SYMBOL as PRICE_SYMBOL
+from db.candles_io import candles_tail, candles_since
 from db.wallet import ensure_start_balance, get_free
-from core.engine import process_signal
-from core.core import compute_signal
+from core.engine import process_signal, reconcile_live_orders
+from core.indicator_engine import get_engine, save_engine
 
 def _load_closes(symbol, exchange, interval, limit=500):
-    with session_scope() as s:
-        rows = (
-            s.query(Candle.close)
-            .filter(Candle.pair == symbol, Candle.exchange == exchange, Candle.interval == interval)
-            .order_by(Candle.ts_ms.asc())
-            .all()
-        )
-        return [float(r[0]) for r in rows][-limit:]
-
-def _last_price_fallback(symbol_close_list):
-    # текущая медиана из current_price; если нет — последний close
-    with session_scope() as s:
-        last = (
-            s.query(CurrentPrice)
-            .order_by(CurrentPrice.ts_ms.desc())
-            .limit(1)
-            .first()
-        )
+    return [r[4] for r in candles_tail(symbol, exchange, interval, limit)]
+
+def _last_price_fallback(symbol, symbol_close_list):
+    # текущая медиана из current_price — только для её символа (таблица без колонки символа);
+    # остальные пары и пустая таблица — последний close (live-бар) самой пары
+    if symbol == PRICE_SYMBOL:
+        last = prices_latest()
         if last and last.current_median:
             return float(last.current_median)
     return float(symbol_close_list[-1]) if symbol_close_list else 0.0
 
-def main():
-    create_all()
-    ensure_start_balance()
+# кошелёк общий для всех пар: исполнение сделок сериализуем
+_EXEC_LOCK = threading.Lock()
 
-    pair = cfg.STRATEGY["PAIRS"][0]
+def tick(pair):
     symbol, exchange, interval = pair["symbol"], pair["exchange"], pair["interval"]
+    lbl = f"{symbol}@{exchange}/{interval}"
+    M = "ebot_tick_stage_seconds"
 
-    closes = _load_closes(
-        symbol,
-        exchange,
-        interval,
-        limit=max(300, cfg.STRATEGY.get("EMA_SLOW", 20) * 3),
-    )
-    price = _last_price_fallback(closes)
-
-    # ЕДИНЫЙ порог: GAP_THRESHOLD_BPS (bps) -> доля
-    gap_pct = float(cfg.STRATEGY.get("GAP_THRESHOLD_BPS", 50)) / 10000.0
-
-    signal, meta = compute_signal(
-        closes,
-        price,
-        ema_fast=cfg.STRATEGY.get("EMA_FAST", 9),
-        ema_slow=cfg.STRATEGY.get("EMA_SLOW", 20),
-        entry_min_gap_pct=gap_pct,
-        cross_grace_bars=cfg.STRATEGY.get("CROSS_GRACE_BARS", 3),
+    # ЕДИНЫЙ порог: GAP_THRESHOLD_BPS (bps) -> доля (st.gap_pct)
+    st = strategy()
+    eng = get_engine(
+        symbol, exchange, interval,
+        ema_fast=st.ema_fast,
+        ema_slow=st.ema_slow,
+        entry_min_gap_pct=st.gap_pct,
+        cross_grace_bars=st.cross_grace_bars,
     )
+    # из кэша свечей берём только новые бары (+ REFRESH_BARS последних закрытых, их может переписать candles_increment)
+    refresh = int(getattr(cfg, "CANDLE_CACHE", {}).get("REFRESH_BARS", 2))
+    with timer(M, stage="candles", pair=lbl):
+        rows = [(r[0], r[4]) for r in candles_since(symbol, exchange, interval,
+                                                    eng.refresh_from_ts(refresh), limit=eng.need + refresh + 1)]
+        if eng.sync(rows):
+            save_engine(symbol, exchange, interval, eng)
+    with timer(M, stage="price", pair=lbl):
+        price = _last_price_fallback(symbol, [c for _, c in rows[-1:]])
+
+    with timer(M, stage="signal", pair=lbl):
+        signal, meta = eng.evaluate(price)
 
-    res = process_signal(symbol, exchange, interval, signal, price)
-    quote_free = get_free(cfg.TRADE.get("BASE_QUOTE", "USDC"))
+    with timer(M, stage="exec_wait", pair=lbl):
+        _EXEC_LOCK.acquire()
+    try:
+        with timer(M, stage="exec", pair=lbl):
+            res = process_signal(symbol, exchange, interval, signal, price)
+    finally:
+        _EXEC_LOCK.release()
+    with timer(M, stage="wallet", pair=lbl):
+        quote_free = get_free(trade().base_quote)
 
     payload = {
         "signal": signal,
@@ -67,48 +72,107 @@ def main():
         "price": price,
         "quote_free": quote_free,
     }
-    print("tick:", payload)
+    print(f"tick {symbol}@{exchange}/{interval}:", payload)
 
-    # --- Лог в файл ---
+    # --- Лог в файл и БД: в буфер, пачкой пишет поток db/signals_io ---
     try:
-        ts_ms = int(time.time() * 1000)
-        human_ts = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(ts_ms / 1000))
-        with open("logs/signals.log", "a", encoding="utf-8") as f:
-            f.write(f"{ts_ms} | {human_ts} | tick: {payload}\n")
+        with timer(M, stage="log", pair=lbl):
+            signal_sink().record(symbol, exchange, interval, signal, meta, res, price, payload)
     except Exception:
+        # не валим цикл из-за логирования
         pass
+    return payload
+
+# ---------------- планировщик: все пары STRATEGY.PAIRS на пуле потоков
+_INFLIGHT = {}   # (symbol, exchange, interval) -> Future последнего тика
+_STOP = threading.Event()
 
-    # --- Лог в БД (ORM) ---
+def _pair_key(pair):
+    return (pair["symbol"], pair["exchange"], pair["interval"])
+
+def _safe_tick(pair):
     try:
-        ema_fast = float(meta.get("ema9")) if isinstance(meta, dict) and meta.get("ema9") is not None else None
-        ema_slow = float(meta.get("ema20")) if isinstance(meta, dict) and meta.get("ema20") is not None else None
-        gap_bps = None
-        if isinstance(meta, dict) and meta.get("gap") is not None:
-            gap_bps = float(meta["gap"]) * 10000.0
-        else:
-            try:
-                if ema_fast is not None and ema_slow is not None and price:
-                    gap_bps = ((ema_fast - ema_slow) / float(price)) * 10000.0
-            except Exception:
-                gap_bps = None
-
-        with session_scope() as s:
-            s.add(Signal(
-                ts_ms=int(time.time()*1000),
-                pair=symbol,
-                exchange=exchange,
-                interval=interval,
-                signal=signal,
-                ema_fast=ema_fast,
-                ema_slow=ema_slow,
-                gap_bps=gap_bps,
-                exec_status=(res.get("status") if isinstance(res, dict) else None),
-                reason=(meta.get("reason") if isinstance(meta, dict) else None),
-                meta_json=(json.dumps(meta, ensure_ascii=False) if isinstance(meta, dict) else None),
-            ))
-    except Exception:
-        # не валим цикл из-за логирования
-        pass
+        with timer("ebot_tick_seconds", pair="{symbol}@{exchange}/{interval}".format(**pair)):
+            return tick(pair)
+    except Exception as e:
+        print(f"tick_error {_pair_key(pair)}: {e!r}")
+        return None
+
+def run_cycle(pool, pairs, deadline_sec):
+    """Один проход по парам. Пара, чей прошлый тик ещё идёт, пропускается (backpressure);
+    тики, не уложившиеся в deadline_sec, не ждём — они доработают в фоне."""
+    started, skipped = [], []
+    for pair in pairs:
+        key = _pair_key(pair)
+        prev = _INFLIGHT.get(key)
+        if prev is not None and not prev.done():
+            skipped.append(key)
+            continue
+        fut = pool.submit(_safe_tick, pair)
+        _INFLIGHT[key] = fut
+        started.append((key, fut))
+    _, not_done = wait([f for _, f in started], timeout=deadline_sec)
+    overdue = [key for key, f in started if f in not_done]
+    metrics.inc("ebot_cycle_skipped_total", len(skipped))
+    metrics.inc("ebot_cycle_overdue_total", len(overdue))
+    if skipped or overdue:
+        print(f"cycle: started={len(started)} skipped_busy={len(skipped)} overdue={len(overdue)}")
+    return {"started": len(started), "skipped": skipped, "overdue": overdue}
+
+def run_forever(pairs, workers, cooldown_sec, deadline_sec):
+    for sig in (_signal.SIGINT, _signal.SIGTERM):
+        try:
+            _signal.signal(sig, lambda *_: _STOP.set())
+        except Exception:
+            pass
+    notify.start_sender(_STOP)
+    try:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tick") as pool:
+            while not _STOP.is_set():
+                t0 = time.monotonic()
+                run_cycle(pool, pairs, deadline_sec)
+                _STOP.wait(max(0.0, cooldown_sec - (time.monotonic() - t0)))
+    finally:
+        # пул дождался тиков — дописываем буфер сигналов
+        signal_sink().stop()
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--daemon", action="store_true", help="вечный цикл по всем парам (иначе один проход)")
+    args = ap.parse_args()
+
+    configure("bot")
+    metrics.start("ebot", _STOP)
+    create_all()
+    ensure_start_balance()
+    if not getattr(cfg, "DRY_RUN", True):
+        # LIVE: открыть keep-alive соединение с MEXC и сверить время до первого ордера
+        from exch.mexc import client
+        try:
+            client().warmup()
+        except Exception as e:
+            print("mexc warmup error:", repr(e))
+        # ордера, итог которых не записан (сбой между отправкой и второй транзакцией) — сверка с биржей
+        left = {cid: st for cid, st in reconcile_live_orders().items() if st == "pending"}
+        if left:
+            print("live orders still pending:", ", ".join(left))
+
+    pairs = list(cfg.STRATEGY.get("PAIRS", []))
+    sch = getattr(cfg, "SCHEDULER", {})
+    workers = max(1, int(sch.get("WORKERS", 8)))
+    cooldown = float(getattr(cfg, "TRADE_COOLDOWN_SEC", 10.0))
+    deadline = float(sch.get("TICK_DEADLINE_SEC", cooldown))
+
+    if args.daemon:
+        run_forever(pairs, workers, cooldown, deadline)
+    else:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tick") as pool:
+            run_cycle(pool, pairs, deadline)
+        signal_sink().stop()
+        # разовый запуск: доотправить уведомления этого прохода (торговля уже завершена)
+        notify.send_pending()
+        if metrics.enabled():
+            metrics.dump()
 
 if __name__ == "__main__":
     main()
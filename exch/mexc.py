@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+# MEXC spot v3 для LIVE: подпись HMAC-SHA256 (timestamp + recvWindow), keep-alive пул хоста из http_client
+# (общий с candles_fetch/price_agg_ws, как и бюджет запросов к хосту); ордер = один запрос по уже открытому
+# соединению (warmup() открывает его заранее), без повторов — POST ордера не идемпотентен.
+# Асинхронно: place_order_async/cancel_order_async -> concurrent.futures.Future (asyncio: asyncio.wrap_future).
+# market_fill ждёт итогового статуса ордера (FILL_TIMEOUT_SEC); не дождался — final=False, ордер на сверку.
+# Настройки — EXCHANGES.MEXC: API_KEY, API_SECRET, BASE_URL, RECV_WINDOW_MS, HTTP_TIMEOUT_SEC, FILL_TIMEOUT_SEC,
+# POOL_SIZE, SYMBOL_RULES.
+# Локальная проверка без биржи: python -m exch.mock_server + BASE_URL="http://127.0.0.1:18080".
+#   python -m exch.mexc --bench 200        — задержка round-trip ордера (p50/p95/p99) против BASE_URL
+import hmac, hashlib, math, time, uuid, threading, argparse, json, statistics
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Dict, Optional
+from urllib.parse import urlencode
+
+import http_client
+import metrics
+from config_loader import cfg
+
+DEFAULT_BASE_URL = "https://api.mexc.com"
+# итоговые статусы ордера: исполнение больше не изменится (REJECTED/EXPIRED — и наши отметки в orders_live)
+FINAL_STATUSES = ("FILLED", "CANCELED", "PARTIALLY_CANCELED", "REJECTED", "EXPIRED")
+
+
+class MexcError(Exception):
+    def __init__(self, status: int, code=None, msg: str = ""):
+        super().__init__(f"MEXC HTTP {status} code={code} {msg}")
+        self.status, self.code, self.msg = status, code, msg
+
+
+def _mexc_cfg() -> dict:
+    return (getattr(cfg, "EXCHANGES", {}) or {}).get("MEXC", {}) or {}
+
+
+def _fmt(x: float) -> str:
+    s = f"{x:.12f}".rstrip("0").rstrip(".")
+    return s or "0"
+
+
+class MexcClient:
+    def __init__(self, api_key: str = None, api_secret: str = None, base_url: str = None,
+                 recv_window_ms: int = None, timeout: float = None, pool_size: int = None):
+        mc = _mexc_cfg()
+        self.api_key = api_key or mc.get("API_KEY", "")
+        self.api_secret = (api_secret or mc.get("API_SECRET", "")).encode()
+        self.base_url = (base_url or mc.get("BASE_URL") or DEFAULT_BASE_URL).rstrip("/")
+        self.recv_window_ms = int(recv_window_ms or mc.get("RECV_WINDOW_MS", 5000))
+        self.timeout = float(timeout or mc.get("HTTP_TIMEOUT_SEC", 5))
+        self.fill_timeout = float(mc.get("FILL_TIMEOUT_SEC", 5))
+        self.rules = mc.get("SYMBOL_RULES", {}) or {}
+        pool = int(pool_size or mc.get("POOL_SIZE", 4))
+        self.session = http_client.session(self.base_url)
+        self.headers = {"X-MEXC-APIKEY": self.api_key, "Content-Type": "application/json"}
+        self.time_offset_ms = 0
+        self._synced = False
+        self._exec = ThreadPoolExecutor(max_workers=pool, thread_name_prefix="mexc")
+
+    # ---------- транспорт
+    def _now_ms(self) -> int:
+        return int(time.time() * 1000) + self.time_offset_ms
+
+    def _sign(self, params: Dict) -> str:
+        q = urlencode(params)
+        sig = hmac.new(self.api_secret, q.encode(), hashlib.sha256).hexdigest()
+        return f"{q}&signature={sig}"
+
+    def _request(self, method: str, path: str, params: Optional[Dict] = None, signed: bool = False,
+                 target: str = "mexc") -> dict:
+        params = {k: v for k, v in (params or {}).items() if v is not None}
+        if signed:
+            if not self._synced:
+                self.sync_time()
+            params.update(recvWindow=self.recv_window_ms, timestamp=self._now_ms())
+            url = f"{self.base_url}{path}?{self._sign(params)}"
+        else:
+            url = f"{self.base_url}{path}" + (f"?{urlencode(params)}" if params else "")
+        r = http_client.request(method, url, target=target, retries=0, headers=self.headers, timeout=self.timeout)
+        try:
+            js = r.json()
+        except ValueError:
+            js = {"msg": r.text[:200]}
+        if r.status_code != 200 or (isinstance(js, dict) and js.get("code") not in (None, 0, 200)):
+            raise MexcError(r.status_code, js.get("code") if isinstance(js, dict) else None,
+                            js.get("msg", "") if isinstance(js, dict) else "")
+        return js
+
+    def warmup(self) -> None:
+        """Открыть keep-alive соединение и сверить время — первый ордер не платит за TCP/TLS."""
+        self._request("GET", "/api/v3/ping", target="mexc_ping")
+        self.sync_time()
+
+    def sync_time(self) -> int:
+        t0 = int(time.time() * 1000)
+        srv = int(self._request("GET", "/api/v3/time", target="mexc_time")["serverTime"])
+        t1 = int(time.time() * 1000)
+        self.time_offset_ms = srv - (t0 + t1) // 2
+        self._synced = True
+        return self.time_offset_ms
+
+    # ---------- округление по правилам символа
+    def _step(self, symbol: str, key: str) -> Optional[float]:
+        v = (self.rules.get(symbol) or {}).get(key)
+        return float(v) if v else None
+
+    def qty(self, symbol: str, qty: float) -> str:
+        step = self._step(symbol, "QTY_STEP")
+        if step:
+            qty = math.floor(float(qty) / step + 1e-9) * step
+        return _fmt(qty)
+
+    def quote(self, symbol: str, amount: float) -> str:
+        step = self._step(symbol, "QUOTE_STEP") or 0.01
+        return _fmt(math.floor(float(amount) / step + 1e-9) * step)
+
+    # ---------- ордера
+    def place_order(self, symbol: str, side: str, type_: str = "MARKET", quantity: Optional[float] = None,
+                    quote_qty: Optional[float] = None, price: Optional[float] = None,
+                    client_id: Optional[str] = None) -> dict:
+        """Один подписанный POST /api/v3/order. MARKET BUY — по quote_qty (сумма в котируемой), SELL — по quantity."""
+        params = {
+            "symbol": symbol, "side": side.upper(), "type": type_.upper(),
+            "quantity": self.qty(symbol, quantity) if quantity is not None else None,
+            "quoteOrderQty": self.quote(symbol, quote_qty) if quote_qty is not None else None,
+            "price": _fmt(price) if price is not None else None,
+            "newClientOrderId": client_id or uuid.uuid4().hex[:32],
+        }
+        with metrics.timer("ebot_order_roundtrip_seconds", side=params["side"]):
+            return self._request("POST", "/api/v3/order", params, signed=True, target="mexc_order")
+
+    def cancel_order(self, symbol: str, order_id: Optional[str] = None, client_id: Optional[str] = None) -> dict:
+        return self._request("DELETE", "/api/v3/order",
+                             {"symbol": symbol, "orderId": order_id, "origClientOrderId": client_id},
+                             signed=True, target="mexc_cancel")
+
+    def get_order(self, symbol: str, order_id: Optional[str] = None, client_id: Optional[str] = None) -> dict:
+        return self._request("GET", "/api/v3/order",
+                             {"symbol": symbol, "orderId": order_id, "origClientOrderId": client_id},
+                             signed=True, target="mexc_query")
+
+    def account(self) -> dict:
+        return self._request("GET", "/api/v3/account", signed=True, target="mexc_account")
+
+    def free_balance(self, asset: str) -> float:
+        """Свободный остаток актива на бирже (после комиссий) — по нему продаётся позиция."""
+        for b in self.account().get("balances", []):
+            if b.get("asset") == asset:
+                return float(b.get("free") or 0.0)
+        return 0.0
+
+    def place_order_async(self, *args, **kw) -> Future:
+        return self._exec.submit(self.place_order, *args, **kw)
+
+    def cancel_order_async(self, *args, **kw) -> Future:
+        return self._exec.submit(self.cancel_order, *args, **kw)
+
+    # ---------- исполнение по рынку с итогом сделки
+    def fill_info(self, o: dict, client_id: Optional[str] = None) -> dict:
+        """Итог ордера из ответа биржи: {order_id, client_id, status, final, qty, quote, avg_price, ts_ms, raw}."""
+        qty = float(o.get("executedQty") or 0.0)
+        quote = float(o.get("cummulativeQuoteQty") or 0.0)
+        status = o.get("status") or "NEW"
+        return {"order_id": str(o["orderId"]) if o.get("orderId") is not None else None,
+                "client_id": o.get("clientOrderId") or client_id, "status": status,
+                "final": status in FINAL_STATUSES and o.get("executedQty") is not None,
+                "qty": qty, "quote": quote, "avg_price": (quote / qty) if qty > 0 else None,
+                "ts_ms": int(o.get("updateTime") or o.get("transactTime") or self._now_ms()), "raw": o}
+
+    def market_fill(self, symbol: str, side: str, quantity: Optional[float] = None,
+                    quote_qty: Optional[float] = None, client_id: Optional[str] = None,
+                    timeout: Optional[float] = None) -> dict:
+        """MARKET-ордер и его итог (см. fill_info). Ответ на POST исполнения не содержит — GET /api/v3/order
+        до итогового статуса, не дольше timeout (FILL_TIMEOUT_SEC). Не дождались — final=False: ордер мог
+        исполниться позже, его итог берётся сверкой по client_id, а не считается неисполненным."""
+        client_id = client_id or uuid.uuid4().hex[:32]
+        o = self.place_order(symbol, side, "MARKET", quantity=quantity, quote_qty=quote_qty, client_id=client_id)
+        end = time.monotonic() + float(self.fill_timeout if timeout is None else timeout)
+        pause = 0.0
+        while not self.fill_info(o)["final"] and time.monotonic() < end:
+            time.sleep(pause)
+            pause = min(0.5, pause * 2 or 0.05)
+            try:
+                o = {**o, **self.get_order(symbol, order_id=o.get("orderId"),
+                                           client_id=None if o.get("orderId") else client_id)}
+            except MexcError as e:
+                print(f"[MEXC] order {o.get('orderId') or client_id} status err: {e}")
+        return self.fill_info(o, client_id)
+
+    def close(self) -> None:
+        self._exec.shutdown(wait=False)
+
+
+_CLIENT: Optional[MexcClient] = None
+_CLIENT_LOCK = threading.Lock()
+
+
+def client() -> MexcClient:
+    """Общий клиент процесса (пул соединений переиспользуется всеми тиками)."""
+    global _CLIENT
+    if _CLIENT is None:
+        with _CLIENT_LOCK:
+            if _CLIENT is None:
+                _CLIENT = MexcClient()
+    return _CLIENT
+
+
+def bench_roundtrip(n: int = 200, symbol: str = "BTCUSDC", c: Optional[MexcClient] = None) -> dict:
+    """n LIMIT BUY по цене 1.0 (далеко от рынка, не исполнится) с отменой каждого: задержка постановки
+    ордера (мс), отмена в замер не входит. Только против mock/тестового стенда."""
+    c = c or client()
+    if c.base_url == DEFAULT_BASE_URL:
+        raise SystemExit("bench: только против mock/стенда (EXCHANGES.MEXC.BASE_URL), не против биржи")
+    c.warmup()
+    lat = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        o = c.place_order(symbol, "BUY", "LIMIT", quantity=0.001, price=1.0)
+        lat.append((time.perf_counter() - t0) * 1000)
+        c.cancel_order(symbol, order_id=o.get("orderId"))
+    lat.sort()
+    q = lambda p: round(lat[min(len(lat) - 1, int(p * len(lat)))], 3)
+    return {"n": n, "p50_ms": q(0.50), "p95_ms": q(0.95), "p99_ms": q(0.99),
+            "mean_ms": round(statistics.mean(lat), 3), "base_url": c.base_url}
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--bench", type=int, default=0, help="замер round-trip ордера (только mock/стенд)")
+    ap.add_argument("--symbol", default="BTCUSDC")
+    a = ap.parse_args()
+    if a.bench:
+        print(json.dumps(bench_roundtrip(a.bench, a.symbol)))
+    else:
+        c = client()
+        c.warmup()
+        print("mexc: ok, time offset", c.time_offset_ms, "ms")
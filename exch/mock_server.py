@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+# Локальный mock MEXC spot v3 для проверки exch/mexc и LIVE-пути без биржи:
+# /api/v3/ping, /time, /order (POST/DELETE/GET), /account. Проверяет HMAC-подпись, recvWindow и ключ.
+# MARKET исполняется по цене --price (или set_price()), LIMIT висит до отмены. Для проверки LIVE-пути:
+# --fee — комиссия (BUY — в базовом активе, SELL — в котируемой), --fill-delay-ms — MARKET до исполнения
+# висит в NEW, --fill-ratio < 1 — исполняется доля, остаток отменён (PARTIALLY_CANCELED);
+# SELL больше свободного остатка отклоняется (Oversold), как у биржи.
+#   python -m exch.mock_server --port 18080 --key k --secret s --price 60000
+#   (в config.py: EXCHANGES.MEXC.BASE_URL = "http://127.0.0.1:18080", API_KEY/API_SECRET — те же)
+import hmac, hashlib, json, time, socket, threading, argparse, itertools
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qsl
+
+
+class MockExchange:
+    def __init__(self, api_key: str = "k", api_secret: str = "s", price: float = 60000.0,
+                 balances: dict = None, latency_ms: float = 0.0, fee: float = 0.0,
+                 fill_delay_ms: float = 0.0, fill_ratio: float = 1.0):
+        self.api_key, self.api_secret = api_key, api_secret.encode()
+        self.price = float(price)
+        self.latency_ms = float(latency_ms)
+        self.fee, self.fill_delay_ms, self.fill_ratio = float(fee), float(fill_delay_ms), float(fill_ratio)
+        self.balances = dict(balances or {"USDC": 10_000.0, "BTC": 0.0})
+        self.orders = {}
+        self.lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+    def set_price(self, price: float) -> None:
+        self.price = float(price)
+
+    def _check(self, query: str, headers) -> dict:
+        if headers.get("X-MEXC-APIKEY") != self.api_key:
+            raise PermissionError((401, 10072, "api key invalid"))
+        body, _, sig = query.rpartition("&signature=")
+        good = hmac.new(self.api_secret, body.encode(), hashlib.sha256).hexdigest()
+        if not hmac.compare_digest(sig, good):
+            raise PermissionError((400, 700002, "signature invalid"))
+        p = dict(parse_qsl(body))
+        if abs(int(time.time() * 1000) - int(p.get("timestamp", 0))) > int(p.get("recvWindow", 5000)):
+            raise PermissionError((400, 700003, "timestamp outside recvWindow"))
+        return p
+
+    def order(self, p: dict) -> dict:
+        sym, side, typ = p["symbol"], p["side"], p["type"]
+        oid = str(next(self._ids))
+        now = int(time.time() * 1000)
+        o = {"symbol": sym, "orderId": oid, "clientOrderId": p.get("newClientOrderId"), "side": side, "type": typ,
+             "price": p.get("price", "0"), "origQty": p.get("quantity", "0"), "transactTime": now, "updateTime": now,
+             "status": "NEW", "executedQty": "0", "cummulativeQuoteQty": "0"}
+        with self.lock:
+            if typ == "MARKET" and side == "SELL" and float(p.get("quantity", 0)) > self.balances.get(sym[:-4], 0.0) + 1e-12:
+                raise PermissionError((400, 30005, "Oversold"))
+            if typ == "MARKET":
+                o["_due"], o["_p"] = now + self.fill_delay_ms, p
+                self._settle(o)
+            self.orders[oid] = o
+        # как у MEXC: ответ на POST без исполнения, итог — через GET /api/v3/order
+        return {k: o[k] for k in ("symbol", "orderId", "price", "origQty", "type", "side", "transactTime")}
+
+    def _settle(self, o: dict) -> None:
+        """Исполнить MARKET, если подошёл его срок (--fill-delay-ms): балансы с комиссией, статус."""
+        p = o.pop("_p", None)
+        if p is None:
+            return
+        if time.time() * 1000 < o["_due"]:
+            o["_p"] = p
+            return
+        base, quote_ccy = o["symbol"][:-4], o["symbol"][-4:]
+        if o["side"] == "BUY":
+            quote = float(p.get("quoteOrderQty") or float(p.get("quantity", 0)) * self.price)
+            quote = round(min(quote, self.balances.get(quote_ccy, 0.0)) * self.fill_ratio, 8)
+            qty = round(quote / self.price, 8)
+            self.balances[base] = self.balances.get(base, 0.0) + round(qty * (1 - self.fee), 8)
+            self.balances[quote_ccy] = self.balances.get(quote_ccy, 0.0) - quote
+        else:
+            qty = round(min(float(p.get("quantity", 0)), self.balances.get(base, 0.0)) * self.fill_ratio, 8)
+            quote = round(qty * self.price, 8)
+            self.balances[base] = self.balances.get(base, 0.0) - qty
+            self.balances[quote_ccy] = self.balances.get(quote_ccy, 0.0) + round(quote * (1 - self.fee), 8)
+        o.update(status="FILLED" if self.fill_ratio >= 1 else "PARTIALLY_CANCELED", updateTime=int(time.time() * 1000),
+                 executedQty=f"{qty:.8f}", cummulativeQuoteQty=f"{quote:.8f}")
+
+    def handle(self, method: str, path: str, query: str, headers):
+        if path == "/api/v3/ping":
+            return {}
+        if path == "/api/v3/time":
+            return {"serverTime": int(time.time() * 1000)}
+        p = self._check(query, headers)
+        if path == "/api/v3/account":
+            return {"balances": [{"asset": a, "free": f"{v:.8f}", "locked": "0"} for a, v in self.balances.items()]}
+        if path == "/api/v3/order":
+            if method == "POST":
+                return self.order(p)
+            o = self.orders.get(p.get("orderId")) or next(
+                (x for x in self.orders.values() if x["clientOrderId"] == p.get("origClientOrderId")), None)
+            if o is None:
+                raise PermissionError((400, -2013, "order not exist"))
+            with self.lock:
+                self._settle(o)
+                if method == "DELETE" and o["status"] == "NEW":
+                    o.pop("_p", None)
+                    o["status"] = "CANCELED"
+            return {k: v for k, v in o.items() if not k.startswith("_")}
+        raise PermissionError((404, 404, "not found"))
+
+
+def make_handler(ex: MockExchange):
+    class _H(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"   # keep-alive, как у настоящей биржи
+
+        def setup(self):
+            super().setup()
+            # заголовки и тело уходят разными send: без NODELAY задержанный ACK даёт +40 мс
+            self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        def _do(self, method):
+            u = urlsplit(self.path)
+            if ex.latency_ms:
+                time.sleep(ex.latency_ms / 1000.0)
+            try:
+                status, js = 200, ex.handle(method, u.path, u.query, self.headers)
+            except PermissionError as e:
+                status, code, msg = e.args[0]
+                js = {"code": code, "msg": msg}
+            n = int(self.headers.get("Content-Length") or 0)
+            if n:
+                self.rfile.read(n)
+            body = json.dumps(js).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self): self._do("GET")
+        def do_POST(self): self._do("POST")
+        def do_DELETE(self): self._do("DELETE")
+
+        def log_message(self, *args):
+            pass
+    return _H
+
+
+def serve(ex: MockExchange, port: int = 18080, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Поднять mock в фоне; вернуть сервер (srv.shutdown() — остановить)."""
+    srv = ThreadingHTTPServer((host, int(port)), make_handler(ex))
+    srv.daemon_threads = True
+    threading.Thread(target=srv.serve_forever, name="mexc-mock", daemon=True).start()
+    return srv
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--port", type=int, default=18080)
+    ap.add_argument("--key", default="k")
+    ap.add_argument("--secret", default="s")
+    ap.add_argument("--price", type=float, default=60000.0)
+    ap.add_argument("--latency-ms", type=float, default=0.0)
+    ap.add_argument("--fee", type=float, default=0.0)
+    ap.add_argument("--fill-delay-ms", type=float, default=0.0)
+    ap.add_argument("--fill-ratio", type=float, default=1.0)
+    a = ap.parse_args()
+    srv = ThreadingHTTPServer(("127.0.0.1", a.port), make_handler(
+        MockExchange(a.key, a.secret, a.price, latency_ms=a.latency_ms, fee=a.fee,
+                     fill_delay_ms=a.fill_delay_ms, fill_ratio=a.fill_ratio)))
+    print(f"mexc mock on http://127.0.0.1:{a.port}")
+    srv.serve_forever()
@@ -0,0 +1,310 @@
+# -*- coding: utf-8 -*-
+# Общий HTTP-транспорт процессов бота: keep-alive пул на хост, повторы с backoff и общий
+# для всех процессов бюджет запросов (token bucket) по хосту.
+# Бюджет хранится в маленькой SQLite-базе HTTP.STATE_FILE (не в основной БД): списание — одна
+# транзакция BEGIN IMMEDIATE, поэтому price_agg_ws, candles_fetch, ebot и отчёты делят один лимит.
+# Запрос резервирует weight токенов; при нехватке ждёт, пока ведро наполнится. 429/418 от хоста
+# ставят паузу (Retry-After) для всего бюджета — остальные процессы тоже ждут, а не ловят свои 429.
+# Хост без записи в HTTP.BUDGETS не ограничивается и базу не трогает.
+# Задержки по target (mexc_klines, telegram, ...) — stats() в процессе, ebot_http_seconds в metrics,
+# раз в STATS_FLUSH_SEC — в ту же базу:  python -m http_client  (все процессы; --budgets — вёдра).
+#   import http_client
+#   r = http_client.get(url, params={...}, target="mexc_ticker")
+#   r = http_client.post(url, data={...}, target="telegram", retries=0)
+import os, sys, time, json, atexit, random, sqlite3, argparse, threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+from config_loader import cfg
+
+IDEMPOTENT = ("GET", "HEAD", "OPTIONS", "PUT", "DELETE")
+RETRY_STATUS = (418, 429, 500, 502, 503, 504)
+THROTTLE_STATUS = (418, 429)
+SAMPLES = 512        # последних задержек на target для перцентилей
+
+_LOCK = threading.Lock()
+_SESSIONS: Dict[str, requests.Session] = {}
+_LOCAL_BUCKETS: Dict[str, list] = {}      # запасной вариант, если STATE_FILE недоступен: name -> [tokens, ts, blocked_until]
+_STATS: Dict[str, dict] = {}
+_local = threading.local()
+_ST = {"flushed": time.monotonic(), "state_err": False}
+
+
+def _hcfg() -> dict:
+    return getattr(cfg, "HTTP", {}) or {}
+
+
+def _state_file() -> str:
+    path = _hcfg().get("STATE_FILE")
+    if not path:
+        path = os.path.join(getattr(cfg, "DATA_DIR", "/root/Ebot/data"), "http_state.db")
+    return os.path.abspath(path)
+
+
+# ---------- пул соединений
+def session(url: str) -> requests.Session:
+    """Keep-alive сессия хоста url (одна на процесс, потокобезопасный пул urllib3)."""
+    u = urlsplit(url)
+    key = f"{u.scheme}://{u.netloc}"
+    s = _SESSIONS.get(key)
+    if s is None:
+        with _LOCK:
+            s = _SESSIONS.get(key)
+            if s is None:
+                size = int(_hcfg().get("POOL_SIZE", 8))
+                s = requests.Session()
+                s.mount(key, HTTPAdapter(pool_connections=1, pool_maxsize=size, max_retries=0))
+                _SESSIONS[key] = s
+    return s
+
+
+# ---------- общий бюджет
+def _db() -> sqlite3.Connection:
+    con = getattr(_local, "con", None)
+    path = _state_file()
+    if con is None or getattr(_local, "path", None) != path:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        con = sqlite3.connect(path, timeout=5.0, isolation_level=None)
+        con.execute("PRAGMA journal_mode=WAL")
+        con.execute("PRAGMA synchronous=OFF")      # состояние мягкое: потеря при сбое ОС — лишь сброс ведра
+        con.execute("CREATE TABLE IF NOT EXISTS http_budget (name TEXT PRIMARY KEY, tokens REAL NOT NULL, "
+                    "ts REAL NOT NULL, blocked_until REAL NOT NULL DEFAULT 0)")
+        con.execute("CREATE TABLE IF NOT EXISTS http_stats (proc TEXT NOT NULL, target TEXT NOT NULL, "
+                    "ts REAL NOT NULL, json TEXT NOT NULL, PRIMARY KEY (proc, target))")
+        _local.con, _local.path = con, path
+    return con
+
+
+@contextmanager
+def _write():
+    """BEGIN IMMEDIATE … COMMIT; при любой ошибке — ROLLBACK, иначе соединение потока останется
+    в открытой транзакции и каждый следующий BEGIN на нём будет падать."""
+    con = _db()
+    con.execute("BEGIN IMMEDIATE")
+    try:
+        yield con
+        con.execute("COMMIT")
+    except BaseException:
+        if con.in_transaction:
+            con.execute("ROLLBACK")
+        raise
+
+
+def _budget(name: str) -> Optional[dict]:
+    b = (_hcfg().get("BUDGETS") or {}).get(name)
+    if not b or float(b.get("RATE", 0) or 0) <= 0:
+        return None
+    rate = float(b["RATE"])
+    return {"rate": rate, "burst": float(b.get("BURST", rate))}
+
+
+def _take(tokens: float, ts: float, blocked: float, rate: float, burst: float, weight: float, now: float):
+    """Резерв weight токенов: новое (tokens, ts) и сколько ждать. Долг (tokens < 0) гасится ожиданием."""
+    tokens = min(burst, tokens + max(0.0, now - ts) * rate) - weight
+    wait = max(0.0, -tokens / rate, blocked - now)
+    return tokens, now, wait
+
+
+def _reserve(name: str, b: dict, weight: float) -> float:
+    now = time.time()
+    try:
+        with _write() as con:
+            row = con.execute("SELECT tokens, ts, blocked_until FROM http_budget WHERE name=?", (name,)).fetchone()
+            tokens, ts, blocked = row if row else (b["burst"], now, 0.0)
+            tokens, ts, wait = _take(tokens, ts, blocked, b["rate"], b["burst"], weight, now)
+            con.execute("INSERT OR REPLACE INTO http_budget (name, tokens, ts, blocked_until) VALUES (?, ?, ?, ?)",
+                        (name, tokens, ts, blocked))
+        return wait
+    except sqlite3.Error as e:
+        if not _ST["state_err"]:
+            _ST["state_err"] = True
+            print(f"[HTTP] state {_state_file()} unavailable ({e!r}); budget is per-process")
+        with _LOCK:
+            st = _LOCAL_BUCKETS.setdefault(name, [b["burst"], now, 0.0])
+            st[0], st[1], wait = _take(st[0], st[1], st[2], b["rate"], b["burst"], weight, now)
+        return wait
+
+
+def acquire(name: str, weight: float = 1.0) -> float:
+    """Списать weight из бюджета name (ждать при нехватке). Вернуть время ожидания, с."""
+    b = _budget(name)
+    if b is None:
+        return 0.0
+    wait = _reserve(name, b, float(weight))
+    if wait > 0:
+        time.sleep(wait)
+        metrics.observe("ebot_http_throttle_seconds", wait, budget=name)
+    return wait
+
+
+def block(name: str, seconds: float) -> None:
+    """Пауза бюджета name на seconds для всех процессов (ответ 429/418)."""
+    if _budget(name) is None or seconds <= 0:
+        return
+    until = time.time() + seconds
+    try:
+        with _write() as con:
+            con.execute("UPDATE http_budget SET blocked_until = MAX(blocked_until, ?) WHERE name=?", (until, name))
+    except sqlite3.Error:
+        with _LOCK:
+            st = _LOCAL_BUCKETS.get(name)
+            if st:
+                st[2] = max(st[2], until)
+
+
+# ---------- статистика по target
+def _note(target: str, sec: float, ok: bool, retried: bool, throttled: float) -> None:
+    with _LOCK:
+        st = _STATS.get(target)
+        if st is None:
+            st = _STATS[target] = {"n": 0, "errors": 0, "retries": 0, "throttle_sec": 0.0, "sum_sec": 0.0,
+                                   "max_sec": 0.0, "lat": deque(maxlen=SAMPLES)}
+        st["n"] += 1
+        st["errors"] += 0 if ok else 1
+        st["retries"] += 1 if retried else 0
+        st["throttle_sec"] += throttled
+        st["sum_sec"] += sec
+        st["max_sec"] = max(st["max_sec"], sec)
+        st["lat"].append(sec)
+    every = float(_hcfg().get("STATS_FLUSH_SEC", 30) or 0)
+    if every > 0 and time.monotonic() - _ST["flushed"] > every:
+        flush_stats()
+
+
+def _pct(xs, p: float) -> float:
+    return xs[min(len(xs) - 1, int(p * len(xs)))] if xs else 0.0
+
+
+def stats() -> Dict[str, dict]:
+    """Задержки процесса по target: n, errors, retries, throttle_sec, mean/p50/p95/p99/max (мс)."""
+    with _LOCK:
+        items = [(k, dict(v, lat=sorted(v["lat"]))) for k, v in _STATS.items()]
+    out = {}
+    for k, v in items:
+        lat = v["lat"]
+        out[k] = {"n": v["n"], "errors": v["errors"], "retries": v["retries"],
+                  "throttle_sec": round(v["throttle_sec"], 3),
+                  "mean_ms": round(v["sum_sec"] / v["n"] * 1000, 3) if v["n"] else 0.0,
+                  "p50_ms": round(_pct(lat, 0.50) * 1000, 3), "p95_ms": round(_pct(lat, 0.95) * 1000, 3),
+                  "p99_ms": round(_pct(lat, 0.99) * 1000, 3), "max_ms": round(v["max_sec"] * 1000, 3)}
+    return out
+
+
+def _proc() -> str:
+    return f"{os.path.basename(sys.argv[0] or 'python')}:{os.getpid()}"
+
+
+def flush_stats() -> None:
+    """Записать stats() процесса в STATE_FILE (для --stats); записи старше суток удаляются."""
+    _ST["flushed"] = time.monotonic()
+    now, proc = time.time(), _proc()
+    try:
+        with _write() as con:
+            con.executemany("INSERT OR REPLACE INTO http_stats (proc, target, ts, json) VALUES (?, ?, ?, ?)",
+                            [(proc, k, now, json.dumps(v)) for k, v in stats().items()])
+            con.execute("DELETE FROM http_stats WHERE ts < ?", (now - 86400,))
+    except sqlite3.Error as e:
+        print(f"[HTTP] stats flush err: {e!r}")
+
+
+def shared_stats() -> list:
+    """Последние stats всех процессов из STATE_FILE: [{proc, target, age_sec, ...}]."""
+    now = time.time()
+    rows = _db().execute("SELECT proc, target, ts, json FROM http_stats ORDER BY target, proc").fetchall()
+    return [dict(proc=p, target=t, age_sec=round(now - ts, 1), **json.loads(js)) for p, t, ts, js in rows]
+
+
+# ---------- запрос
+def _retry_after(r: requests.Response) -> Optional[float]:
+    v = r.headers.get("Retry-After")
+    try:
+        return float(v) if v is not None else None
+    except ValueError:
+        return None
+
+
+def request(method: str, url: str, target: Optional[str] = None, weight: float = 1.0,
+            budget: Optional[str] = None, retries: Optional[int] = None, backoff: Optional[float] = None,
+            **kw) -> requests.Response:
+    """HTTP-запрос через пул хоста с бюджетом и повторами; возвращает последний ответ (статус не проверяется).
+    Повтор — на сетевую ошибку и RETRY_STATUS; для POST — только 429/418 и ConnectTimeout (запрос не дошёл).
+    budget — имя бюджета в HTTP.BUDGETS (по умолчанию хост url); target — метка статистики (по умолчанию хост)."""
+    hc = _hcfg()
+    method = method.upper()
+    host = urlsplit(url).hostname or ""
+    target = target or host
+    budget = budget or host
+    retries = int(hc.get("RETRIES", 2) if retries is None else retries)
+    backoff = float(hc.get("BACKOFF_SEC", 0.5) if backoff is None else backoff)
+    cap = float(hc.get("MAX_BACKOFF_SEC", 30))
+    kw.setdefault("timeout", float(hc.get("TIMEOUT_SEC", 10)))
+    safe = method in IDEMPOTENT
+    s = session(url)
+    attempt = 0
+    while True:
+        throttled = acquire(budget, weight)
+        t0 = time.perf_counter()
+        r, err = None, None
+        try:
+            r = s.request(method, url, **kw)
+        except requests.RequestException as e:
+            err = e
+        sec = time.perf_counter() - t0
+        metrics.observe("ebot_http_seconds", sec, target=target)
+        metrics.inc("ebot_http_requests_total", target=target, status=r.status_code if r is not None else "error")
+        retry = attempt < retries and (
+            (r is not None and r.status_code in (RETRY_STATUS if safe else THROTTLE_STATUS))
+            or (err is not None and (safe or isinstance(err, requests.ConnectTimeout))))
+        _note(target, sec, err is None and r.status_code < 400, retry, throttled)
+        pause = backoff * (2 ** attempt) * (0.5 + random.random())
+        if r is not None and r.status_code in THROTTLE_STATUS:
+            ra = _retry_after(r)
+            pause = ra if ra is not None else pause
+            block(budget, min(pause, cap))
+        if not retry:
+            if err is not None:
+                raise err
+            return r
+        metrics.inc("ebot_http_retries_total", target=target)
+        attempt += 1
+        time.sleep(min(pause, cap))
+
+
+def get(url: str, **kw) -> requests.Response:
+    return request("GET", url, **kw)
+
+
+def post(url: str, **kw) -> requests.Response:
+    return request("POST", url, **kw)
+
+
+def _flush_at_exit() -> None:
+    if _STATS and float(_hcfg().get("STATS_FLUSH_SEC", 30) or 0) > 0:
+        flush_stats()
+
+
+atexit.register(_flush_at_exit)
+metrics.describe("ebot_http_throttle_seconds", "Ожидание общего бюджета HTTP-запросов")
+metrics.describe("ebot_http_retries_total", "Повторы HTTP-запросов")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--budgets", action="store_true", help="состояние бюджетов (по умолчанию — задержки по target)")
+    a = ap.parse_args()
+    if a.budgets:
+        now = time.time()
+        for name, tokens, ts, blocked in _db().execute("SELECT name, tokens, ts, blocked_until FROM http_budget"):
+            b = _budget(name) or {"rate": 0.0, "burst": 0.0}
+            cur = min(b["burst"], tokens + (now - ts) * b["rate"])
+            print(f"{name:<24} tokens={cur:8.2f}/{b['burst']:<6g} rate={b['rate']:g}/s "
+                  f"blocked={max(0.0, blocked - now):.1f}s")
+    else:
+        for row in shared_stats():
+            print(json.dumps(row, ensure_ascii=False))
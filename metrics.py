@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+# Метрики процесса: гистограммы задержек по стадиям и счётчики, формат Prometheus text.
+# Выключено (METRICS.ENABLED=False, по умолчанию) — timer() отдаёт общий пустой контекст,
+# observe()/inc() выходят на первой проверке: накладные расходы — один if.
+# Включено — start(name) поднимает локальный HTTP /metrics (METRICS.PORTS[name]) и/или
+# раз в DUMP_SEC пишет <DUMP_DIR>/<name>.prom (подходит для textfile-коллектора node_exporter).
+#   from metrics import timer, observe, inc
+#   with timer("ebot_tick_stage_seconds", stage="exec", pair="BTCUSDC@MEXC/1m"): ...
+import os, time, bisect, threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+
+from config_loader import cfg
+
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_ON = False
+_LOCK = threading.Lock()
+_HIST: Dict[Tuple[str, tuple], list] = {}     # (name, labels) -> [counts по BUCKETS + inf, sum, count]
+_COUNT: Dict[Tuple[str, tuple], float] = {}
+_HELP: Dict[str, str] = {}
+_NAME = "ebot"
+
+
+def _mcfg() -> dict:
+    return getattr(cfg, "METRICS", {}) or {}
+
+
+def enabled() -> bool:
+    return _ON
+
+
+def describe(name: str, text: str) -> None:
+    _HELP[name] = text
+
+
+# ---------- запись
+def observe(name: str, seconds: float, **labels) -> None:
+    if not _ON:
+        return
+    key = (name, tuple(sorted(labels.items())))
+    i = bisect.bisect_left(BUCKETS, seconds)
+    with _LOCK:
+        h = _HIST.get(key)
+        if h is None:
+            h = _HIST[key] = [[0] * (len(BUCKETS) + 1), 0.0, 0]
+        h[0][i] += 1
+        h[1] += seconds
+        h[2] += 1
+
+
+def inc(name: str, n: float = 1, **labels) -> None:
+    if not _ON:
+        return
+    key = (name, tuple(sorted(labels.items())))
+    with _LOCK:
+        _COUNT[key] = _COUNT.get(key, 0) + n
+
+
+class _Timer:
+    __slots__ = ("name", "labels", "t0")
+
+    def __init__(self, name: str, labels: dict):
+        self.name, self.labels = name, labels
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, et, ev, tb):
+        observe(self.name, time.perf_counter() - self.t0, **self.labels)
+        if et is not None:
+            inc(self.name.replace("_seconds", "") + "_errors_total", **self.labels)
+        return False
+
+
+class _Noop:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, et, ev, tb):
+        return False
+
+
+_NOOP = _Noop()
+
+
+def timer(name: str, **labels):
+    """Контекст-замер длительности блока в гистограмму name (ошибка блока -> <name>_errors_total)."""
+    return _Timer(name, labels) if _ON else _NOOP
+
+
+# ---------- выдача
+def _lbl(labels: tuple, extra: Optional[tuple] = None) -> str:
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{str(v)}"' for k, v in items) + "}"
+
+
+def render() -> str:
+    with _LOCK:
+        hist = {k: (list(v[0]), v[1], v[2]) for k, v in _HIST.items()}
+        count = dict(_COUNT)
+    out, seen = [], set()
+
+    def _head(name, kind):
+        if name not in seen:
+            seen.add(name)
+            if name in _HELP:
+                out.append(f"# HELP {name} {_HELP[name]}")
+            out.append(f"# TYPE {name} {kind}")
+
+    for (name, labels), (counts, total, n) in sorted(hist.items()):
+        _head(name, "histogram")
+        acc = 0
+        for le, c in zip(BUCKETS, counts):
+            acc += c
+            out.append(f"{name}_bucket{_lbl(labels, ('le', le))} {acc}")
+        out.append(f"{name}_bucket{_lbl(labels, ('le', '+Inf'))} {n}")
+        out.append(f"{name}_sum{_lbl(labels)} {total:.6f}")
+        out.append(f"{name}_count{_lbl(labels)} {n}")
+    for (name, labels), v in sorted(count.items()):
+        _head(name, "counter")
+        out.append(f"{name}{_lbl(labels)} {v:g}")
+    return "\n".join(out) + "\n"
+
+
+def dump(path: Optional[str] = None) -> str:
+    path = path or os.path.join(_mcfg().get("DUMP_DIR", "logs/metrics"), f"{_NAME}.prom")
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(render())
+    os.replace(tmp, path)   # коллектор не видит недописанный файл
+    return path
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve(port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    srv = ThreadingHTTPServer((host, int(port)), _Handler)
+    srv.daemon_threads = True
+    threading.Thread(target=srv.serve_forever, name="metrics-http", daemon=True).start()
+    return srv
+
+
+def _dump_loop(sec: float, stop: threading.Event) -> None:
+    while not stop.wait(sec):
+        try:
+            dump()
+        except Exception as e:
+            print("metrics dump error:", repr(e))
+
+
+def start(name: str, stop: Optional[threading.Event] = None, force: Optional[bool] = None) -> bool:
+    """Включить метрики процесса name по METRICS (ENABLED, PORTS, HOST, DUMP_DIR, DUMP_SEC)."""
+    global _ON, _NAME
+    mc = _mcfg()
+    on = bool(mc.get("ENABLED", False)) if force is None else bool(force)
+    if not on:
+        return False
+    _ON, _NAME = True, name
+    port = (mc.get("PORTS") or {}).get(name)
+    if port:
+        try:
+            serve(port, mc.get("HOST", "127.0.0.1"))
+        except OSError as e:
+            print(f"metrics: port {port} busy: {e!r}")
+    sec = float(mc.get("DUMP_SEC", 0) or 0)
+    if sec > 0:
+        threading.Thread(target=_dump_loop, args=(sec, stop or threading.Event()),
+                         name="metrics-dump", daemon=True).start()
+    return True
+
+
+describe("ebot_tick_stage_seconds", "Длительность стадии тика ebot по паре")
+describe("ebot_tick_seconds", "Длительность тика ebot целиком")
+describe("ebot_http_seconds", "Длительность HTTP-запроса")
+describe("ebot_db_commits_total", "Коммиты сессий БД")
+describe("ebot_db_rollbacks_total", "Откаты сессий БД")
@@ -1,6 +1,6 @@
 # -*- coding: utf-8 -*-
 """
-Telegram notifications for trades (BUY/SELL) + equity snapshot for 24h PnL.
+Telegram notifications for trades (BUY/SELL) + equity point (db/equity_io) for 24h PnL.
 
 Сообщение:
 DRY/LIVE / BTCUSDC
@@ -13,20 +13,22 @@ TOTAL: <equity $> / <24h %>
 """
 from __future__ import annotations
 
+import os
 import json
 import time
+import uuid
 from typing import Optional, Tuple
 from datetime import datetime, timezone, timedelta
 
-import requests
+import config_loader
+import http_client
+import clock
 
 # --- helpers ---
 
 def _cfg():
-    import importlib.util as u
-    s = u.spec_from_file_location('config', '/root/Ebot/config.py')
-    m = u.module_from_spec(s); s.loader.exec_module(m)
-    return m
+    # кэшированный config (перечитывается config_loader только при смене mtime)
+    return config_loader.current()
 
 def _msk_now_str(ts_ms: Optional[int] = None) -> str:
     if ts_ms is None:
@@ -42,14 +44,12 @@ def _latest_price_and_rate() -> Tuple[float, float]:
     Возвращает (last_price_usdc, usdc_usdt_rate).
     """
     try:
-        from db.base import session_scope
-        from db.models import CurrentPrice
-        with session_scope() as s:
-            r = s.query(CurrentPrice).order_by(CurrentPrice.ts_ms.desc()).limit(1).first()
-            if r:
-                price_now = float((r.current_median or r.mexc_mid) or 0.0)
-                rate = float(r.usdc_usdt_rate or 1.0)
-                return price_now, rate
+        from db.prices_io import latest
+        r = latest()
+        if r:
+            price_now = float((r.current_median or r.mexc_mid) or 0.0)
+            rate = float(r.usdc_usdt_rate or 1.0)
+            return price_now, rate
     except Exception:
         pass
     return 0.0, 1.0
@@ -59,101 +59,111 @@ def _current_equity_usdc() -> float:
     Equity в USDC: free USDC + сумма открытых позиций (qty * last_price_usdc).
     """
     try:
-        cfg = _cfg()
-        base_quote = cfg.TRADE.get("BASE_QUOTE", "USDC")
-        from db.base import session_scope
-        from db.models import Wallet, TradeDry, TradeLive
+        from db.equity_io import current
         price_now, _ = _latest_price_and_rate()
-        with session_scope() as s:
-            w = s.get(Wallet, base_quote)
-            free = float(w.free) if w else 0.0
-            T = TradeDry if getattr(cfg, "DRY_RUN", True) else TradeLive
-            open_usdc = 0.0
-            for t in s.query(T).filter(T.is_open == True).all():  # noqa: E712
-                open_usdc += float(t.base_qty or 0.0) * float(price_now or 0.0)
-            return free + open_usdc
+        return current(price_now)["equity_usdc"]
     except Exception:
         return 0.0
 
-def _equity_24h_change_pct(cur_usdc: float) -> float:
-    """
-    Сохраняет снапшоты equity и возвращает изменение за 24ч в долях (0.05 = +5%).
-    """
-    import os
-    data_dir = "/root/Ebot/data"
-    os.makedirs(data_dir, exist_ok=True)
-    path = f"{data_dir}/equity_24h.jsonl"
-    now_ms = int(time.time() * 1000)
-
-    snaps = []
-    if os.path.exists(path):
-        with open(path, "r", encoding="utf-8") as f:
-            for line in f:
-                try:
-                    snaps.append(json.loads(line))
-                except Exception:
-                    pass
-
-    # добавляем текущий
-    snaps.append({"ts_ms": now_ms, "equity": float(cur_usdc)})
-    # чистим старше 48ч
-    snaps = [x for x in snaps if (now_ms - int(x.get("ts_ms", 0))) <= 48 * 3600 * 1000]
-
-    # сохраняем
-    with open(path, "w", encoding="utf-8") as f:
-        for x in snaps:
-            f.write(json.dumps(x, ensure_ascii=False) + "\n")
-
-    # ищем ближайший к -24ч
-    target = now_ms - 24 * 3600 * 1000
-    closest, best = None, None
-    for x in snaps:
-        dt = abs(int(x["ts_ms"]) - target)
-        if best is None or dt < best:
-            best = dt; closest = x
-    if closest and closest.get("equity", 0) > 0:
-        base = float(closest["equity"])
-        if base > 0:
-            return (float(cur_usdc) - base) / base
-    return 0.0
+def _equity_24h_change_pct(cur_usdc: float, usdc_usdt: Optional[float] = None) -> float:
+    """
+    Пишет точку equity (src=trade) и возвращает изменение за 24ч в долях (0.05 = +5%).
+    Ряд хранится в equity_snapshot (db/equity_io), ближайшая к -24ч точка ищется по индексу.
+    """
+    try:
+        from db import equity_io
+        now_ms = clock.now_ms()
+        equity_io.record(cur_usdc, ts_ms=now_ms, usdc_usdt=usdc_usdt, src="trade")
+        pct = equity_io.change_pct(cur_usdc, equity_io.WINDOWS_MS["24h"], now_ms=now_ms)
+        return pct if pct is not None else 0.0
+    except Exception:
+        return 0.0
 
 # --- Telegram ---
 
 def _tg_params():
-    cfg = _cfg()
-    tgd = getattr(cfg, "TELEGRAM", {})
-    enabled = bool(tgd.get("ENABLED", True)) and bool(tgd.get("BOT_TOKEN")) and bool(tgd.get("CHAT_ID"))
-    return enabled, tgd.get("BOT_TOKEN", ""), tgd.get("CHAT_ID", "")
+    tg = config_loader.telegram()
+    return tg.active, tg.bot_token, tg.chat_id
 
-def send_text(text: str) -> bool:
+def _tg_api_base() -> str:
+    return config_loader.telegram().api_base
+
+def _post_message(text: str) -> Tuple[bool, Optional[float], Optional[str]]:
     """
-    Отправка plain‑текста в Telegram. Возвращает True/False по ответу API.
+    Один sendMessage. Возвращает (ok, retry_after_sec при 429, описание ошибки).
     """
     enabled, token, chat_id = _tg_params()
     if not enabled:
-        print("[TG] disabled")
-        return False
+        return False, None, "disabled"
     try:
-        resp = requests.post(
-            f"https://api.telegram.org/bot{token}/sendMessage",
+        # без повторов в транспорте: 429/ошибку обрабатывает outbox (retry_after, next_try_ms)
+        resp = http_client.post(
+            f"{_tg_api_base()}/bot{token}/sendMessage",
             data={"chat_id": chat_id, "text": text},
-            timeout=5,
+            timeout=5, target="telegram", retries=0,
         )
         try:
             js = resp.json()
-            ok = bool(js.get("ok"))
-            desc = js.get("description")
-            print(f"[TG] HTTP {resp.status_code} ok={ok} desc={desc}")
-            return ok
         except Exception as e:
-            print(f"[TG] HTTP {getattr(resp,'status_code',None)} json_err={e}")
-            return False
+            return False, None, f"HTTP {getattr(resp,'status_code',None)} json_err={e}"
+        ok = bool(js.get("ok"))
+        retry_after = (js.get("parameters") or {}).get("retry_after")
+        if resp.status_code == 429 and retry_after is None:
+            retry_after = 1.0
+        return ok, (float(retry_after) if retry_after is not None else None), js.get("description")
     except Exception as e:
-        print(f"[TG] send err: {e}")
+        return False, None, f"send err: {e}"
+
+def send_text(text: str) -> bool:
+    """
+    Отправка plain‑текста в Telegram. Возвращает True/False по ответу API.
+    """
+    ok, retry_after, desc = _post_message(text)
+    if desc == "disabled":
+        print("[TG] disabled")
         return False
+    print(f"[TG] ok={ok} desc={desc} retry_after={retry_after}")
+    return ok
 
 # --- Public API ---
 
+def _render_trade(action, symbol, qty, price, pnl_pct, ts_ms=None, bal_free=None, mode=None) -> str:
+    cfg = _cfg()
+    mode = mode or ("DRY" if getattr(cfg, "DRY_RUN", True) else "LIVE")
+    if bal_free is None:
+        bal_free = _wallet_free(cfg)
+
+    # формат
+    sign = "+" if (pnl_pct or 0) >= 0 else ""
+    pnl_str = f" {sign}{(pnl_pct or 0) * 100:.2f}%" if (pnl_pct is not None) else ""
+    return (
+        f"{mode} / {symbol}\n"
+        f"{action.upper()}: {qty:.8f}\n"
+        f"PRICE: {price:.2f}\n"
+        f"BAL: {bal_free:.2f} USDC{pnl_str}\n"
+        f"-----------------\n"
+        f"{_msk_now_str(ts_ms)}"
+    )
+
+def _wallet_free(cfg) -> float:
+    try:
+        from db.base import session_scope
+        from db.models import Wallet
+        base_quote = cfg.TRADE.get("BASE_QUOTE", "USDC")
+        with session_scope() as s:
+            w = s.get(Wallet, base_quote)
+            return float(w.free) if w else 0.0
+    except Exception:
+        return 0.0
+
+def _total_line() -> str:
+    # расчёты
+    price_now_usdc, usdc_usdt = _latest_price_and_rate()
+    equity_usdc = _current_equity_usdc()
+    equity_usd = equity_usdc * (usdc_usdt or 1.0)
+    eq24 = _equity_24h_change_pct(equity_usdc, usdc_usdt)
+    return f"TOTAL: {equity_usd:,.2f} $ / {eq24*100:+.0f}%".replace(",", " ")
+
 def trade_notify(
     action: str,
     symbol: str,
@@ -164,47 +174,174 @@ def trade_notify(
     ts_ms: Optional[int] = None
 ) -> bool:
     """
-    Формирует и отправляет сообщение о сделке (BUY/SELL) в Telegram.
+    Формирует и отправляет сообщение о сделке (BUY/SELL) в Telegram синхронно.
+    Торговый путь использует outbox (outbox_add), а не эту функцию.
     """
-    cfg = _cfg()
-    mode = "DRY" if getattr(cfg, "DRY_RUN", True) else "LIVE"
+    text = _render_trade(action, symbol, qty, price, pnl_pct, ts_ms) + "\n" + _total_line()
+    return send_text(text)
 
-    # расчёты
-    price_now_usdc, usdc_usdt = _latest_price_and_rate()
-    equity_usdc = _current_equity_usdc()
-    equity_usd = equity_usdc * (usdc_usdt or 1.0)
-    eq24 = _equity_24h_change_pct(equity_usdc)
+# --- Outbox: очередь уведомлений в БД + фоновый отправитель ---
+# Запись в notify_outbox делается в той же транзакции, что и сделка (outbox_add(session, ...)),
+# поэтому постановка в очередь не добавляет ни commit, ни сетевых вызовов торговому пути.
+
+def outbox_add(session, kind: str, payload: dict) -> None:
+    from db.models import NotifyOutbox
+    now = clock.now_ms()
+    session.add(NotifyOutbox(ts_ms=now, kind=kind, payload_json=json.dumps(payload, ensure_ascii=False),
+                             status="pending", attempts=0, next_try_ms=now))
 
-    # баланс после операции
+def enqueue(kind: str, payload: dict) -> bool:
     try:
         from db.base import session_scope
-        from db.models import Wallet
-        base_quote = cfg.TRADE.get("BASE_QUOTE", "USDC")
         with session_scope() as s:
-            w = s.get(Wallet, base_quote)
-            bal_free = float(w.free) if w else 0.0
-    except Exception:
-        bal_free = 0.0
+            outbox_add(s, kind, payload)
+        return True
+    except Exception as e:
+        print(f"[TG] outbox err: {e}")
+        return False
 
-    # формат
-    sign = "+" if (pnl_pct or 0) >= 0 else ""
-    pnl_str = f" {sign}{(pnl_pct or 0) * 100:.2f}%" if (pnl_pct is not None) else ""
-    dt_str = _msk_now_str(ts_ms)
-    total_line = f"TOTAL: {equity_usd:,.2f} $ / {eq24*100:+.0f}%".replace(",", " ")
+def simple_notify(text: str) -> bool:
+    """Короткий текст (отчёты, алерты) через outbox."""
+    return enqueue("text", {"text": text})
 
-    text = (
-        f"{mode} / {symbol}\n"
-        f"{action.upper()}: {qty:.8f}\n"
-        f"PRICE: {price:.2f}\n"
-        f"BAL: {bal_free:.2f} USDC{pnl_str}\n"
-        f"-----------------\n"
-        f"{dt_str}\n"
-        f"{total_line}"
-    )
-    return send_text(text)
+def _outbox_cfg():
+    return getattr(_cfg(), "TELEGRAM", {}).get("OUTBOX", {})
+
+def _render_batch(rows) -> str:
+    """Пачка trade-записей: одна — как раньше; несколько — дайджест с одним TOTAL."""
+    trades = [json.loads(r.payload_json) for r in rows]
+    if len(trades) == 1:
+        t = trades[0]
+        return _render_trade(t["action"], t["symbol"], t["qty"], t["price"], t.get("pnl_pct"),
+                             t.get("ts_ms"), t.get("bal_free"), t.get("mode")) + "\n" + _total_line()
+    mode = trades[0].get("mode") or ("DRY" if getattr(_cfg(), "DRY_RUN", True) else "LIVE")
+    lines = [f"{mode} / {len(trades)} сделок"]
+    for t in trades:
+        pnl = t.get("pnl_pct")
+        pnl_str = f" {pnl*100:+.2f}%" if pnl is not None else ""
+        lines.append(f"{_msk_now_str(t.get('ts_ms'))[11:]} {t['action'].upper()} {t['symbol']} "
+                     f"{float(t['qty']):.8f} @ {float(t['price']):.2f}{pnl_str}")
+    lines.append("-----------------")
+    lines.append(_msk_now_str())
+    lines.append(_total_line())
+    return "\n".join(lines)
+
+def _claim(limit: int, lease_ms: int):
+    """
+    Взять в аренду до limit записей: pending с next_try_ms <= now или sending с истёкшей арендой.
+    Один UPDATE … WHERE id IN (SELECT … LIMIT) AND <свободна>: в SQLite блокировка записи берётся сразу
+    (SELECT, затем UPDATE в одной транзакции упирается в «database is locked» при конкуренции),
+    условие проверяется в момент записи — запись, которую уже взял другой отправитель, не берётся.
+    Возвращает (owner, записи, взятые этим owner).
+    """
+    from sqlalchemy import and_, or_, select
+    from db.base import session_scope
+    from db.models import NotifyOutbox
+    owner = f"{os.getpid()}:{uuid.uuid4().hex[:12]}"
+    now = int(time.time() * 1000)
+    free = or_(and_(NotifyOutbox.status == "pending", NotifyOutbox.next_try_ms <= now),
+               and_(NotifyOutbox.status == "sending", NotifyOutbox.lease_until_ms < now))
+    ids = select(NotifyOutbox.id).where(free).order_by(NotifyOutbox.id.asc()).limit(limit)
+    with session_scope() as s:
+        n = s.query(NotifyOutbox).filter(NotifyOutbox.id.in_(ids), free).update(
+            {"status": "sending", "owner": owner, "lease_until_ms": now + lease_ms}, synchronize_session=False)
+    if not n:
+        return owner, []
+    with session_scope() as s:
+        rows = (s.query(NotifyOutbox).filter(NotifyOutbox.owner == owner, NotifyOutbox.status == "sending")
+                  .order_by(NotifyOutbox.id.asc()).all())
+        s.expunge_all()
+    return owner, rows
+
+def send_pending(limit: Optional[int] = None) -> dict:
+    """
+    Один проход отправителя: записи, взятые в аренду (_claim), отправляются и помечаются sent / pending / dead.
+    trade-записи пачки (>= DIGEST_MIN) склеиваются в дайджест; 429 откладывает всю очередь на retry_after.
+    """
+    from db.base import session_scope
+    from db.models import NotifyOutbox
+    oc = _outbox_cfg()
+    limit = int(limit or oc.get("BATCH", 20))
+    digest_min = int(oc.get("DIGEST_MIN", 3))
+    max_attempts = int(oc.get("MAX_ATTEMPTS", 8))
+    owner, rows = _claim(limit, int(float(oc.get("LEASE_SEC", 60)) * 1000))
+    if not rows:
+        return {"sent": 0, "failed": 0}
+    mine = (NotifyOutbox.owner == owner, NotifyOutbox.status == "sending")
+
+    trades = [r for r in rows if r.kind == "trade"]
+    groups = [[r] for r in rows if r.kind != "trade"]
+    if len(trades) >= digest_min:
+        groups.append(trades)
+    else:
+        groups.extend([r] for r in trades)
+
+    sent = failed = 0
+    for g in groups:
+        try:
+            text = json.loads(g[0].payload_json)["text"] if g[0].kind == "text" else _render_batch(g)
+            ok, retry_after, desc = _post_message(text)
+        except Exception as e:
+            ok, retry_after, desc = False, None, f"render err: {e}"
+        ids = [r.id for r in g]
+        with session_scope() as s:
+            if ok:
+                s.query(NotifyOutbox).filter(NotifyOutbox.id.in_(ids), *mine).update(
+                    {"status": "sent", "sent_ms": int(time.time() * 1000), "owner": None, "lease_until_ms": None},
+                    synchronize_session=False)
+                sent += len(ids)
+                continue
+            failed += len(ids)
+            for r in g:
+                attempts = int(r.attempts or 0) + 1
+                delay_ms = int((retry_after if retry_after is not None else min(300.0, 2.0 ** attempts)) * 1000)
+                status = "pending" if (desc != "disabled" and attempts < max_attempts) else "dead"
+                s.query(NotifyOutbox).filter(NotifyOutbox.id == r.id, *mine).update(
+                    {"attempts": attempts, "next_try_ms": int(time.time() * 1000) + delay_ms,
+                     "status": status, "error": (desc or "")[:200], "owner": None, "lease_until_ms": None},
+                    synchronize_session=False)
+            if retry_after is not None:
+                # rate limit чата: сдвигаем всю очередь, не долбим API
+                s.query(NotifyOutbox).filter(NotifyOutbox.status == "pending").update(
+                    {"next_try_ms": int(time.time() * 1000) + int(retry_after * 1000)}, synchronize_session=False)
+        if retry_after is not None:
+            # оставшиеся взятые записи — обратно в очередь со сдвигом, не ждать истечения аренды
+            with session_scope() as s:
+                s.query(NotifyOutbox).filter(*mine).update(
+                    {"status": "pending", "owner": None, "lease_until_ms": None,
+                     "next_try_ms": int(time.time() * 1000) + int(retry_after * 1000)}, synchronize_session=False)
+            break
+    return {"sent": sent, "failed": failed}
+
+def sender_loop(stop=None, poll_sec: Optional[float] = None) -> None:
+    """Фоновый отправитель: крутится до stop.set()."""
+    import threading
+    stop = stop or threading.Event()
+    poll = float(poll_sec or _outbox_cfg().get("POLL_SEC", 1.0))
+    while not stop.is_set():
+        try:
+            res = send_pending()
+        except Exception as e:
+            print(f"[TG] sender err: {e}")
+            res = {"sent": 0}
+        if not res.get("sent"):
+            stop.wait(poll)
+
+def start_sender(stop=None):
+    import threading
+    th = threading.Thread(target=sender_loop, args=(stop,), name="notify-sender", daemon=True)
+    th.start()
+    return th
 
 # --- manual test ---
 if __name__ == "__main__":
-    # небольшой самотест, если запустить файл руками
-    ok = send_text("✅ notify.py ready")
-    print("selftest:", ok)
+    import sys
+    if "--sender" in sys.argv:
+        # отдельный процесс-отправитель outbox
+        from db.base import configure
+        configure("service")
+        sender_loop()
+    else:
+        # небольшой самотест, если запустить файл руками
+        ok = send_text("✅ notify.py ready")
+        print("selftest:", ok)
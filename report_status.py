@@ -1,24 +1,26 @@
 #!/usr/bin/env python3
 # report_status.py — строит график из БД и шлёт в Telegram (напрямую) + caption с 5 последними сделками
+#   --all: все пары STRATEGY.PAIRS, рендер параллельно в пуле процессов (CHARTS.WORKERS);
+#   неизменившиеся графики берутся из кэша charts_core (<png>.key)
 
+import os
 import sys
+import time
 import argparse
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from datetime import datetime, timedelta, timezone
-import requests
+import http_client
 
 ROOT = Path("/root/Ebot")
 if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
 
 from core.charts_core import make_candles_png
-from db.base import session_scope
+from db.base import session_scope, configure
 from db.models import TradeDry, TradeLive
-from config import STRATEGY, TELEGRAM
-try:
-    from config import CHARTS
-except Exception:
-    CHARTS = {}
+import config_loader
+from config_loader import cfg
 
 MSK = timezone(timedelta(hours=3), name="MSK")
 
@@ -28,20 +30,24 @@ def parse_args():
     p.add_argument("--legend", type=str, default=None)
     p.add_argument("--pair", type=str, default=None)  # формат: BTCUSDC@MEXC
     p.add_argument("--tf", type=str, default=None)    # напр.: 1m
+    p.add_argument("--all", action="store_true")      # все пары STRATEGY.PAIRS
+    p.add_argument("--workers", type=int, default=None)
     return p.parse_args()
 
 def send_photo(token: str, chat_id: str, photo_path: str, caption: str) -> bool:
-    url = f"https://api.telegram.org/bot{token}/sendPhoto"
+    url = f"{config_loader.telegram().api_base}/bot{token}/sendPhoto"
     with open(photo_path, "rb") as fh:
-        r = requests.post(url, data={"chat_id": chat_id, "caption": caption}, files={"photo": fh}, timeout=8)
+        photo = fh.read()   # байты, а не файл: повтор после 429 шлёт тело заново
+    r = http_client.post(url, data={"chat_id": chat_id, "caption": caption},
+                         files={"photo": (os.path.basename(photo_path), photo)}, timeout=8, target="telegram")
     ok = r.ok and r.json().get("ok")
     if not ok:
         print(f"[TG] sendPhoto failed: {r.status_code} {r.text[:200]}")
     return bool(ok)
 
 def send_text(token: str, chat_id: str, text: str) -> bool:
-    url = f"https://api.telegram.org/bot{token}/sendMessage"
-    r = requests.post(url, data={"chat_id": chat_id, "text": text}, timeout=6)
+    url = f"{config_loader.telegram().api_base}/bot{token}/sendMessage"
+    r = http_client.post(url, data={"chat_id": chat_id, "text": text}, timeout=6, target="telegram")
     return bool(r.ok and r.json().get("ok"))
 
 def pick_pair(args):
@@ -49,7 +55,7 @@ def pick_pair(args):
         sym, ex = args.pair.split("@", 1)
         tf = args.tf or "1m"
         return dict(symbol=sym, exchange=ex, interval=tf)
-    pairs = STRATEGY.get("PAIRS", [])
+    pairs = cfg.STRATEGY.get("PAIRS", [])
     mx = [p for p in pairs if p.get("exchange") == "MEXC"]
     if not pairs:
         raise RuntimeError("STRATEGY.PAIRS is empty")
@@ -61,8 +67,7 @@ def pick_pair(args):
 def last_trades_caption(symbol: str, exchange: str, limit: int = 5) -> str:
     mode_dry = True
     try:
-        from config import DRY_RUN
-        mode_dry = bool(DRY_RUN)
+        mode_dry = bool(getattr(cfg, "DRY_RUN", True))
     except Exception:
         pass
     Model = TradeDry if mode_dry else TradeLive
@@ -93,42 +98,77 @@ def last_trades_caption(symbol: str, exchange: str, limit: int = 5) -> str:
         lines.append(f"{dt_open} → {dt_close} | {qty:.8f} | {ep:.2f} → {xp} | {state}")
     return header + "\n" + "\n".join(lines)
 
-def main():
-    args = parse_args()
-    n = int(args.n or CHARTS.get("REPORT_CANDLES", 80) or 80)
-    legend_loc = args.legend or CHARTS.get("LEGEND_LOC", "upper left")
-
-    tok = TELEGRAM.get("BOT_TOKEN"); cid = TELEGRAM.get("CHAT_ID")
-    tg_on = bool(TELEGRAM.get("ENABLED")) and bool(tok) and bool(cid)
-
-    pair = pick_pair(args)
-    sym, ex, tf = pair["symbol"], pair["exchange"], pair.get("interval", "1m")
+def _render_opts(args) -> dict:
+    charts = getattr(cfg, "CHARTS", {})
+    st = cfg.STRATEGY
+    return dict(
+        n=int(args.n or charts.get("REPORT_CANDLES", 80) or 80),
+        ema_fast=int(st.get("EMA_FAST", 9)),
+        ema_slow=int(st.get("EMA_SLOW", 20)),
+        mid_smooth=int(charts.get("MID_SMOOTH", 9)),
+        legend_loc=args.legend or charts.get("LEGEND_LOC", "upper left"),
+    )
 
+def _out_png(sym: str, ex: str, tf: str) -> str:
     out_dir = ROOT / "tmp"; out_dir.mkdir(parents=True, exist_ok=True)
-    out_png = out_dir / f"chart_{sym}_{ex}_{tf}.png"
-
-    png_path, _ = make_candles_png(
-        sym, ex, tf, str(out_png),
-        n=n,
-        ema_fast=int(STRATEGY.get("EMA_FAST", 9)),
-        ema_slow=int(STRATEGY.get("EMA_SLOW", 20)),
-        mid_smooth=int(CHARTS.get("MID_SMOOTH", 9)),
-        legend_loc=legend_loc
-    )
+    return str(out_dir / f"chart_{sym}_{ex}_{tf}.png")
+
+def _init_worker():
+    configure("report")
 
-    if not png_path:
-        msg = f"⚠️ Нет данных для {sym}@{ex} ({tf})"
+def render_one(pair: dict, opts: dict) -> dict:
+    """Рендер одной пары (в процессе пула); mtime PNG не меняется — значит взят из кэша."""
+    sym, ex, tf = pair["symbol"], pair["exchange"], pair.get("interval", "1m")
+    out = _out_png(sym, ex, tf)
+    before = os.path.getmtime(out) if os.path.exists(out) else None
+    t0 = time.time()
+    try:
+        png, _ = make_candles_png(sym, ex, tf, out, **opts)
+    except Exception as e:
+        return dict(symbol=sym, exchange=ex, interval=tf, png=None, error=repr(e))
+    cached = bool(png) and before is not None and os.path.getmtime(png) == before
+    return dict(symbol=sym, exchange=ex, interval=tf, png=png, cached=cached, sec=round(time.time() - t0, 3))
+
+def render_all(pairs, opts: dict, workers: int = None) -> list:
+    workers = max(1, min(int(workers or getattr(cfg, "CHARTS", {}).get("WORKERS", os.cpu_count() or 2)), len(pairs) or 1))
+    if workers == 1:
+        return [render_one(p, opts) for p in pairs]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        return list(pool.map(render_one, pairs, [opts] * len(pairs)))
+
+def _deliver(res: dict, tg_on: bool, tok, cid) -> None:
+    sym, ex, tf = res["symbol"], res["exchange"], res["interval"]
+    if not res.get("png"):
+        msg = f"⚠️ Нет данных для {sym}@{ex} ({tf})" + (f": {res['error']}" if res.get("error") else "")
         print(msg)
         if tg_on: send_text(tok, cid, msg)
-        return 0
-
+        return
     caption = last_trades_caption(sym, ex, limit=5)
     if tg_on:
-        ok = send_photo(tok, cid, png_path, caption=caption)
-        print(f"[TG] photo={ok}  path={png_path}")
+        ok = send_photo(tok, cid, res["png"], caption=caption)
+        print(f"[TG] photo={ok}  path={res['png']}  cached={res.get('cached')}")
+    else:
+        print(f"[INFO] TG disabled; saved: {res['png']}  cached={res.get('cached')}\n---\n{caption}")
+
+def main():
+    args = parse_args()
+    configure("report")
+    tg = cfg.TELEGRAM
+    tok = tg.get("BOT_TOKEN"); cid = tg.get("CHAT_ID")
+    tg_on = bool(tg.get("ENABLED")) and bool(tok) and bool(cid)
+    opts = _render_opts(args)
+
+    if args.all:
+        pairs = [dict(p, interval=args.tf) if args.tf else p for p in cfg.STRATEGY.get("PAIRS", [])]
+        t0 = time.time()
+        results = render_all(pairs, opts, args.workers)
+        print(f"[INFO] rendered {len(results)} pairs in {time.time() - t0:.2f}s, "
+              f"cached={sum(1 for r in results if r.get('cached'))}")
     else:
-        print(f"[INFO] TG disabled; saved: {png_path}\n---\n{caption}")
+        results = [render_one(pick_pair(args), opts)]
 
+    for res in results:
+        _deliver(res, tg_on, tok, cid)
     return 0
 
 if __name__ == "__main__":
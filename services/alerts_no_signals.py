@@ -1,13 +1,14 @@
 # -*- coding: utf-8 -*-
 import time
 from datetime import datetime, timezone
-from db.base import session_scope
+from db.base import session_scope, configure
 from sqlalchemy import text
 
 def now_ms():
     return int(time.time()*1000)
 
 def main():
+    configure("report")
     ts_from = int((time.time() - 24*3600) * 1000)
     with session_scope() as s:
         # BUY кандидаты = BUY сигнал или reason=cross_up+gap
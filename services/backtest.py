@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+# Бэктест / перебор параметров стратегии по истории candles (без сети).
+#   python -m services.backtest --pair BTCUSDC@MEXC --tf 1m
+#   python -m services.backtest --sweep --fast 5,9,12 --slow 20,26 --gap 10,30,50 --grace 1,3 --sl 0.003,0.005
+import argparse, json, time
+from config_loader import cfg
+from core.backtest import load_history, run, sweep
+
+def _floats(s):
+    return [float(x) for x in s.split(",") if x.strip()]
+
+def _ints(s):
+    return [int(x) for x in s.split(",") if x.strip()]
+
+def parse_args():
+    st = cfg.STRATEGY
+    p = argparse.ArgumentParser()
+    p.add_argument("--pair", type=str, default=None)   # формат: BTCUSDC@MEXC
+    p.add_argument("--tf", type=str, default=None)
+    p.add_argument("--since-ms", type=int, default=None)
+    p.add_argument("--sweep", action="store_true")
+    p.add_argument("--fast", type=_ints, default=[int(st.get("EMA_FAST", 9))])
+    p.add_argument("--slow", type=_ints, default=[int(st.get("EMA_SLOW", 20))])
+    p.add_argument("--gap", type=_floats, default=[float(st.get("GAP_THRESHOLD_BPS", 50))])
+    p.add_argument("--grace", type=_ints, default=[int(st.get("CROSS_GRACE_BARS", 3))])
+    p.add_argument("--sl", type=_floats, default=[float(getattr(cfg, "RISK", {}).get("STOP_LOSS_PCT", 0.005))])
+    p.add_argument("--workers", type=int, default=None)
+    p.add_argument("--top", type=int, default=20)
+    return p.parse_args()
+
+def main():
+    args = parse_args()
+    if args.pair and "@" in args.pair:
+        sym, ex = args.pair.split("@", 1)
+        tf = args.tf or "1m"
+    else:
+        p0 = cfg.STRATEGY["PAIRS"][0]
+        sym, ex, tf = p0["symbol"], p0["exchange"], args.tf or p0["interval"]
+
+    start_quote = float(getattr(cfg, "DRY_USDC_START", 1000.0))
+    alloc_pct = float(cfg.TRADE.get("ALLOC_PCT", 5.0))
+
+    t0 = time.time()
+    ts, closes = load_history(sym, ex, tf, since_ms=args.since_ms)
+    print(f"loaded {len(closes)} bars {sym}@{ex}/{tf} in {time.time()-t0:.2f}s")
+
+    t0 = time.time()
+    if args.sweep:
+        grid = {"EMA_FAST": args.fast, "EMA_SLOW": args.slow, "GAP_THRESHOLD_BPS": args.gap,
+                "CROSS_GRACE_BARS": args.grace, "STOP_LOSS_PCT": args.sl}
+        res = sweep(closes, grid, start_quote=start_quote, alloc_pct=alloc_pct, workers=args.workers)
+        print(f"sweep: {len(res)} combos in {time.time()-t0:.2f}s")
+        for r in res[:args.top]:
+            print(json.dumps({k: r[k] for k in ("params", "n_trades", "win_rate", "pnl", "pnl_pct", "max_drawdown_pct")}))
+    else:
+        r = run(closes, ts=ts, ema_fast=args.fast[0], ema_slow=args.slow[0], gap_bps=args.gap[0],
+                cross_grace_bars=args.grace[0], stop_loss_pct=args.sl[0],
+                start_quote=start_quote, alloc_pct=alloc_pct)
+        print(f"run: {time.time()-t0:.2f}s")
+        for t in r["trades"][-10:]:
+            print(" ", t)
+        print(json.dumps({k: r[k] for k in ("params", "n_trades", "win_rate", "pnl", "pnl_pct", "max_drawdown_pct", "final_equity")}))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+# Потоковая сборка 1m-свечей из тиков цены (и, опционально, объёма из потока сделок).
+# Открытый бар на (symbol, exchange) живёт в памяти с честными O/H/L/C; бар закрывается
+# ровно один раз — первым тиком следующей минуты или по таймеру (минута + CLOSE_GRACE_MS).
+# Пропущенные минуты заполняются плоскими барами по последнему close (как klines биржи).
+# flush() пишет одной транзакцией все закрытые бары и изменившиеся live-бары всех пар;
+# старшие таймфреймы (db/candles_rollup) пересчитываются только по закрытым барам.
+# Источники тиков: price_agg_ws (WS book-ticker, в процессе) или services/candles_increment (хвост current_price).
+import time, threading
+from typing import Dict, List, Optional, Tuple
+
+from db.base import session_scope, upsert_stmt
+from db.models import Candle
+from db.candles_io import interval_ms, load_tail
+from db.candles_rollup import update_bars, SOURCE as ROLLUP_SOURCE
+from config_loader import cfg
+
+_PK = ["pair", "exchange", "interval", "ts_ms"]
+_UPSERT_V = upsert_stmt(Candle, _PK, ["open", "high", "low", "close", "volume"])
+_UPSERT_PX = upsert_stmt(Candle, _PK, ["open", "high", "low", "close"])   # без потока сделок объём не трогаем
+
+Key = Tuple[str, str]   # (symbol, exchange)
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+class BarAggregator:
+    def __init__(self, interval: str = "1m", close_grace_ms: int = None, max_gap_bars: int = None,
+                 with_volume: bool = False):
+        cc = getattr(cfg, "CANDLES", {})
+        self.interval = interval
+        self.iv = interval_ms(interval)
+        self.close_grace_ms = int(cc.get("CLOSE_GRACE_MS", 1000) if close_grace_ms is None else close_grace_ms)
+        self.max_gap_bars = int(cc.get("MAX_GAP_BARS", 60) if max_gap_bars is None else max_gap_bars)
+        self.with_volume = bool(with_volume)
+        self.lock = threading.Lock()
+        self.open: Dict[Key, list] = {}            # key -> [ts, o, h, l, c, v]
+        self.closed: List[Tuple[Key, tuple]] = []  # закрытые, ещё не записанные
+        self.dirty = set()                         # live-бары, изменившиеся с прошлого flush
+        self.stats = {"ticks": 0, "late": 0, "closed": 0, "flushes": 0, "rows": 0}
+
+    def _bucket(self, ts_ms: int) -> int:
+        return (int(ts_ms) // self.iv) * self.iv
+
+    # ---------- приём
+    def _roll(self, key: Key, bucket: int) -> None:
+        """Закрыть открытый бар key и все пропущенные до bucket (плоскими барами)."""
+        bar = self.open.get(key)
+        if bar is None or bar[0] >= bucket:
+            return
+        self.closed.append((key, tuple(bar)))
+        self.stats["closed"] += 1
+        nxt = bar[0] + self.iv
+        if (bucket - nxt) // self.iv > self.max_gap_bars:
+            nxt = bucket - self.max_gap_bars * self.iv   # длинный простой — заполняем только хвост
+        c = bar[4]
+        while nxt < bucket:
+            self.closed.append((key, (nxt, c, c, c, c, 0.0)))
+            nxt += self.iv
+        self.open[key] = [bucket, c, c, c, c, 0.0]
+        self.dirty.add(key)
+
+    def on_tick(self, symbol: str, exchange: str, price: float, ts_ms: int = None) -> None:
+        if not price or price <= 0:
+            return
+        ts_ms = int(ts_ms or _now_ms())
+        key, b, p = (symbol, exchange), self._bucket(ts_ms), float(price)
+        with self.lock:
+            self.stats["ticks"] += 1
+            bar = self.open.get(key)
+            if bar is None:
+                self.open[key] = [b, p, p, p, p, 0.0]
+            elif b < bar[0]:
+                self.stats["late"] += 1      # бар уже закрыт — не переписываем
+                return
+            else:
+                self._roll(key, b)
+                bar = self.open[key]
+                if p > bar[2]: bar[2] = p
+                if p < bar[3]: bar[3] = p
+                bar[4] = p
+            self.dirty.add(key)
+
+    def on_trade(self, symbol: str, exchange: str, qty: float, ts_ms: int = None) -> None:
+        ts_ms = int(ts_ms or _now_ms())
+        key, b = (symbol, exchange), self._bucket(ts_ms)
+        with self.lock:
+            bar = self.open.get(key)
+            if bar is None or b < bar[0]:
+                self.stats["late"] += 1
+                return
+            self._roll(key, b)
+            self.open[key][5] += float(qty or 0.0)
+            self.dirty.add(key)
+
+    def roll(self, now_ms: int = None) -> None:
+        """Закрыть по таймеру бары, минута которых кончилась (с запасом CLOSE_GRACE_MS)."""
+        b = self._bucket(int(now_ms or _now_ms()) - self.close_grace_ms)
+        with self.lock:
+            for key in list(self.open):
+                self._roll(key, b)
+
+    def seed(self, keys) -> None:
+        """После рестарта: продолжить бар текущей минуты из БД, чтобы не потерять его O/H/L."""
+        b = self._bucket(_now_ms())
+        for symbol, exchange in keys:
+            rows = load_tail(symbol, exchange, self.interval, 1, since_ts=b)
+            if rows:
+                ts, o, h, l, c, v = rows[-1]
+                with self.lock:
+                    self.open.setdefault((symbol, exchange), [ts, o, h, l, c, v])
+
+    # ---------- запись
+    def flush(self, now_ms: int = None) -> int:
+        """Одна транзакция: закрытые бары + изменившиеся live-бары. При ошибке всё возвращается в очередь."""
+        self.roll(now_ms)
+        with self.lock:
+            closed, self.closed = self.closed, []
+            dirty, self.dirty = self.dirty, set()
+            live = [(k, tuple(self.open[k])) for k in dirty if k in self.open]
+        if not closed and not live:
+            return 0
+        rows = {}
+        for key, bar in closed + live:           # live после closed: тот же ts -> актуальная версия
+            rows[(key, bar[0])] = bar
+        params = [dict(pair=k[0], exchange=k[1], interval=self.interval, ts_ms=int(bar[0]),
+                       open=bar[1], high=bar[2], low=bar[3], close=bar[4], volume=bar[5])
+                  for (k, _), bar in rows.items()]
+        try:
+            with session_scope() as s:
+                s.execute(_UPSERT_V if self.with_volume else _UPSERT_PX, params)
+                if self.interval == ROLLUP_SOURCE and closed:
+                    by_key = {}
+                    for key, bar in closed:
+                        by_key.setdefault(key, []).append(bar[0])
+                    for (symbol, exchange), ts_list in by_key.items():
+                        update_bars(s, symbol, exchange, ts_list)
+        except Exception:
+            with self.lock:
+                self.closed = closed + self.closed
+                self.dirty |= dirty
+            raise
+        self.stats["flushes"] += 1
+        self.stats["rows"] += len(params)
+        return len(params)
+
+    def live_bar(self, symbol: str, exchange: str) -> Optional[tuple]:
+        with self.lock:
+            bar = self.open.get((symbol, exchange))
+            return tuple(bar) if bar else None
+
+
+def flush_loop(agg: BarAggregator, stop: threading.Event, flush_sec: float = None) -> None:
+    """Фоновый поток: flush раз в CANDLES.LIVE_FLUSH_SEC (по умолчанию 1с)."""
+    flush_sec = float(flush_sec or getattr(cfg, "CANDLES", {}).get("LIVE_FLUSH_SEC", 1.0))
+    while not stop.is_set():
+        try:
+            agg.flush()
+        except Exception as e:
+            print("bar_aggregator flush error:", repr(e))
+        stop.wait(flush_sec)
+    try:
+        agg.flush()
+    except Exception as e:
+        print("bar_aggregator final flush error:", repr(e))
@@ -1,46 +1,138 @@
 # -*- coding: utf-8 -*-
-import time, math
-from typing import List, Dict
-import requests
-from db.base import session_scope
-from db.models import Candle
+# Загрузка истории свечей MEXC в candles.
+# - запись пачкой: INSERT ... ON CONFLICT DO UPDATE на весь ответ API;
+# - HTTP через общий транспорт http_client (keep-alive пул, повторы, бюджет запросов к api.mexc.com,
+#   общий с price_agg_ws и ebot);
+# - backfill по всем CANDLES.PAIRS параллельно: история режется на окна по CHUNK баров,
+#   окна выровнены по абсолютной сетке, готовые фиксируются в backfill_progress —
+#   прерванный backfill продолжается с недокачанных окон.
+import time, argparse, threading
+from typing import List, Dict, Optional
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from sqlalchemy import select
+from db.base import session_scope, upsert_stmt, configure
+from db.models import Candle, BackfillProgress
+from db.candles_io import interval_ms
+from db.candles_rollup import update_bars, SOURCE as ROLLUP_SOURCE
+from config_loader import cfg
+import metrics
+import http_client
 
 API = "https://api.mexc.com/api/v3/klines"
 SYMBOL = "BTCUSDC"
 INTERVAL = "1m"
+EXCHANGE = "MEXC"
 CHUNK = 1000  # макс. у MEXC
 
-def save_klines(rows: List[List]):
-    with session_scope() as s:
-        for r in rows:
-            ts = int(r[0])            # open time ms
-            open_, high, low, close = map(float, (r[1], r[2], r[3], r[4]))
-            vol = float(r[5])
-            c = Candle(pair=SYMBOL, exchange="MEXC", interval=INTERVAL, ts_ms=ts,
-                       open=open_, high=high, low=low, close=close, volume=vol)
-            s.merge(c)  # upsert
-
-def fetch_chunk(end_ms: int):
-    params = {"symbol": SYMBOL, "interval": INTERVAL, "limit": CHUNK, "endTime": end_ms}
-    r = requests.get(API, params=params, timeout=10)
+_CC = getattr(cfg, "CANDLES", {})
+TIMEOUT = float(_CC.get("TIMEOUT", 10))
+RETRY_MAX = int(_CC.get("RETRY_MAX", 3))
+RETRY_SLEEP = float(_CC.get("RETRY_SLEEP", 1.0))
+SLEEP_BETWEEN = float(_CC.get("SLEEP_BETWEEN", 0.2))
+SAFETY_MS = int(_CC.get("SAFETY_MS", 0))
+
+_CANDLE_UPSERT = upsert_stmt(
+    Candle, ["pair", "exchange", "interval", "ts_ms"], ["open", "high", "low", "close", "volume"])
+_write_lock = threading.Lock()   # SQLite: один писатель за раз
+
+
+def save_klines(rows: List[List], symbol: str = SYMBOL, interval: str = INTERVAL, exchange: str = EXCHANGE) -> int:
+    if not rows:
+        return 0
+    params = [dict(pair=symbol, exchange=exchange, interval=interval, ts_ms=int(r[0]),
+                   open=float(r[1]), high=float(r[2]), low=float(r[3]), close=float(r[4]), volume=float(r[5]))
+              for r in rows]
+    with _write_lock, session_scope() as s:
+        s.execute(_CANDLE_UPSERT, params)
+        # старшие таймфреймы из 1m — в той же транзакции, только затронутые бары
+        if interval == ROLLUP_SOURCE:
+            update_bars(s, symbol, exchange, [p["ts_ms"] for p in params])
+    return len(params)
+
+
+def fetch_chunk(end_ms: int, symbol: str = SYMBOL, interval: str = INTERVAL, start_ms: Optional[int] = None):
+    params = {"symbol": symbol, "interval": interval, "limit": CHUNK, "endTime": end_ms}
+    if start_ms is not None:
+        params["startTime"] = start_ms
+    r = http_client.get(API, params=params, timeout=TIMEOUT, target="mexc_klines",
+                        retries=max(1, RETRY_MAX) - 1, backoff=RETRY_SLEEP)
     r.raise_for_status()
-    rows = r.json()
-    return rows
+    return r.json()
+
+
+# ---------------- backfill
+def _pairs() -> List[Dict]:
+    out = []
+    for p in _CC.get("PAIRS") or cfg.STRATEGY.get("PAIRS", []):
+        if isinstance(p, str):
+            p = {"symbol": p}
+        out.append({"symbol": p["symbol"], "exchange": p.get("exchange", EXCHANGE),
+                    "interval": p.get("interval", INTERVAL)})
+    return out
+
 
-def backfill(minutes: int = 2000):
+def _done_windows(symbol: str, exchange: str, interval: str, from_ms: int) -> set:
+    with session_scope() as s:
+        rows = s.execute(select(BackfillProgress.start_ms).where(
+            BackfillProgress.pair == symbol, BackfillProgress.exchange == exchange,
+            BackfillProgress.interval == interval, BackfillProgress.start_ms >= from_ms)).all()
+    return {int(r[0]) for r in rows}
+
+
+def _mark_done(symbol: str, exchange: str, interval: str, start_ms: int, end_ms: int, n: int) -> None:
+    with _write_lock, session_scope() as s:
+        s.merge(BackfillProgress(pair=symbol, exchange=exchange, interval=interval,
+                                 start_ms=start_ms, end_ms=end_ms, rows=n, done_ms=int(time.time()*1000)))
+
+
+def _load_window(pair: Dict, start_ms: int, end_ms: int, checkpoint: bool) -> int:
+    rows = fetch_chunk(end_ms - 1, pair["symbol"], pair["interval"], start_ms=start_ms)
+    n = save_klines(rows, pair["symbol"], pair["interval"], pair["exchange"])
+    if checkpoint:
+        _mark_done(pair["symbol"], pair["exchange"], pair["interval"], start_ms, end_ms, n)
+    if SLEEP_BETWEEN > 0:
+        time.sleep(SLEEP_BETWEEN)
+    return n
+
+
+def backfill(minutes: Optional[int] = None, pairs: Optional[List[Dict]] = None, workers: int = 4) -> Dict:
+    """Параллельный докачиваемый backfill по всем парам за последние minutes минут
+    (по умолчанию CANDLES.LOOKBACK_BARS баров интервала пары)."""
+    pairs = pairs or _pairs()
     now = int(time.time()*1000)
-    need = minutes
-    end_ms = now
-    while need > 0:
-        rows = fetch_chunk(end_ms)
-        if not rows:
-            break
-        save_klines(rows)
-        first_ts = int(rows[0][0])
-        got = len(rows)
-        need -= got
-        end_ms = first_ts - 1
-        time.sleep(0.2)
+    jobs = []
+    for p in pairs:
+        iv = interval_ms(p["interval"])
+        span = iv * CHUNK
+        lookback_ms = minutes * 60_000 if minutes else int(_CC.get("LOOKBACK_BARS", 2000)) * iv
+        first = ((now - lookback_ms) // span) * span
+        done = _done_windows(p["symbol"], p["exchange"], p["interval"], first)
+        for w in range(first, now, span):
+            if w in done:
+                continue
+            # окно, которое ещё не закрыто целиком, качаем, но не чекпоинтим
+            jobs.append((p, w, w + span, (w + span) <= now - SAFETY_MS))
+
+    total, errors = 0, 0
+    with ThreadPoolExecutor(max_workers=max(1, int(workers))) as pool:
+        futs = {pool.submit(_load_window, *j): j for j in jobs}
+        for f in as_completed(futs):
+            try:
+                total += f.result()
+            except Exception as e:
+                errors += 1
+                p, w, _, _ = futs[f]
+                print(f"backfill_error {p['symbol']}/{p['interval']} @{w}: {e!r}")
+    return {"windows": len(jobs), "rows": total, "errors": errors}
+
 
 if __name__ == "__main__":
-    backfill(2000)
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--minutes", type=int, default=None)
+    ap.add_argument("--workers", type=int, default=int(_CC.get("WORKERS", 4)))
+    a = ap.parse_args()
+    configure("service")
+    metrics.start("candles_fetch")
+    print("candles_fetch:", backfill(a.minutes, workers=a.workers))
+    if metrics.enabled():
+        metrics.dump()
@@ -1,62 +1,84 @@
 # -*- coding: utf-8 -*-
-import time
-from datetime import datetime, timezone
-from math import floor
+# Живые 1m-свечи из тиков current_price (режим без WS; при USE_WEBSOCKETS свечи
+# собирает сам price_agg_ws — этот сервис тогда не нужен).
+# Тики читаются хвостом по ts_ms и проходят через services/bar_aggregator: честные O/H/L/C,
+# закрытие бара ровно один раз, запись пачкой раз в LIVE_FLUSH_SEC.
+#   python -m services.candles_increment          — один проход (cron): доигрывает тики с начала последнего бара
+#   python -m services.candles_increment --loop   — постоянный процесс, опрос раз в LIVE_REFRESH_SEC
+import time, argparse, threading
 
-from db.base import session_scope
-from db.models import Candle, CurrentPrice
-import config as cfg
+from db.base import session_scope, configure
+from db.models import CurrentPrice
+from db.candles_io import load_tail
+from services.bar_aggregator import BarAggregator, flush_loop
+from config_loader import cfg
 
 PAIR = cfg.STRATEGY["PAIRS"][0]
 SYMBOL = PAIR["symbol"]
 EXCHANGE = PAIR["exchange"]
 INTERVAL = PAIR["interval"]  # "1m"
-REFRESH_SEC = int(cfg.CANDLES.get("LIVE_REFRESH_SEC", 3))
-
-def _floor_minute_ts_ms(ts_ms: int) -> int:
-    return (ts_ms // 60000) * 60000
+REFRESH_SEC = float(cfg.CANDLES.get("LIVE_REFRESH_SEC", 0.5))
+TAIL_BATCH = 5000
 
 def _now_ms() -> int:
     return int(time.time() * 1000)
 
-def _last_price_usdc():
+def _ticks_after(ts_ms: int, limit: int = TAIL_BATCH):
+    """Тики current_price с ts > ts_ms по возрастанию: [(ts, price)]; цена — median, иначе mexc_mid."""
     with session_scope() as s:
-        r = s.query(CurrentPrice).order_by(CurrentPrice.ts_ms.desc()).limit(1).first()
-        if not r: return None
-        # берём median/mexc_mid -> в USDC
-        px = r.current_median or r.mexc_mid
-        return float(px) if px else None
+        rows = (s.query(CurrentPrice.ts_ms, CurrentPrice.current_median, CurrentPrice.mexc_mid)
+                  .filter(CurrentPrice.ts_ms > int(ts_ms))
+                  .order_by(CurrentPrice.ts_ms.asc()).limit(int(limit)).all())
+    return [(int(ts), float(m or x)) for ts, m, x in rows if (m or x)]
 
-def _upsert_bar(ts_ms: int, price: float):
-    with session_scope() as s:
-        pk = dict(pair=SYMBOL, exchange=EXCHANGE, interval=INTERVAL, ts_ms=ts_ms)
-        row = s.get(Candle, (SYMBOL, EXCHANGE, INTERVAL, ts_ms))
-        if row is None:
-            row = Candle(**pk, open=price, high=price, low=price, close=price, volume=0.0)
-            s.add(row)
-        else:
-            # обновляем close и расширяем high/low
-            row.close = price
-            if row.high is None or price > row.high: row.high = price
-            if row.low  is None or price < row.low:  row.low  = price
+def _feed(agg: BarAggregator, last_ts: int) -> int:
+    """Скормить агрегатору все новые тики; вернуть ts последнего."""
+    while True:
+        ticks = _ticks_after(last_ts)
+        for ts, px in ticks:
+            agg.on_tick(SYMBOL, EXCHANGE, px, ts)
+        if ticks:
+            last_ts = ticks[-1][0]
+        if len(ticks) < TAIL_BATCH:
+            return last_ts
 
-def run_once():
-    price = _last_price_usdc()
-    if price is None:
-        return {"status":"skip","reason":"no_price"}
+def _start_ts(agg: BarAggregator) -> int:
+    # с начала последнего записанного бара: он пересобирается из тиков целиком
+    last = load_tail(SYMBOL, EXCHANGE, INTERVAL, 1)
+    return (last[-1][0] - 1) if last else _now_ms() - agg.iv
 
-    now = _now_ms()
-    i_ts = _floor_minute_ts_ms(now)
-    ts_list = [i_ts - 2*60000, i_ts - 1*60000, i_ts]  # i-2, i-1, i
-
-    for ts in ts_list:
-        _upsert_bar(ts, price)
+def run_once():
+    agg = BarAggregator(INTERVAL)
+    last_ts = _feed(agg, _start_ts(agg))
+    n = agg.flush()
+    if not agg.stats["ticks"]:
+        return {"status": "skip", "reason": "no_price"}
+    return {"status": "ok", "rows": n, "ticks": agg.stats["ticks"], "last_tick_ms": last_ts}
 
-    return {"status":"ok","bars":len(ts_list),"price":price}
+def run_forever(stop: threading.Event = None):
+    stop = stop or threading.Event()
+    agg = BarAggregator(INTERVAL)
+    last_ts = _start_ts(agg)
+    t = threading.Thread(target=flush_loop, args=(agg, stop), name="bar-flush", daemon=True)
+    t.start()
+    while not stop.is_set():
+        try:
+            last_ts = _feed(agg, last_ts)
+        except Exception as e:
+            print("candles_increment_error:", repr(e))
+        stop.wait(REFRESH_SEC)
+    t.join(timeout=10)
 
 if __name__ == "__main__":
-    try:
-        res = run_once()
-        print("candles_increment:", res)
-    except Exception as e:
-        print("candles_increment_error:", repr(e))
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--loop", action="store_true")
+    a = ap.parse_args()
+    configure("service")
+    if a.loop:
+        run_forever()
+    else:
+        try:
+            res = run_once()
+            print("candles_increment:", res)
+        except Exception as e:
+            print("candles_increment_error:", repr(e))
@@ -2,8 +2,9 @@
 import time, os
 from datetime import datetime, timedelta, timezone
 from sqlalchemy import text
-from db.base import session_scope
-import config as cfg
+from db.base import session_scope, configure
+from db.stats import refresh as stats_refresh, window as stats_window, totals as stats_totals, WINDOWS_MS as STATS_WINDOWS
+from config_loader import cfg
 
 def now_utc():
     return datetime.utcnow().replace(tzinfo=timezone.utc)
@@ -15,34 +16,24 @@ def human(dt: datetime) -> str:
     return dt.strftime("%Y-%m-%d %H:%M:%S UTC")
 
 def main():
+    configure("report")
     os.makedirs("logs", exist_ok=True)
 
     t_end = now_utc()
     t_start = t_end - timedelta(days=1)
     t_start_ms = ts_ms(t_start)
 
+    # метрики окна — из часовых корзин stats_hourly (db/stats.py), сырые таблицы не сканируются
+    stats_refresh()
+    now_ms = ts_ms(t_end)
+    tot = {w: stats_totals(ms, now_ms) for w, ms in STATS_WINDOWS.items()}
+    per_pair = stats_window(STATS_WINDOWS["24h"], now_ms)
+    day = tot["24h"]
+    total, cnt_buy, cnt_sell, cnt_cross_up_gap = day["signals"], day["sig_buy"], day["sig_sell"], day["sig_cross_up"]
+    dry_open_24h, dry_closed_24h = day["dry_opened"], day["dry_closed"]
+
     with session_scope() as s:
-        # --- signals за 24ч ---
-        total = s.execute(text("""
-            SELECT COUNT(*) FROM signals WHERE ts_ms >= :ts_from
-        """), {"ts_from": t_start_ms}).scalar() or 0
-
-        cnt_buy = s.execute(text("""
-            SELECT COUNT(*) FROM signals
-            WHERE ts_ms >= :ts_from AND signal='BUY'
-        """), {"ts_from": t_start_ms}).scalar() or 0
-
-        cnt_sell = s.execute(text("""
-            SELECT COUNT(*) FROM signals
-            WHERE ts_ms >= :ts_from AND signal='SELL'
-        """), {"ts_from": t_start_ms}).scalar() or 0
-
-        cnt_cross_up_gap = s.execute(text("""
-            SELECT COUNT(*) FROM signals
-            WHERE ts_ms >= :ts_from AND reason='cross_up+gap'
-        """), {"ts_from": t_start_ms}).scalar() or 0
-
-        # последние 5 сигналов
+        # последние 5 сигналов (signals_idx_time, обратный проход)
         last_signals = s.execute(text("""
             SELECT ts_ms, pair, exchange, interval, signal, reason,
                    ROUND(ema_fast,6) AS ema_f, ROUND(ema_slow,6) AS ema_s,
@@ -53,28 +44,9 @@ def main():
             LIMIT 5
         """), {"ts_from": t_start_ms}).fetchall()
 
-        # --- сделки DRY/LIVE ---
-        # DRY: открытые сейчас
-        dry_open = s.execute(text("""
-            SELECT COUNT(*) FROM trades_dry WHERE is_open=1
-        """)).scalar() or 0
-
-        # DRY: открыто за 24ч
-        dry_open_24h = s.execute(text("""
-            SELECT COUNT(*) FROM trades_dry
-            WHERE ts_open_ms IS NOT NULL AND ts_open_ms >= :ts_from
-        """), {"ts_from": t_start_ms}).scalar() or 0
-
-        # DRY: закрыто за 24ч
-        dry_closed_24h = s.execute(text("""
-            SELECT COUNT(*) FROM trades_dry
-            WHERE ts_close_ms IS NOT NULL AND ts_close_ms >= :ts_from
-        """), {"ts_from": t_start_ms}).scalar() or 0
-
-        # LIVE: открытые сейчас
-        live_open = s.execute(text("""
-            SELECT COUNT(*) FROM trades_live WHERE is_open=1
-        """)).scalar() or 0
+        # открытые сейчас (индексы *_idx_open)
+        dry_open = s.execute(text("SELECT COUNT(*) FROM trades_dry WHERE is_open=1")).scalar() or 0
+        live_open = s.execute(text("SELECT COUNT(*) FROM trades_live WHERE is_open=1")).scalar() or 0
 
         # Баланс
         base_quote = cfg.TRADE.get("BASE_QUOTE","USDC")
@@ -89,7 +61,7 @@ def main():
     lines = []
     lines.append(f"# Daily report — {human(t_end)}")
     lines.append("")
-    lines.append("## Signals (last 24h)")
+    lines.append("## Signals (last 24h, по целым часам)")
     lines.append(f"- total: {total}")
     lines.append(f"- BUY: {cnt_buy}")
     lines.append(f"- SELL: {cnt_sell}")
@@ -110,6 +82,24 @@ def main():
     lines.append(f"- DRY closed 24h: {dry_closed_24h}")
     lines.append(f"- LIVE open now: {live_open}")
 
+    lines.append("")
+    lines.append("## Windows")
+    for wname, t in tot.items():
+        lines.append(f"- {wname}: signals={t['signals']} BUY={t['sig_buy']} SELL={t['sig_sell']} | "
+                     f"DRY opened={t['dry_opened']} closed={t['dry_closed']} pnl={t['dry_pnl']:.2f} | "
+                     f"LIVE opened={t['live_opened']} closed={t['live_closed']} pnl={t['live_pnl']:.2f}")
+
+    lines.append("")
+    lines.append("## Per pair (last 24h)")
+    if per_pair:
+        for r in per_pair:
+            lines.append(f"- {r['pair']}/{r['exchange']}/{r['interval']}: signals={r['signals']} "
+                         f"BUY={r['sig_buy']} SELL={r['sig_sell']} cross_up+gap={r['sig_cross_up']} | "
+                         f"DRY {r['dry_opened']}/{r['dry_closed']} pnl={r['dry_pnl']:.2f} | "
+                         f"LIVE {r['live_opened']}/{r['live_closed']} pnl={r['live_pnl']:.2f}")
+    else:
+        lines.append("  - no activity")
+
     lines.append("")
     lines.append("## Wallet")
     upd_h = human(datetime.fromtimestamp(updated_ms/1000, tz=timezone.utc)) if updated_ms else "n/a"
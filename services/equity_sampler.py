@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+# Сэмплер equity: раз в EQUITY.SAMPLE_SEC пишет точку в equity_snapshot независимо от сделок,
+# так что изменение за 1h/24h/7d и графики equity есть и при долгом отсутствии сделок.
+#   python -m services.equity_sampler                 — одна точка (cron)
+#   python -m services.equity_sampler --loop          — каждые SAMPLE_SEC (+ чистка старше RETENTION_DAYS)
+#   python -m services.equity_sampler --import-jsonl data/equity_24h.jsonl — перенос старого файла
+import time, json, argparse
+from db.base import configure, create_all
+from db.prices_io import latest as prices_latest
+from db import equity_io
+from config_loader import cfg
+
+_EQ = getattr(cfg, "EQUITY", {})
+SAMPLE_SEC = float(_EQ.get("SAMPLE_SEC", 60))
+RETENTION_DAYS = _EQ.get("RETENTION_DAYS", 90)   # None — храним всегда
+
+
+def sample_once(now_ms: int = None) -> dict:
+    now_ms = int(now_ms or time.time() * 1000)
+    p = prices_latest()
+    price = float((p.current_median or p.mexc_mid) or 0.0) if p else 0.0
+    rate = float(p.usdc_usdt_rate or 1.0) if p else 1.0
+    eq = equity_io.current(price)
+    if eq.pop("open_qty") > 0 and price <= 0:
+        # без цены открытые позиции оценились бы в 0 — такую точку не пишем
+        return {"status": "skip", "reason": "no_price"}
+    equity_io.record(eq["equity_usdc"], ts_ms=now_ms, free_usdc=eq["free_usdc"],
+                     open_usdc=eq["open_usdc"], usdc_usdt=rate, src="sampler")
+    return {"ts_ms": now_ms, **eq, **equity_io.changes(eq["equity_usdc"], now_ms=now_ms)}
+
+
+def prune_old(now_ms: int = None) -> int:
+    if not RETENTION_DAYS:
+        return 0
+    now_ms = int(now_ms or time.time() * 1000)
+    return equity_io.prune(now_ms - int(float(RETENTION_DAYS) * 86_400_000))
+
+
+def import_jsonl(path: str) -> int:
+    n = 0
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                x = json.loads(line)
+                equity_io.record(float(x["equity"]), ts_ms=int(x["ts_ms"]), src="jsonl")
+                n += 1
+            except Exception:
+                pass
+    return n
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--loop", action="store_true")
+    ap.add_argument("--import-jsonl", type=str, default=None)
+    a = ap.parse_args()
+    configure("service")
+    create_all()
+    if a.import_jsonl:
+        print("equity_sampler: imported", import_jsonl(a.import_jsonl))
+    elif not a.loop:
+        print("equity_sampler:", sample_once())
+    else:
+        last_prune = 0.0
+        while True:
+            t0 = time.time()
+            try:
+                sample_once()
+                if t0 - last_prune > 3600:
+                    prune_old()
+                    last_prune = t0
+            except Exception as e:
+                print("equity_sampler_error:", repr(e))
+            time.sleep(max(0.0, SAMPLE_SEC - (time.time() - t0)))
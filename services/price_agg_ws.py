@@ -1,15 +1,21 @@
 # -*- coding: utf-8 -*-
-import time, json, traceback, requests
-from typing import Optional
-import config as cfg
-from db.base import session_scope
+import time, json, traceback, asyncio, random, statistics, threading
+from typing import Optional, Dict, List, Tuple
+from config_loader import cfg
+import metrics
+import http_client
+from metrics import timer
+from db.base import session_scope, configure
 from db.models import CurrentPrice
+from db.prices_io import SYMBOL
+from services.bar_aggregator import BarAggregator, flush_loop
 
 MEXC_TICKER_URL = "https://api.mexc.com/api/v3/ticker/bookTicker"
-SYMBOL = "BTCUSDC"
 USDCUSDT_SYMBOL = "USDCUSDT"
 POLL_SEC = int(getattr(cfg, "CURRENT_PRICE", {}).get("USDCUSDT_POLL_SEC", 5))  # from config.py
 
+_CP = getattr(cfg, "CURRENT_PRICE", {})
+
 
 def _now_ms() -> int:
     return int(time.time() * 1000)
@@ -26,9 +32,20 @@ def _mid_from_book(resp_json) -> Optional[float]:
     return None
 
 
+def _mid(bid, ask) -> Optional[float]:
+    try:
+        b, a = float(bid), float(ask)
+        if b > 0 and a > 0:
+            return (b + a) / 2.0
+    except Exception:
+        pass
+    return None
+
+
 def fetch_pair(symbol: str) -> Optional[float]:
     try:
-        r = requests.get(MEXC_TICKER_URL, params={"symbol": symbol}, timeout=5)
+        # один повтор: опрос и так идёт раз в POLL_SEC, длинный backoff только задержал бы строку цены
+        r = http_client.get(MEXC_TICKER_URL, params={"symbol": symbol}, timeout=5, target="mexc_ticker", retries=1)
         if r.status_code != 200:
             return None
         j = r.json()
@@ -61,5 +78,274 @@ def main_loop():
         time.sleep(POLL_SEC)
 
 
+# ---------------- WebSocket: book-ticker потоки по многим символам сразу
+# Адаптер биржи: url, сообщения подписки, разбор входящего сообщения -> [(symbol, mid)].
+
+class MexcWS:
+    name = "MEXC"
+    url = "wss://wbs.mexc.com/ws"
+
+    def subscribe(self, symbols: List[str]) -> List[str]:
+        return [json.dumps({"method": "SUBSCRIPTION",
+                            "params": [f"spot@public.bookTicker.v3.api@{s}" for s in symbols]})]
+
+    def ping(self) -> Optional[str]:
+        return json.dumps({"method": "PING"})
+
+    def parse(self, msg: dict) -> List[Tuple[str, float]]:
+        d = msg.get("d")
+        sym = msg.get("s")
+        if not isinstance(d, dict) or not sym:
+            return []
+        m = _mid(d.get("b"), d.get("a"))
+        return [(sym, m)] if m is not None else []
+
+    def subscribe_trades(self, symbols: List[str]) -> List[str]:
+        return [json.dumps({"method": "SUBSCRIPTION",
+                            "params": [f"spot@public.deals.v3.api@{s}" for s in symbols]})]
+
+    def parse_trades(self, msg: dict) -> List[Tuple[str, int, float]]:
+        d = msg.get("d")
+        sym = msg.get("s")
+        if not isinstance(d, dict) or not sym or "deals" not in d:
+            return []
+        return [(sym, int(x["t"]), float(x["v"])) for x in d["deals"] if "t" in x and "v" in x]
+
+
+class BinanceWS:
+    name = "BINANCE"
+    url = "wss://stream.binance.com:9443/stream"
+
+    def subscribe(self, symbols: List[str]) -> List[str]:
+        return [json.dumps({"method": "SUBSCRIBE", "id": 1,
+                            "params": [f"{s.lower()}@bookTicker" for s in symbols]})]
+
+    def ping(self) -> Optional[str]:
+        return None
+
+    def parse(self, msg: dict) -> List[Tuple[str, float]]:
+        d = msg.get("data", msg)
+        if not isinstance(d, dict) or "s" not in d:
+            return []
+        if d.get("e") == "trade":
+            return []
+        m = _mid(d.get("b"), d.get("a"))
+        return [(d["s"], m)] if m is not None else []
+
+    def subscribe_trades(self, symbols: List[str]) -> List[str]:
+        return [json.dumps({"method": "SUBSCRIBE", "id": 2,
+                            "params": [f"{s.lower()}@trade" for s in symbols]})]
+
+    def parse_trades(self, msg: dict) -> List[Tuple[str, int, float]]:
+        d = msg.get("data", msg)
+        if not isinstance(d, dict) or d.get("e") != "trade":
+            return []
+        return [(d["s"], int(d["T"]), float(d["q"]))]
+
+
+class BybitWS:
+    name = "BYBIT"
+    url = "wss://stream.bybit.com/v5/public/spot"
+
+    def subscribe(self, symbols: List[str]) -> List[str]:
+        return [json.dumps({"op": "subscribe", "args": [f"orderbook.1.{s}" for s in symbols]})]
+
+    def ping(self) -> Optional[str]:
+        return json.dumps({"op": "ping"})
+
+    def __init__(self):
+        self.top: Dict[str, List[Optional[str]]] = {}   # symbol -> [bid, ask]: последняя известная сторона
+
+    def parse(self, msg: dict) -> List[Tuple[str, float]]:
+        d = msg.get("data")
+        if not isinstance(d, dict) or "s" not in d:
+            return []
+        # snapshot — книга заново; delta с пустой b/a — сторона не менялась, берём последнюю известную
+        top = self.top[d["s"]] = [None, None] if msg.get("type") == "snapshot" else self.top.get(d["s"], [None, None])
+        for i, side in enumerate(("b", "a")):
+            lv = d.get(side) or []
+            if lv and len(lv[0]) > 1:
+                top[i] = lv[0][0] if float(lv[0][1]) > 0 else None   # размер 0 — уровень удалён
+        m = _mid(top[0], top[1])
+        return [(d["s"], m)] if m is not None else []
+
+    def subscribe_trades(self, symbols: List[str]) -> List[str]:
+        return [json.dumps({"op": "subscribe", "args": [f"publicTrade.{s}" for s in symbols]})]
+
+    def parse_trades(self, msg: dict) -> List[Tuple[str, int, float]]:
+        if not str(msg.get("topic", "")).startswith("publicTrade."):
+            return []
+        return [(x["s"], int(x["T"]), float(x["v"])) for x in (msg.get("data") or []) if "T" in x and "v" in x]
+
+
+ADAPTERS = {"MEXC": MexcWS, "BINANCE": BinanceWS, "BYBIT": BybitWS}
+
+
+class Book:
+    """Последний mid по (exchange, symbol) с локальным временем получения."""
+
+    def __init__(self):
+        self.mids: Dict[Tuple[str, str], Tuple[float, int]] = {}
+        self.listeners = []          # f(exchange, symbol, mid, ts_ms) — напр. BarAggregator
+
+    def put(self, exchange: str, symbol: str, mid: float) -> None:
+        ts = _now_ms()
+        self.mids[(exchange, symbol)] = (float(mid), ts)
+        for f in self.listeners:
+            f(exchange, symbol, mid, ts)
+
+    def fresh(self, exchange: str, symbol: str, max_age_ms: int) -> Optional[float]:
+        v = self.mids.get((exchange, symbol))
+        if v is None or _now_ms() - v[1] > max_age_ms:
+            return None
+        return v[0]
+
+
+async def stream(adapter, symbols: List[str], book: Book, stop: asyncio.Event,
+                 url: Optional[str] = None, ping_sec: float = 20.0,
+                 trade_symbols: Optional[List[str]] = None, on_trade=None) -> None:
+    """Один WS-клиент: подписка, приём, переподключение с экспоненциальным backoff и jitter.
+    trade_symbols + on_trade(exchange, symbol, ts_ms, qty) — дополнительно поток сделок (объём свечей)."""
+    import websockets
+    delay = 1.0
+    while not stop.is_set():
+        try:
+            async with websockets.connect(url or adapter.url, ping_interval=ping_sec, max_queue=1024) as ws:
+                for m in adapter.subscribe(symbols):
+                    await ws.send(m)
+                if trade_symbols and on_trade:
+                    for m in adapter.subscribe_trades(trade_symbols):
+                        await ws.send(m)
+                delay = 1.0
+                last_ping = time.monotonic()
+                while not stop.is_set():
+                    try:
+                        raw = await asyncio.wait_for(ws.recv(), timeout=ping_sec)
+                    except asyncio.TimeoutError:
+                        raw = None
+                    if time.monotonic() - last_ping >= ping_sec and adapter.ping():
+                        await ws.send(adapter.ping())
+                        last_ping = time.monotonic()
+                    if raw is None:
+                        continue
+                    metrics.inc("ebot_ws_messages_total", exchange=adapter.name)
+                    try:
+                        msg = json.loads(raw)
+                    except Exception:
+                        continue
+                    for sym, mid in adapter.parse(msg):
+                        book.put(adapter.name, sym, mid)
+                    if on_trade:
+                        for sym, ts, qty in adapter.parse_trades(msg):
+                            on_trade(adapter.name, sym, ts, qty)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[WS {adapter.name}] {e!r}; reconnect in {delay:.1f}s")
+            metrics.inc("ebot_ws_reconnects_total", exchange=adapter.name)
+        if stop.is_set():
+            break
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=delay * (1.0 + random.random() * 0.25))
+        except asyncio.TimeoutError:
+            pass
+        delay = min(delay * 2.0, 60.0)
+
+
+def snapshot_row(book: Book, symbol: str, max_age_ms: int) -> Optional[CurrentPrice]:
+    mexc = book.fresh("MEXC", symbol, max_age_ms)
+    binance = book.fresh("BINANCE", symbol, max_age_ms)
+    bybit = book.fresh("BYBIT", symbol, max_age_ms)
+    mids = [m for m in (mexc, binance, bybit) if m is not None]
+    if not mids:
+        return None
+    return CurrentPrice(
+        ts_ms=_now_ms(),
+        current_median=float(statistics.median(mids)),
+        mexc_mid=mexc, binance_mid=binance, bybit_mid=bybit,
+        usdc_usdt_rate=book.fresh("MEXC", USDCUSDT_SYMBOL, max_age_ms) or book.fresh("BINANCE", USDCUSDT_SYMBOL, max_age_ms),
+        mode="WS",
+        sources_count=len(mids),
+    )
+
+
+async def writer(book: Book, stop: asyncio.Event, symbol: str = SYMBOL,
+                 write_sec: float = 1.0, max_age_ms: int = 10_000) -> None:
+    last_ts = 0
+    while not stop.is_set():
+        row = snapshot_row(book, symbol, max_age_ms)
+        if row is not None and row.ts_ms > last_ts:
+            last_ts = row.ts_ms
+            try:
+                await asyncio.to_thread(_save_row, row)
+            except Exception:
+                traceback.print_exc()
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=write_sec)
+        except asyncio.TimeoutError:
+            pass
+
+
+def _save_row(row: CurrentPrice) -> None:
+    with timer("ebot_price_write_seconds"), session_scope() as s:
+        s.add(row)
+
+
+async def main_ws(stop: Optional[asyncio.Event] = None, urls: Optional[Dict[str, str]] = None) -> None:
+    """Потоки по всем CURRENT_PRICE.SOURCES, запись current_price раз в WRITE_SEC.
+    urls — переопределение адресов (напр. локальный тестовый WS-сервер)."""
+    stop = stop or asyncio.Event()
+    sources = [s.upper() for s in (_CP.get("SOURCES") or ["MEXC"])]
+    symbols = list(dict.fromkeys([SYMBOL, USDCUSDT_SYMBOL] + list(_CP.get("SYMBOLS") or [])))
+    urls = dict(urls or {})
+    if "MEXC" not in urls and getattr(cfg, "EXCHANGES", {}).get("MEXC", {}).get("WS_PUBLIC_URL"):
+        urls["MEXC"] = cfg.EXCHANGES["MEXC"]["WS_PUBLIC_URL"]
+    book = Book()
+
+    # живые 1m-свечи пар STRATEGY.PAIRS из mid «своей» биржи (CANDLES.LIVE_FROM_WS)
+    agg, flusher, bar_stop = None, None, threading.Event()
+    cc = getattr(cfg, "CANDLES", {})
+    bar_pairs = {(p["symbol"], p["exchange"].upper()) for p in cfg.STRATEGY.get("PAIRS", [])
+                 if p.get("interval", "1m") == "1m" and p["exchange"].upper() in sources}
+    if cc.get("LIVE_FROM_WS", True) and bar_pairs:
+        agg = BarAggregator("1m", with_volume=bool(cc.get("TRADE_VOLUME", False)))
+        await asyncio.to_thread(agg.seed, sorted(bar_pairs))
+        symbols = list(dict.fromkeys(symbols + [sym for sym, _ in bar_pairs]))
+
+        def _on_mid(exchange, symbol, mid, ts):
+            if (symbol, exchange) in bar_pairs:
+                agg.on_tick(symbol, exchange, mid, ts)
+        book.listeners.append(_on_mid)
+        flusher = threading.Thread(target=flush_loop, args=(agg, bar_stop), name="bar-flush", daemon=True)
+        flusher.start()
+
+    def _on_trade(exchange, symbol, ts, qty):
+        if (symbol, exchange) in bar_pairs:
+            agg.on_trade(symbol, exchange, qty, ts)
+    with_trades = agg is not None and agg.with_volume
+
+    tasks = [asyncio.create_task(stream(
+                ADAPTERS[src](), symbols, book, stop, url=urls.get(src),
+                trade_symbols=[sym for sym, ex in bar_pairs if ex == src] if with_trades else None,
+                on_trade=_on_trade if with_trades else None))
+             for src in sources if src in ADAPTERS]
+    tasks.append(asyncio.create_task(writer(book, stop, SYMBOL,
+                                            write_sec=float(_CP.get("WRITE_SEC", 1.0)),
+                                            max_age_ms=int(float(_CP.get("WINDOW_SEC", 10)) * 1000))))
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for t in tasks:
+            t.cancel()
+        if flusher is not None:
+            bar_stop.set()
+            await asyncio.to_thread(flusher.join, 10)
+
+
 if __name__ == "__main__":
-    main_loop()
+    configure("service")
+    metrics.start("price_agg_ws")
+    if _CP.get("USE_WEBSOCKETS", True):
+        asyncio.run(main_ws())
+    else:
+        main_loop()
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+# Ретеншн current_price: сырые тики старше CURRENT_PRICE.RETENTION_HOURS сворачиваются
+# в минутные агрегаты current_price_1m (min/max/median/last), сырые строки удаляются.
+# Работает пачками по COMPACT_BATCH строк, каждая пачка — своя короткая транзакция
+# (агрегат + удаление атомарно), так что price_agg_ws не ждёт дольше одной пачки.
+#   python -m services.price_retention           — один проход (cron)
+#   python -m services.price_retention --loop    — каждые COMPACT_EVERY_SEC
+import time, argparse, statistics
+from sqlalchemy import select, delete
+from db.base import session_scope, configure, upsert_stmt
+from db.models import CurrentPrice, CurrentPrice1m
+from config_loader import cfg
+
+_CP = getattr(cfg, "CURRENT_PRICE", {})
+RETENTION_HOURS = float(_CP.get("RETENTION_HOURS", 48))
+ROLLUP_RETENTION_DAYS = _CP.get("ROLLUP_RETENTION_DAYS")   # None — агрегаты храним всегда
+BATCH = int(_CP.get("COMPACT_BATCH", 5000))
+PAUSE_SEC = float(_CP.get("COMPACT_PAUSE_SEC", 0.05))
+
+_ROLLUP_COLS = ["median_min", "median_max", "median_median", "median_last", "mexc_last",
+                "binance_last", "bybit_last", "usdc_usdt_last", "last_ts_ms", "ticks"]
+
+
+def _rollup(minute_ts: int, rows) -> dict:
+    med = [float(r.current_median) for r in rows if r.current_median is not None]
+    last = rows[-1]
+    return dict(
+        ts_ms=minute_ts,
+        median_min=min(med) if med else None,
+        median_max=max(med) if med else None,
+        median_median=float(statistics.median(med)) if med else None,
+        median_last=med[-1] if med else None,
+        mexc_last=last.mexc_mid, binance_last=last.binance_mid, bybit_last=last.bybit_mid,
+        usdc_usdt_last=last.usdc_usdt_rate,
+        last_ts_ms=int(last.ts_ms),
+        ticks=len(rows),
+    )
+
+
+def _merge(old: CurrentPrice1m, new: dict) -> dict:
+    """Минута уже частично свёрнута прошлым проходом — объединяем (медиана — по медианам, приближённо)."""
+    if old is None:
+        return new
+    def _m(f, a, b):
+        vals = [v for v in (a, b) if v is not None]
+        return f(vals) if vals else None
+    n_old, n_new = int(old.ticks or 0), int(new["ticks"])
+    out = dict(new)
+    out["median_min"] = _m(min, old.median_min, new["median_min"])
+    out["median_max"] = _m(max, old.median_max, new["median_max"])
+    if old.median_median is not None and new["median_median"] is not None and (n_old + n_new):
+        out["median_median"] = (old.median_median * n_old + new["median_median"] * n_new) / (n_old + n_new)
+    out["ticks"] = n_old + n_new
+    if old.last_ts_ms and old.last_ts_ms > new["last_ts_ms"]:
+        for c in ("median_last", "mexc_last", "binance_last", "bybit_last", "usdc_usdt_last", "last_ts_ms"):
+            out[c] = getattr(old, c)
+    return out
+
+
+def compact_batch(cutoff_ms: int, batch: int = BATCH) -> int:
+    """Одна пачка: свернуть и удалить до batch сырых строк с ts < cutoff_ms (целыми минутами)."""
+    with session_scope() as s:
+        rows = s.execute(select(CurrentPrice).where(CurrentPrice.ts_ms < cutoff_ms)
+                         .order_by(CurrentPrice.ts_ms.asc()).limit(batch)).scalars().all()
+        if not rows:
+            return 0
+        # последняя минута пачки может быть неполной — оставляем её следующей пачке
+        if len(rows) == batch:
+            last_min = (int(rows[-1].ts_ms) // 60000) * 60000
+            head = [r for r in rows if int(r.ts_ms) < last_min]
+            rows = head or rows
+        by_min = {}
+        for r in rows:
+            by_min.setdefault((int(r.ts_ms) // 60000) * 60000, []).append(r)
+        existing = {int(x.ts_ms): x for x in s.execute(
+            select(CurrentPrice1m).where(CurrentPrice1m.ts_ms.in_(list(by_min)))).scalars()}
+        params = [_merge(existing.get(m), _rollup(m, rs)) for m, rs in by_min.items()]
+        s.execute(upsert_stmt(CurrentPrice1m, ["ts_ms"], _ROLLUP_COLS), params)
+        s.execute(delete(CurrentPrice).where(CurrentPrice.ts_ms >= int(rows[0].ts_ms),
+                                             CurrentPrice.ts_ms <= int(rows[-1].ts_ms)))
+        return len(rows)
+
+
+def prune_rollups(now_ms: int, batch: int = BATCH) -> int:
+    if not ROLLUP_RETENTION_DAYS:
+        return 0
+    cutoff = now_ms - int(float(ROLLUP_RETENTION_DAYS) * 86_400_000)
+    total = 0
+    while True:
+        with session_scope() as s:
+            ids = [r[0] for r in s.execute(select(CurrentPrice1m.ts_ms).where(CurrentPrice1m.ts_ms < cutoff)
+                                           .order_by(CurrentPrice1m.ts_ms.asc()).limit(batch)).all()]
+            if not ids:
+                return total
+            s.execute(delete(CurrentPrice1m).where(CurrentPrice1m.ts_ms.in_(ids)))
+        total += len(ids)
+        time.sleep(PAUSE_SEC)
+
+
+def run_once(now_ms: int = None) -> dict:
+    now_ms = now_ms or int(time.time() * 1000)
+    cutoff = ((now_ms - int(RETENTION_HOURS * 3_600_000)) // 60000) * 60000
+    t0, total = time.time(), 0
+    while True:
+        n = compact_batch(cutoff)
+        if n == 0:
+            break
+        total += n
+        time.sleep(PAUSE_SEC)
+    pruned = prune_rollups(now_ms)
+    return {"compacted": total, "pruned_rollups": pruned, "cutoff_ms": cutoff, "sec": round(time.time() - t0, 2)}
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--loop", action="store_true")
+    a = ap.parse_args()
+    configure("service")
+    if not a.loop:
+        print("price_retention:", run_once())
+    else:
+        every = float(_CP.get("COMPACT_EVERY_SEC", 600))
+        while True:
+            print("price_retention:", run_once())
+            time.sleep(every)
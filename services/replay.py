@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+# Ускоренный replay записанной истории через настоящий тиковый путь:
+# ebot.tick -> IndicatorEngine -> process_signal -> trades_dry / wallet / signals.
+# Источник — candles и current_price (+ current_price_1m для периода старше RETENTION_HOURS) из БД DB_URL
+# или --src; запись — в изолированную БД --db (пересоздаётся). Время виртуальное (clock.set_ms), шаг —
+# --step-sec (по умолчанию TRADE_COOLDOWN_SEC). Перед каждым шагом T в изолированную БД доливаются
+# закрытые свечи и тики цены до T; бар текущей минуты — live (open из истории, close = цена на T),
+# как его держит bar_aggregator. Будущие данные тиковому пути не видны.
+#   python -m services.replay --days 7                      — неделя до последней свечи, как можно быстрее
+#   python -m services.replay --from 2026-10-01 --to 2026-10-08 --speed 500 --db data/replay.db
+import os, io, json, time, argparse, contextlib
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional
+
+from sqlalchemy import select, func
+
+import clock
+from config_loader import cfg, strategy
+from db import candles_io
+from db.base import session_scope, upsert_stmt, insert_stmt, make_engine, configure, create_all
+from db.models import Candle, CurrentPrice, CurrentPrice1m, TradeDry, Signal
+from db.candles_io import interval_ms
+from db.wallet import ensure_start_balance, get_free
+from db.signals_io import sink as signal_sink
+from core import indicator_engine
+
+CHUNK = 20_000
+_UPSERT_CANDLE = upsert_stmt(Candle, ["pair", "exchange", "interval", "ts_ms"], ["open", "high", "low", "close", "volume"])
+
+
+def _parse_ts(v: str) -> int:
+    """ms, YYYY-MM-DD или YYYY-MM-DDTHH:MM (UTC) -> ms."""
+    if v.isdigit():
+        return int(v)
+    dt = datetime.fromisoformat(v)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp() * 1000)
+
+
+def _rows(src, table, ts_col, from_ms: int, to_ms: int, where=()) -> Iterator:
+    """Строки источника по возрастанию ts_col в [from_ms, to_ms], пачками по CHUNK (keyset по ts)."""
+    after = int(from_ms) - 1
+    while True:
+        q = (select(table).where(ts_col > after, ts_col <= int(to_ms), *where)
+             .order_by(ts_col.asc()).limit(CHUNK))
+        with src.connect() as c:
+            batch = [dict(r._mapping) for r in c.execute(q)]
+        yield from batch
+        if len(batch) < CHUNK:
+            return
+        after = batch[-1][ts_col.key]
+
+
+class _Feed:
+    """Строки источника, отдаваемые по мере наступления виртуального времени (ready_ts(row) <= T)."""
+
+    def __init__(self, it: Iterator, ready_ts):
+        self.it, self.ready_ts = it, ready_ts
+        self.head = next(self.it, None)
+
+    def until(self, t_ms: int) -> List[dict]:
+        out = []
+        while self.head is not None and self.ready_ts(self.head) <= t_ms:
+            out.append(self.head)
+            self.head = next(self.it, None)
+        return out
+
+
+def _price_of(row: dict) -> Optional[float]:
+    v = row.get("current_median") or row.get("mexc_mid") or row.get("median_last") or row.get("mexc_last")
+    return float(v) if v else None
+
+
+def _summary(from_ms: int, to_ms: int) -> Dict:
+    with session_scope() as s:
+        opened = s.execute(select(func.count()).select_from(TradeDry)).scalar() or 0
+        closed = s.execute(select(func.count()).select_from(TradeDry).where(TradeDry.is_open == False)).scalar() or 0  # noqa: E712
+        pnl = s.execute(select(func.sum((TradeDry.exit_price - TradeDry.entry_price) * TradeDry.base_qty))
+                        .where(TradeDry.is_open == False)).scalar() or 0.0  # noqa: E712
+        bad_ts = s.execute(select(func.count()).select_from(TradeDry)
+                           .where((TradeDry.ts_open_ms < from_ms) | (TradeDry.ts_open_ms > to_ms))).scalar() or 0
+        signals = s.execute(select(func.count()).select_from(Signal)).scalar() or 0
+    return {"trades_opened": int(opened), "trades_closed": int(closed), "pnl_quote": round(float(pnl), 6),
+            "trades_outside_window": int(bad_ts), "signals": int(signals)}
+
+
+def replay(from_ms: int, to_ms: int, db_path: str, src_dsn: Optional[str] = None,
+           pairs: Optional[List[Dict]] = None, step_sec: Optional[float] = None,
+           speed: float = 0.0, verbose: bool = False) -> Dict:
+    import ebot   # тиковый путь бота как есть
+
+    if not getattr(cfg, "DRY_RUN", True):
+        raise SystemExit("replay: только DRY_RUN=True (сделки пишутся в trades_dry)")
+    pairs = pairs or list(cfg.STRATEGY.get("PAIRS", []))
+    step_ms = int(float(step_sec or getattr(cfg, "TRADE_COOLDOWN_SEC", 10.0)) * 1000)
+    src = make_engine(src_dsn, role="report")
+
+    # изолированная БД с нуля
+    for ext in ("", "-wal", "-shm"):
+        if os.path.exists(db_path + ext):
+            os.remove(db_path + ext)
+    os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+    configure("bot", dsn=f"sqlite:///{os.path.abspath(db_path)}")
+    candles_io._RINGS.clear()
+    indicator_engine._ENGINES.clear()
+    clock.set_ms(from_ms)
+    create_all()
+    ensure_start_balance()
+    quote = cfg.TRADE.get("BASE_QUOTE", "USDC")
+    start_free = get_free(quote)
+
+    # прогрев: закрытые бары до from_ms, чтобы первый тик уже видел полное окно EMA
+    st = strategy()
+    warm = max(st.ema_fast, st.ema_slow) * 3 + 10
+    feeds = []
+    for p in pairs:
+        iv = interval_ms(p["interval"])
+        key = dict(pair=p["symbol"], exchange=p["exchange"], interval=p["interval"])
+        where = (Candle.pair == p["symbol"], Candle.exchange == p["exchange"], Candle.interval == p["interval"])
+        feeds.append((key, iv, _Feed(_rows(src, Candle.__table__, Candle.__table__.c.ts_ms,
+                                           from_ms - warm * iv, to_ms, where), lambda r, iv=iv: r["ts_ms"] + iv)))
+    prices = [(CurrentPrice, _Feed(_rows(src, CurrentPrice.__table__, CurrentPrice.__table__.c.ts_ms, from_ms, to_ms),
+                                   lambda r: r["ts_ms"])),
+              (CurrentPrice1m, _Feed(_rows(src, CurrentPrice1m.__table__, CurrentPrice1m.__table__.c.ts_ms, from_ms, to_ms),
+                                     lambda r: r.get("last_ts_ms") or r["ts_ms"] + 60_000))]
+    price_symbol = pairs[0]["symbol"] if pairs else None    # current_price ведётся по первой паре (как candles_increment)
+    price_now = None
+
+    ticks = errors = steps = 0
+    wall0 = time.perf_counter()
+    sink_out = io.StringIO() if not verbose else None
+    t = from_ms
+    try:
+        while t <= to_ms:
+            clock.set_ms(t)
+            with session_scope() as s:
+                for model, feed in prices:
+                    rows = feed.until(t)
+                    if rows:
+                        s.execute(insert_stmt(model), rows)
+                        price_now = _price_of(rows[-1]) or price_now
+                for key, iv, feed in feeds:
+                    bars = feed.until(t)
+                    # бар текущей минуты (ещё не закрыт) — следующий в ленте, если уже начался
+                    nxt = feed.head if feed.head is not None and feed.head["ts_ms"] <= t else None
+                    rows = [dict(key, ts_ms=b["ts_ms"], open=b["open"], high=b["high"], low=b["low"],
+                                 close=b["close"], volume=b["volume"] or 0.0) for b in bars]
+                    if nxt is not None:
+                        o = float(nxt["open"])
+                        c = price_now if (key["pair"] == price_symbol and price_now) else o
+                        rows.append(dict(key, ts_ms=nxt["ts_ms"], open=o, high=max(o, c), low=min(o, c), close=c, volume=0.0))
+                    if rows:
+                        s.execute(_UPSERT_CANDLE, rows)
+            for p in pairs:
+                try:
+                    with contextlib.redirect_stdout(sink_out) if sink_out is not None else contextlib.nullcontext():
+                        ebot.tick(p)
+                    ticks += 1
+                except Exception as e:
+                    errors += 1
+                    if errors <= 5:
+                        print(f"replay tick_error {p['symbol']} @{t}: {e!r}")
+                if sink_out is not None:
+                    sink_out.seek(0); sink_out.truncate()
+            steps += 1
+            if speed and speed > 0:
+                ahead = (t - from_ms) / 1000.0 / speed - (time.perf_counter() - wall0)
+                if ahead > 0:
+                    time.sleep(ahead)
+            t += step_ms
+        signal_sink().stop()
+    finally:
+        clock.set_ms(None)
+    wall = time.perf_counter() - wall0
+    virtual = (min(t, to_ms) - from_ms) / 1000.0
+    out = {"from_ms": from_ms, "to_ms": to_ms, "pairs": len(pairs), "steps": steps, "ticks": ticks,
+           "tick_errors": errors, "wall_sec": round(wall, 2), "ticks_per_sec": round(ticks / wall, 1) if wall else None,
+           "virtual_sec": round(virtual, 1), "speedup_x": round(virtual / wall, 1) if wall else None,
+           "db": db_path}
+    out.update(_summary(from_ms, to_ms))
+    out["wallet_start"] = round(start_free, 6)
+    out["wallet_end"] = round(get_free(quote), 6)
+    return out
+
+
+def _last_candle_ts(src_dsn: Optional[str], pair: Dict) -> Optional[int]:
+    src = make_engine(src_dsn, role="report")
+    with src.connect() as c:
+        return c.execute(select(func.max(Candle.ts_ms)).where(
+            Candle.pair == pair["symbol"], Candle.exchange == pair["exchange"],
+            Candle.interval == pair["interval"])).scalar()
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--from", dest="from_", type=str, default=None, help="начало (ms или YYYY-MM-DD[THH:MM], UTC)")
+    ap.add_argument("--to", type=str, default=None, help="конец; по умолчанию — последняя свеча")
+    ap.add_argument("--days", type=float, default=7.0, help="длина окна, если не задан --from")
+    ap.add_argument("--db", type=str, default=os.path.join(getattr(cfg, "DATA_DIR", "data"), "replay.db"))
+    ap.add_argument("--src", type=str, default=None, help="DSN записанной истории (по умолчанию DB_URL)")
+    ap.add_argument("--step-sec", type=float, default=None)
+    ap.add_argument("--speed", type=float, default=0.0, help="N× wall-clock; 0 — без ограничения")
+    ap.add_argument("--verbose", action="store_true", help="не глушить печать тиков")
+    a = ap.parse_args()
+
+    pairs = list(cfg.STRATEGY.get("PAIRS", []))
+    to_ms = _parse_ts(a.to) if a.to else _last_candle_ts(a.src, pairs[0])
+    if to_ms is None:
+        raise SystemExit("replay: в источнике нет свечей")
+    from_ms = _parse_ts(a.from_) if a.from_ else to_ms - int(a.days * 86_400_000)
+    print("replay:", json.dumps(replay(from_ms, to_ms, a.db, a.src, pairs, a.step_sec, a.speed, a.verbose)))
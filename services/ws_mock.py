@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+# Локальный WS-стенд бирж для price_agg_ws без сети: пути /mexc, /binance, /bybit отдают book-ticker
+# в формате соответствующей биржи, у Bybit — snapshot + delta с пустой стороной (как exch/mock_server для MEXC REST).
+# После подписки клиент получает сообщения по символам из подписки; drop_after=N — сервер рвёт
+# соединение после N сообщений (один раз на путь), чтобы проверить переподключение и backoff.
+#   python -m services.ws_mock --port 18765                    — стенд; CURRENT_PRICE/urls -> ws://127.0.0.1:18765/<биржа>
+#   python -m services.ws_mock --check                         — разбор всех адаптеров + переподключение
+import json, time, asyncio, argparse
+from typing import Dict, List, Optional
+
+PATHS = {"MEXC": "/mexc", "BINANCE": "/binance", "BYBIT": "/bybit"}
+
+
+def _subscribed(exchange: str, msg: dict) -> List[str]:
+    """Символы из сообщения подписки (book-ticker/orderbook-потоки) в формате биржи."""
+    if exchange == "MEXC":
+        return [p.rsplit("@", 1)[1] for p in msg.get("params", []) if "bookTicker" in p]
+    if exchange == "BINANCE":
+        return [p.split("@")[0].upper() for p in msg.get("params", []) if p.endswith("@bookTicker")]
+    return [a.rsplit(".", 1)[1] for a in msg.get("args", []) if a.startswith("orderbook.1.")]
+
+
+def book_msgs(exchange: str, symbol: str, bid: float, ask: float, seq: int) -> List[dict]:
+    """Сообщения book-ticker биржи для (bid, ask). Для Bybit: snapshot, затем delta только по bid
+    (пустая a — сторона не менялась) — адаптер должен держать последний ask."""
+    ts = int(time.time() * 1000)
+    if exchange == "MEXC":
+        return [{"c": f"spot@public.bookTicker.v3.api@{symbol}", "s": symbol, "t": ts,
+                 "d": {"b": f"{bid}", "B": "1", "a": f"{ask}", "A": "1"}}]
+    if exchange == "BINANCE":
+        return [{"stream": f"{symbol.lower()}@bookTicker",
+                 "data": {"u": seq, "s": symbol, "b": f"{bid}", "B": "1", "a": f"{ask}", "A": "1"}}]
+    topic = f"orderbook.1.{symbol}"
+    if seq == 0:
+        return [{"topic": topic, "type": "snapshot", "ts": ts,
+                 "data": {"s": symbol, "b": [[f"{bid}", "1"]], "a": [[f"{ask}", "1"]], "u": seq}}]
+    return [{"topic": topic, "type": "delta", "ts": ts, "data": {"s": symbol, "b": [[f"{bid}", "1"]], "a": [], "u": seq}}]
+
+
+class MockWS:
+    def __init__(self, prices: Optional[Dict[str, float]] = None, spread: float = 1.0,
+                 interval_sec: float = 0.05, drop_after: int = 0):
+        self.prices = dict(prices or {"BTCUSDC": 60000.0, "USDCUSDT": 1.0})
+        self.spread = float(spread)
+        self.interval_sec = float(interval_sec)
+        self.drop_after = int(drop_after)
+        self.connects: Dict[str, int] = {}
+        self.dropped = set()
+
+    async def handler(self, ws, path: Optional[str] = None):
+        path = path or getattr(ws, "path", None) or ws.request.path
+        exchange = next((ex for ex, p in PATHS.items() if p == path), None)
+        if exchange is None:
+            await ws.close(code=4404)
+            return
+        self.connects[exchange] = self.connects.get(exchange, 0) + 1
+        symbols = _subscribed(exchange, json.loads(await ws.recv()))
+        sent, seq, asks = 0, {}, {}
+        while True:
+            for sym in symbols:
+                px = self.prices.get(sym, 100.0)
+                if seq.get(sym, 0) == 0 or exchange != "BYBIT":
+                    asks[sym] = px + self.spread / 2
+                ask = asks[sym]
+                # Bybit delta несёт только bid, ask — из snapshot: bid подобран так, что mid = px
+                bid = 2 * px - ask
+                for m in book_msgs(exchange, sym, bid, ask, seq.get(sym, 0)):
+                    await ws.send(json.dumps(m))
+                    sent += 1
+                seq[sym] = seq.get(sym, 0) + 1
+            if self.drop_after and sent >= self.drop_after and exchange not in self.dropped:
+                self.dropped.add(exchange)
+                await ws.close()
+                return
+            await asyncio.sleep(self.interval_sec)
+
+    async def serve(self, port: int = 18765, host: str = "127.0.0.1"):
+        import websockets
+        return await websockets.serve(self.handler, host, int(port))
+
+
+async def _check(port: int) -> dict:
+    """Потоки всех адаптеров против стенда: mid = цена стенда, обрыв -> переподключение."""
+    from services.price_agg_ws import ADAPTERS, Book, stream
+    mock = MockWS(drop_after=6)
+    srv = await mock.serve(port)
+    book, stop = Book(), asyncio.Event()
+    tasks = [asyncio.create_task(stream(cls(), list(mock.prices), book, stop, url=f"ws://127.0.0.1:{port}{PATHS[ex]}",
+                                        ping_sec=5.0))
+             for ex, cls in ADAPTERS.items()]
+    t0 = time.monotonic()
+    # первый обрыв -> backoff ~1с -> второе соединение
+    while time.monotonic() - t0 < 10 and (min(mock.connects.get(ex, 0) for ex in ADAPTERS) < 2
+                                          or len(book.mids) < len(ADAPTERS) * len(mock.prices)):
+        await asyncio.sleep(0.1)
+    # новая цена после переподключения: у Bybit она приходит только delta-сообщениями с пустой a
+    for sym in mock.prices:
+        mock.prices[sym] += 10.0
+    await asyncio.sleep(0.5)
+    stop.set()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    srv.close()
+    out = {"connects": dict(mock.connects), "mids": {f"{ex}:{sym}": m for (ex, sym), (m, _) in sorted(book.mids.items())}}
+    for ex in ADAPTERS:
+        assert mock.connects.get(ex, 0) >= 2, f"{ex}: no reconnect after drop ({mock.connects})"
+        for sym, px in mock.prices.items():
+            got = book.fresh(ex, sym, 5_000)
+            assert got is not None and abs(got - px) < 1e-6, f"{ex} {sym}: mid {got} != {px}"
+    return out
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--port", type=int, default=18765)
+    ap.add_argument("--check", action="store_true", help="проверка адаптеров price_agg_ws против стенда")
+    ap.add_argument("--drop-after", type=int, default=0)
+    a = ap.parse_args()
+    if a.check:
+        print(json.dumps(asyncio.run(_check(a.port))))
+    else:
+        async def _main():
+            await MockWS(drop_after=a.drop_after).serve(a.port)
+            print(f"ws mock on ws://127.0.0.1:{a.port}{{{','.join(PATHS.values())}}}")
+            await asyncio.Future()
+        asyncio.run(_main())